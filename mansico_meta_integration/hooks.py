@@ -6,6 +6,11 @@ app_email = "ahmedmansy265@gmail.com"
 app_license = "mit"
 required_apps = ["erpnext"]
 
+doctype_js = {
+    "Lead": "public/js/meta_lead.js",
+    "CRM Lead": "public/js/meta_lead.js",
+}
+
 doc_events = {
     "Lead": {
         # will run before a Lead record is inserted into database
@@ -21,9 +26,21 @@ doc_events = {
 # ---------------
 
 scheduler_events = {
-    "all": ["mansico_meta_integration.tasks.all"],
-    "daily": ["mansico_meta_integration.tasks.daily"],
-    "hourly": ["mansico_meta_integration.tasks.hourly"],
+    "all": [
+        "mansico_meta_integration.tasks.all",
+        "mansico_meta_integration.tasks.drain_event_outbox",
+        "mansico_meta_integration.tasks.continue_backfills",
+        "mansico_meta_integration.tasks.retry_quarantined_leads",
+        "mansico_meta_integration.tasks.retry_deferred_leadgen_events",
+    ],
+    "daily": [
+        "mansico_meta_integration.tasks.daily",
+        "mansico_meta_integration.tasks.prune_sync_log",
+    ],
+    "hourly": [
+        "mansico_meta_integration.tasks.hourly",
+        "mansico_meta_integration.tasks.sync_custom_audience",
+    ],
     "weekly": ["mansico_meta_integration.tasks.weekly"],
     "monthly": ["mansico_meta_integration.tasks.monthly"],
     "cron": {
@@ -0,0 +1,53 @@
+"""Meta customer list normalization and hashing.
+
+Kept free of Frappe imports so ``hash_contacts`` can fan out to a spawned
+process pool without loading the framework in every worker.
+"""
+
+import hashlib
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# Below this many contacts a pool costs more to start than it saves.
+POOL_THRESHOLD = 20000
+POOL_CHUNK_SIZE = 2000
+
+
+def normalize_email(value):
+	return (value or "").strip().lower()
+
+
+def normalize_phone(value):
+	"""Digits only, without the international ``00``/``+`` prefix, as Meta expects."""
+	return re.sub(r"\D", "", value or "").lstrip("0")
+
+
+def sha256(value):
+	return hashlib.sha256(value.encode()).hexdigest() if value else ""
+
+
+def hash_contact(contact):
+	"""``(email, phone)`` -> ``(email_hash, phone_hash)``; a missing value hashes to ``""``."""
+	email, phone = contact
+	return sha256(normalize_email(email)), sha256(normalize_phone(phone))
+
+
+def hash_contacts(contacts, executor=None):
+	"""Hash many ``(email, phone)`` pairs, on ``executor`` when one is given."""
+	if executor is None:
+		return [hash_contact(contact) for contact in contacts]
+	return list(executor.map(hash_contact, contacts, chunksize=POOL_CHUNK_SIZE))
+
+
+def hashing_pool(contacts):
+	"""Process pool for hashing ``contacts`` contacts, or None when hashing inline is cheaper.
+
+	Workers are spawned rather than forked so they never inherit the
+	parent's database and Redis connections.
+	"""
+	workers = min(os.cpu_count() or 1, 8)
+	if contacts < POOL_THRESHOLD or workers < 2:
+		return None
+	return ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
@@ -0,0 +1,322 @@
+# Copyright (c) 2026, Mansy and contributors
+# For license information, please see license.txt
+
+import json
+import math
+import secrets
+
+import frappe
+import requests
+from frappe.model.document import Document
+from frappe.utils import add_days, cint, now_datetime
+
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_audience_member.audience_hashing import (
+	hash_contacts,
+	hashing_pool,
+)
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.graph_throttle import (
+	GraphThrottle,
+	GraphThrottled,
+)
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import (
+	Request,
+	SyncRecordLock,
+	_handle_api_error,
+	get_credentials,
+)
+
+# Lead fields that make up the customer list, per lead doctype.
+CONTACT_FIELDS = {"Lead": ("email_id", "mobile_no"), "CRM Lead": ("email", "mobile_no")}
+AUDIENCE_SCHEMA = ["EMAIL_SHA256", "PHONE_SHA256"]
+# Most rows Meta accepts in one /{audience_id}/users call.
+UPLOAD_BATCH_SIZE = 10000
+DIFF_CHUNK_SIZE = 10000
+# bulk_insert has no retry on a duplicate name, so names must not collide across large audiences.
+MEMBER_NAME_LENGTH = 32
+AUDIENCE_JOB_TIMEOUT = 3600
+AUDIENCE_JOB_ID = "mansico_meta_custom_audience"
+
+
+class MetaAudienceMember(Document):
+	pass
+
+
+class AudienceSync:
+	"""Keep a Meta Custom Audience in step with the leads imported from Meta.
+
+	Meta Audience Member holds the hashes last sent for every lead. A run
+	diffs the leads changed since Audience Synced Up To, and the members
+	whose lead was deleted or fell out of Audience Retention Days, into
+	Pending Add and Pending Remove rows, then uploads only those rows.
+	Pending rows survive a failed upload and go out with the next run.
+	"""
+
+	def __init__(self, defaults=None):
+		self.defaults = defaults or get_credentials()
+		self.started = now_datetime()
+		retention = cint(self.defaults.audience_retention_days)
+		self.cutoff = add_days(self.started, -retention) if retention else None
+		self.audience_id = self.defaults.audience_id
+
+	def run(self):
+		if not self.audience_id:
+			self.audience_id = self.create_audience()
+		for lead_doctype in self.lead_doctypes():
+			self.diff_leads(lead_doctype)
+			self.diff_departures(lead_doctype)
+		frappe.db.set_single_value("Meta Facebook Settings", "audience_synced_upto", self.started)
+		frappe.db.commit()
+
+		self.upload("Pending Remove")
+		self.upload("Pending Add")
+
+	def lead_doctypes(self):
+		used = frappe.get_all("Sync New Add", {"docstatus": 1}, pluck="lead_doctype_name", distinct=True)
+		return [doctype for doctype in CONTACT_FIELDS if doctype in used and frappe.db.exists("DocType", doctype)]
+
+	def diff_leads(self, lead_doctype):
+		"""Hash the Meta leads changed since the last run and queue the ones whose hashes changed."""
+		email_field, phone_field = CONTACT_FIELDS[lead_doctype]
+		filters = {"custom_meta_lead_id": ["is", "set"]}
+		if self.defaults.audience_synced_upto:
+			filters["modified"] = [">", self.defaults.audience_synced_upto]
+		if self.cutoff:
+			filters["creation"] = [">=", self.cutoff]
+
+		pool = hashing_pool(frappe.db.count(lead_doctype, filters))
+		try:
+			last_name = None
+			while leads := frappe.get_all(
+				lead_doctype,
+				filters={**filters, "name": [">", last_name]} if last_name else filters,
+				fields=["name", "creation", email_field, phone_field],
+				order_by="name asc",
+				limit=DIFF_CHUNK_SIZE,
+			):
+				hashes = hash_contacts([(lead.get(email_field), lead.get(phone_field)) for lead in leads], pool)
+				self.queue_changes(lead_doctype, leads, hashes)
+				frappe.db.commit()
+				last_name = leads[-1].name
+		finally:
+			if pool:
+				pool.shutdown()
+
+	def queue_changes(self, lead_doctype, leads, hashes):
+		members = {
+			member.lead_name: member
+			for member in frappe.get_all(
+				"Meta Audience Member",
+				filters={
+					"lead_doctype": lead_doctype,
+					"lead_name": ["in", [lead.name for lead in leads]],
+					"status": ["!=", "Pending Remove"],
+				},
+				fields=["name", "lead_name", "status", "email_hash", "phone_hash"],
+			)
+		}
+
+		now, user = now_datetime(), frappe.session.user
+		additions, removals, unsent = [], [], []
+		for lead, (email_hash, phone_hash) in zip(leads, hashes):
+			member = members.get(lead.name)
+			if member and (member.email_hash or "", member.phone_hash or "") == (email_hash, phone_hash):
+				continue
+			if member:
+				(unsent if member.status == "Pending Add" else removals).append(member.name)
+			if email_hash or phone_hash:
+				additions.append((
+					frappe.generate_hash(length=MEMBER_NAME_LENGTH), now, now, user, user,
+					lead_doctype, lead.name, lead.creation, "Pending Add", email_hash, phone_hash,
+				))
+
+		# Insert first, so a hash the new row keeps is not removed with the old one.
+		frappe.db.bulk_insert(
+			"Meta Audience Member",
+			["name", "creation", "modified", "owner", "modified_by",
+				"lead_doctype", "lead_name", "lead_created", "status", "email_hash", "phone_hash"],
+			additions,
+		)
+		self.remove_members(removals, unsent)
+
+	def diff_departures(self, lead_doctype):
+		"""Queue the removal of members whose lead was deleted or is past the retention."""
+		member, lead = frappe.qb.DocType("Meta Audience Member"), frappe.qb.DocType(lead_doctype)
+		query = (
+			frappe.qb.from_(member)
+			.left_join(lead)
+			.on(member.lead_name == lead.name)
+			.select(member.name, member.status)
+			.where(member.lead_doctype == lead_doctype)
+			.where(member.status != "Pending Remove")
+		)
+		condition = lead.name.isnull()
+		if self.cutoff:
+			condition = condition | (member.lead_created < self.cutoff)
+		departed = query.where(condition).run(as_dict=True)
+
+		self.remove_members(
+			[row.name for row in departed if row.status == "Added"],
+			[row.name for row in departed if row.status == "Pending Add"],
+		)
+		frappe.db.commit()
+
+	@staticmethod
+	def remove_members(sent, unsent):
+		"""Queue sent members for removal from Meta and drop the ones Meta never received."""
+		for start in range(0, len(unsent), DIFF_CHUNK_SIZE):
+			frappe.db.delete("Meta Audience Member", {"name": ["in", unsent[start:start + DIFF_CHUNK_SIZE]]})
+		for start in range(0, len(sent), DIFF_CHUNK_SIZE):
+			frappe.db.set_value(
+				"Meta Audience Member",
+				{"name": ["in", sent[start:start + DIFF_CHUNK_SIZE]]},
+				"status",
+				"Pending Remove",
+				update_modified=False,
+			)
+		for start in range(0, len(sent), DIFF_CHUNK_SIZE):
+			AudienceSync.keep_shared_hashes(sent[start:start + DIFF_CHUNK_SIZE])
+
+	@staticmethod
+	def keep_shared_hashes(names):
+		"""Clear the hashes of removed members that another member still holds.
+
+		Leads can share an email or phone, and Meta removes every match of a
+		removed hash. A removed member left with no hash of its own is dropped
+		without being sent.
+		"""
+		members = frappe.get_all("Meta Audience Member", {"name": ["in", names]}, ["name", "email_hash", "phone_hash"])
+		held = {}
+		for field in ("email_hash", "phone_hash"):
+			hashes = list({member[field] for member in members if member[field]})
+			held[field] = set(frappe.get_all(
+				"Meta Audience Member",
+				filters={"status": ["!=", "Pending Remove"], field: ["in", hashes]},
+				pluck=field,
+				distinct=True,
+			)) if hashes else set()
+
+		dropped = []
+		for member in members:
+			shared = {field: None for field in held if member[field] and member[field] in held[field]}
+			if not shared:
+				continue
+			if all(member[field] in (None, "") or field in shared for field in held):
+				dropped.append(member.name)
+			else:
+				frappe.db.set_value("Meta Audience Member", member.name, shared, update_modified=False)
+		if dropped:
+			frappe.db.delete("Meta Audience Member", {"name": ["in", dropped]})
+
+	def upload(self, status):
+		"""Send every ``status`` row in one Graph upload session of ``UPLOAD_BATCH_SIZE`` row batches."""
+		total = frappe.db.count("Meta Audience Member", {"status": status})
+		if not total:
+			return
+
+		batches = math.ceil(total / UPLOAD_BATCH_SIZE)
+		session_id = secrets.randbelow(2**63 - 1) + 1
+		throttle = GraphThrottle()
+		for batch_seq in range(1, batches + 1):
+			throttle.check(ad_account=True)
+			rows = frappe.get_all(
+				"Meta Audience Member",
+				filters={"status": status},
+				fields=["name", "email_hash", "phone_hash"],
+				order_by="name asc",
+				limit=UPLOAD_BATCH_SIZE,
+			)
+			if not rows:
+				return
+			self.send(status, rows, {
+				"session_id": session_id,
+				"batch_seq": batch_seq,
+				"last_batch_flag": batch_seq == batches,
+				"estimated_num_total": total,
+			})
+
+			names = [row.name for row in rows]
+			if status == "Pending Add":
+				frappe.db.set_value("Meta Audience Member", {"name": ["in", names]}, "status", "Added", update_modified=False)
+			else:
+				frappe.db.delete("Meta Audience Member", {"name": ["in", names]})
+			frappe.db.commit()
+
+	def send(self, status, rows, session):
+		request = Request(self.defaults.api_url, self.defaults.graph_api_version, f"{self.audience_id}/users", None,
+			params={"access_token": self.defaults.access_token})
+		payload = {"schema": AUDIENCE_SCHEMA, "data": [[row.email_hash or "", row.phone_hash or ""] for row in rows]}
+		send = request.session.post if status == "Pending Add" else request.session.delete
+		try:
+			response = send(request.get_url, params=request.params,
+				data={"payload": json.dumps(payload), "session": json.dumps(session)})
+			_handle_api_error(response, request, title="Custom Audience Upload Failed")
+		except requests.exceptions.RequestException as e:
+			frappe.throw(f"Network error while uploading {len(rows)} audience rows: {str(e)}", title="Network Error")
+
+	def create_audience(self):
+		"""Create the customer list audience in the ad account and remember its id in the settings."""
+		if not (self.defaults.ad_account_id and self.defaults.audience_name):
+			frappe.throw("Set an Audience ID, or an AD Account ID and Audience Name, in Meta Facebook Settings")
+
+		account = self.defaults.ad_account_id.strip()
+		if not account.startswith("act_"):
+			account = f"act_{account}"
+		request = Request(self.defaults.api_url, self.defaults.graph_api_version, f"{account}/customaudiences", None,
+			params={"access_token": self.defaults.access_token})
+		try:
+			response = request.session.post(request.get_url, params=request.params, data={
+				"name": self.defaults.audience_name,
+				"subtype": "CUSTOM",
+				"customer_file_source": "USER_PROVIDED_ONLY",
+				"description": "Leads imported from Meta lead forms",
+			})
+			_handle_api_error(response, request, title="Custom Audience Creation Failed")
+		except requests.exceptions.RequestException as e:
+			frappe.throw(f"Network error while creating the Custom Audience: {str(e)}", title="Network Error")
+
+		audience_id = response.json().get("id")
+		frappe.db.set_single_value("Meta Facebook Settings", "audience_id", audience_id)
+		frappe.db.commit()
+		return audience_id
+
+
+def audience_configured(defaults):
+	return bool(defaults.audience_id or (defaults.ad_account_id and defaults.audience_name))
+
+
+def sync_audience():
+	"""Push the audience delta, unless another run is still uploading."""
+	defaults = get_credentials()
+	if not audience_configured(defaults):
+		return
+
+	lock = SyncRecordLock("custom_audience", ttl=AUDIENCE_JOB_TIMEOUT)
+	if not lock.acquire():
+		return
+	try:
+		AudienceSync(defaults).run()
+	except GraphThrottled:
+		# Pending rows go out with the next run once the budget recovers.
+		pass
+	except frappe.ValidationError as e:
+		frappe.log_error("Custom Audience Sync Failed", f"Pending audience changes are retried by the next run: {str(e)}")
+	finally:
+		lock.release()
+
+
+def enqueue_audience_sync():
+	if not audience_configured(frappe.get_cached_doc("Meta Facebook Settings")):
+		return
+	frappe.enqueue(
+		"mansico_meta_integration.mansico_meta_integration.doctype.meta_audience_member.meta_audience_member.sync_audience",
+		queue="long",
+		timeout=AUDIENCE_JOB_TIMEOUT,
+		job_id=AUDIENCE_JOB_ID,
+		deduplicate=True,
+	)
+
+
+@frappe.whitelist()
+def sync_audience_now():
+	frappe.only_for("System Manager")
+	enqueue_audience_sync()
@@ -0,0 +1,85 @@
+# Copyright (c) 2026, Mansy and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import now_datetime
+
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_audience_member.audience_hashing import (
+	hash_contact,
+)
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_audience_member.meta_audience_member import (
+	MEMBER_NAME_LENGTH,
+	sync_audience,
+)
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import FetchLeads
+from mansico_meta_integration.tests.benchmark import FAKE_FORM_PREFIX, fake_sync_record
+from mansico_meta_integration.tests.fake_graph_server import FAKE_AUDIENCE_ID, FakeGraphServer
+
+FORM_ID = f"{FAKE_FORM_PREFIX}0000"
+AUDIENCE_SETTINGS = ("ad_account_id", "audience_name", "audience_id", "audience_synced_upto")
+
+
+class TestMetaAudienceMember(FrappeTestCase):
+	def setUp(self):
+		self.started = now_datetime()
+		self.original = {field: frappe.db.get_single_value("Meta Facebook Settings", field) for field in AUDIENCE_SETTINGS}
+		for field, value in {"ad_account_id": "999", "audience_name": "Fake Audience", "audience_id": None, "audience_synced_upto": None}.items():
+			frappe.db.set_single_value("Meta Facebook Settings", field, value)
+
+	def tearDown(self):
+		frappe.db.delete("Meta Audience Member", {"creation": [">=", self.started]})
+		for field, value in self.original.items():
+			frappe.db.set_single_value("Meta Facebook Settings", field, value)
+		frappe.db.commit()
+
+	def test_audience_receives_only_the_delta(self):
+		with FakeGraphServer(forms={FORM_ID: 20}) as server, fake_sync_record(server) as doc:
+			FetchLeads(doc.name).fetch_leads()
+			leads = frappe.get_all(
+				"Lead", {"custom_meta_lead_id": ["like", f"{FAKE_FORM_PREFIX}%"]}, ["name", "email_id", "mobile_no"]
+			)
+			expected = {hash_contact((lead.email_id, lead.mobile_no)) for lead in leads}
+
+			sync_audience()
+			self.assertEqual(frappe.db.get_single_value("Meta Facebook Settings", "audience_id"), FAKE_AUDIENCE_ID)
+			self.assertTrue(expected <= server.audience)
+			method, session = server.audience_sessions[-1]
+			self.assertEqual((method, session["last_batch_flag"]), ("POST", True))
+			names = frappe.get_all("Meta Audience Member", {"lead_name": ["in", [lead.name for lead in leads]]}, pluck="name")
+			self.assertEqual({len(name) for name in names}, {MEMBER_NAME_LENGTH})
+
+			server.reset_counters()
+			sync_audience()
+			self.assertEqual(server.calls["users"], 0)
+
+			deleted = leads[0]
+			frappe.delete_doc("Lead", deleted.name, ignore_permissions=True, force=True)
+			frappe.db.commit()
+			sync_audience()
+			self.assertEqual(server.calls["users"], 1)
+			self.assertNotIn(hash_contact((deleted.email_id, deleted.mobile_no)), server.audience)
+			self.assertTrue(expected - {hash_contact((deleted.email_id, deleted.mobile_no))} <= server.audience)
+
+	def test_removal_keeps_hashes_shared_with_other_members(self):
+		with FakeGraphServer(forms={FORM_ID: 5}) as server, fake_sync_record(server) as doc:
+			FetchLeads(doc.name).fetch_leads()
+			kept, deleted = frappe.get_all(
+				"Lead", {"custom_meta_lead_id": ["like", f"{FAKE_FORM_PREFIX}%"]}, ["name", "email_id", "mobile_no"], limit=2
+			)
+			frappe.db.set_value("Lead", kept.name, "email_id", deleted.email_id)
+			frappe.db.commit()
+			sync_audience()
+			shared = hash_contact((deleted.email_id, kept.mobile_no))
+			self.assertIn(shared, server.audience)
+
+			frappe.delete_doc("Lead", deleted.name, ignore_permissions=True, force=True)
+			frappe.db.commit()
+			sync_audience()
+			self.assertIn(shared, server.audience)
+			self.assertNotIn(hash_contact((deleted.email_id, deleted.mobile_no)), server.audience)
+			self.assertFalse(frappe.db.exists("Meta Audience Member", {"status": "Pending Remove"}))
+
+	def test_contacts_are_normalized_before_hashing(self):
+		self.assertEqual(hash_contact((" Lead@Example.COM ", "+1 (555) 000-0001")), hash_contact(("lead@example.com", "15550000001")))
+		self.assertEqual(hash_contact((None, None)), ("", ""))
@@ -0,0 +1,155 @@
+# Copyright (c) 2026, Mansy and contributors
+# For license information, please see license.txt
+
+import hashlib
+import time
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_to_date, cint, now_datetime
+
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_lead_payload.meta_lead_payload import get_form_id
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_sync_log.meta_sync_log import log_lead_events
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.graph_throttle import (
+	GraphThrottle,
+	GraphThrottled,
+)
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import (
+	LeadEventBatch,
+	get_credentials,
+)
+
+OUTBOX_JOB_ID = "mansico_meta_event_outbox"
+
+
+class MetaEventOutbox(Document):
+	pass
+
+
+def get_lead_page_id(lead):
+	"""Return the Page ID a Meta lead was imported from."""
+	if lead.get("page_id"):
+		return lead.get("page_id")
+
+	form_id = get_form_id(lead.get("custom_meta_lead_id"))
+	if not form_id:
+		return None
+
+	sync_new_add = frappe.db.get_value(
+		"Meta Forms", {"parenttype": "Sync New Add", "form_id": form_id}, "parent"
+	)
+	return frappe.db.get_value("Sync New Add", sync_new_add, "page_id") if sync_new_add else None
+
+
+def queue_lead_event(lead, lead_doctype):
+	"""Record the lead's current status for Meta, replacing any unsent event of the same lead."""
+	now = now_datetime()
+	merge_window = cint(frappe.db.get_single_value("Meta Facebook Settings", "event_merge_window"))
+	event_time = int(now.timestamp())
+
+	values = {
+		"meta_lead_id": lead.custom_meta_lead_id,
+		"page_id": get_lead_page_id(lead),
+		"event_name": lead.status,
+		# Stable across retries of this change, so Meta drops any resend of it.
+		"event_id": hashlib.sha1(f"{lead_doctype}:{lead.name}:{lead.status}:{event_time}".encode()).hexdigest(),
+		"event_time": event_time,
+		"send_after": add_to_date(now, seconds=merge_window),
+		"attempts": 0,
+		"last_error": None,
+	}
+
+	pending = frappe.db.get_value(
+		"Meta Event Outbox", {"lead_doctype": lead_doctype, "lead_name": lead.name, "status": "Pending"}, "name"
+	)
+	if pending:
+		frappe.db.set_value("Meta Event Outbox", pending, values)
+	else:
+		frappe.get_doc(
+			{"doctype": "Meta Event Outbox", "lead_doctype": lead_doctype, "lead_name": lead.name, **values}
+		).insert(ignore_permissions=True)
+
+	if not merge_window:
+		frappe.enqueue(
+			drain_outbox, queue="short", job_id=OUTBOX_JOB_ID, deduplicate=True, enqueue_after_commit=True
+		)
+
+
+def drain_outbox(limit=5000):
+	"""Send due outbox events, one Conversions API call per pixel per batch."""
+	defaults = get_credentials()
+	max_attempts = cint(defaults.event_max_attempts) or 5
+
+	rows = frappe.get_all(
+		"Meta Event Outbox",
+		filters={"status": "Pending", "send_after": ["<=", now_datetime()]},
+		fields=["name", "lead_doctype", "lead_name", "meta_lead_id", "page_id", "event_name", "event_id", "event_time", "attempts"],
+		order_by="send_after asc",
+		limit=limit,
+	)
+
+	groups = {}
+	for row in rows:
+		groups.setdefault((row.lead_doctype, row.page_id), []).append(row)
+
+	throttle = GraphThrottle()
+	for (lead_doctype, page_id), group in groups.items():
+		try:
+			throttle.check()
+		except GraphThrottled:
+			# Leave the rest pending; a later tick sends them once the budget recovers.
+			return
+
+		if not page_id or not frappe.db.exists("Page ID", page_id):
+			for row in group:
+				_mark_failed(row, f"Page ID {page_id or ''} not found", max_attempts)
+			frappe.db.commit()
+			continue
+
+		page = frappe.get_cached_doc("Page ID", page_id)
+		batch = LeadEventBatch(defaults)
+		for row in group:
+			lead = frappe._dict(name=row.lead_name, custom_meta_lead_id=row.meta_lead_id, status=row.event_name)
+			batch.add(lead, page, event_time=row.event_time, event_id=row.event_id)
+		results = batch.flush()
+		log_lead_events(
+			[result for result in results.values() if not isinstance(result.response, GraphThrottled)], lead_doctype
+		)
+
+		for row in group:
+			result = results.get(row.lead_name)
+			if result and isinstance(result.response, GraphThrottled):
+				_reschedule(row, result.response.retry_at)
+			elif result and result.ok:
+				_mark_sent(row, result.response)
+			else:
+				_mark_failed(row, result.response if result else "Event could not be built", max_attempts)
+		frappe.db.commit()
+
+
+def _mark_sent(row, response):
+	# Filter on event_id so a status change merged in while sending stays pending.
+	frappe.db.set_value(
+		"Meta Event Outbox",
+		{"name": row.name, "event_id": row.event_id},
+		{"status": "Sent", "response": str(response), "attempts": row.attempts + 1},
+	)
+
+
+def _reschedule(row, retry_at):
+	frappe.db.set_value(
+		"Meta Event Outbox",
+		{"name": row.name, "event_id": row.event_id},
+		"send_after",
+		add_to_date(now_datetime(), seconds=max(int(retry_at - time.time()), 0)),
+	)
+
+
+def _mark_failed(row, error, max_attempts):
+	attempts = row.attempts + 1
+	values = {"attempts": attempts, "last_error": str(error)}
+	if attempts >= max_attempts:
+		values["status"] = "Failed"
+	else:
+		values["send_after"] = add_to_date(now_datetime(), minutes=2**attempts)
+	frappe.db.set_value("Meta Event Outbox", {"name": row.name, "event_id": row.event_id}, values)
@@ -0,0 +1,120 @@
+# Copyright (c) 2026, Mansy and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, get_datetime, now_datetime
+
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_event_outbox.meta_event_outbox import (
+	drain_outbox,
+	queue_lead_event,
+)
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.graph_throttle import GraphThrottle
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import FetchLeads
+from mansico_meta_integration.tests.benchmark import FAKE_FORM_PREFIX, fake_sync_record
+from mansico_meta_integration.tests.fake_graph_server import FakeGraphServer
+
+FORM_ID = f"{FAKE_FORM_PREFIX}0000"
+OUTBOX_SETTINGS = {"event_merge_window": 600, "event_max_attempts": 2}
+
+
+class TestMetaEventOutbox(FrappeTestCase):
+	def setUp(self):
+		self.original = {field: frappe.db.get_single_value("Meta Facebook Settings", field) for field in OUTBOX_SETTINGS}
+		frappe.db.set_single_value("Meta Facebook Settings", OUTBOX_SETTINGS)
+		frappe.cache().delete_keys(GraphThrottle.prefix)
+
+	def tearDown(self):
+		frappe.db.delete("Meta Event Outbox", {"meta_lead_id": ["like", f"{FAKE_FORM_PREFIX}%"]})
+		frappe.db.set_single_value("Meta Facebook Settings", self.original)
+		frappe.cache().delete_keys(GraphThrottle.prefix)
+		frappe.db.commit()
+
+	def imported_lead(self, doc):
+		FetchLeads(doc.name).fetch_leads()
+		name = frappe.db.get_value("Lead", {"custom_meta_lead_id": ["like", f"{FORM_ID}%"]}, "name")
+		return frappe.get_doc("Lead", name)
+
+	def queue(self, lead, status):
+		lead.status = status
+		queue_lead_event(lead, "Lead")
+		frappe.db.commit()
+
+	def outbox(self, lead):
+		rows = frappe.get_all(
+			"Meta Event Outbox",
+			{"lead_doctype": "Lead", "lead_name": lead.name},
+			["name", "status", "event_name", "attempts", "send_after", "last_error"],
+		)
+		self.assertEqual(len(rows), 1)
+		return rows[0]
+
+	def make_due(self, lead):
+		frappe.db.set_value("Meta Event Outbox", self.outbox(lead).name, "send_after", now_datetime())
+		frappe.db.commit()
+
+	def test_status_changes_within_the_merge_window_send_one_event(self):
+		with FakeGraphServer(forms={FORM_ID: 1}) as server, fake_sync_record(server) as doc:
+			lead = self.imported_lead(doc)
+			self.queue(lead, "Replied")
+			self.queue(lead, "Interested")
+			row = self.outbox(lead)
+			self.assertEqual((row.status, row.event_name), ("Pending", "Interested"))
+			self.assertGreater(get_datetime(row.send_after), add_to_date(now_datetime(), minutes=5))
+
+			server.reset_counters()
+			drain_outbox()
+			self.assertEqual(server.events_received, 0)
+
+			self.make_due(lead)
+			drain_outbox()
+			self.assertEqual(server.events_received, 1)
+			self.assertEqual(server.calls["events"], 1)
+			row = self.outbox(lead)
+			self.assertEqual((row.status, row.attempts), ("Sent", 1))
+
+	def test_failed_events_back_off_until_max_attempts(self):
+		with FakeGraphServer(forms={FORM_ID: 1}) as server, fake_sync_record(server) as doc:
+			lead = self.imported_lead(doc)
+			self.queue(lead, "Replied")
+			self.make_due(lead)
+
+			server.error_code = 100
+			drain_outbox()
+			row = self.outbox(lead)
+			self.assertEqual((row.status, row.attempts), ("Pending", 1))
+			self.assertTrue(row.last_error)
+			self.assertGreater(get_datetime(row.send_after), add_to_date(now_datetime(), minutes=1))
+
+			# Not due yet, so the next drain leaves it alone.
+			drain_outbox()
+			self.assertEqual(self.outbox(lead).attempts, 1)
+
+			self.make_due(lead)
+			drain_outbox()
+			row = self.outbox(lead)
+			self.assertEqual((row.status, row.attempts), ("Failed", 2))
+
+			# A failed event is not sent again once Meta recovers.
+			server.error_code = None
+			server.reset_counters()
+			drain_outbox()
+			self.assertEqual(server.calls["events"], 0)
+
+	def test_retried_event_is_sent_once_meta_recovers(self):
+		with FakeGraphServer(forms={FORM_ID: 1}) as server, fake_sync_record(server) as doc:
+			lead = self.imported_lead(doc)
+			self.queue(lead, "Opportunity")
+			self.make_due(lead)
+
+			server.error_code = 100
+			drain_outbox()
+			self.assertEqual(self.outbox(lead).attempts, 1)
+
+			server.error_code = None
+			server.reset_counters()
+			self.make_due(lead)
+			drain_outbox()
+			row = self.outbox(lead)
+			self.assertEqual((row.status, row.attempts, row.event_name), ("Sent", 2, "Opportunity"))
+			self.assertEqual(server.events_received, 1)
@@ -1,8 +1,15 @@
 // Copyright (c) 2024, Mansy and contributors
 // For license information, please see license.txt
 
-// frappe.ui.form.on("Meta Facebook Settings", {
-// 	refresh(frm) {
-
-// 	},
-// });
+frappe.ui.form.on("Meta Facebook Settings", {
+	refresh(frm) {
+		if (frm.doc.audience_id || (frm.doc.ad_account_id && frm.doc.audience_name)) {
+			frm.add_custom_button(__("Sync Custom Audience"), () => {
+				frappe.call({
+					method: "mansico_meta_integration.mansico_meta_integration.doctype.meta_audience_member.meta_audience_member.sync_audience_now",
+					callback: () => frappe.show_alert({ message: __("Custom Audience sync queued"), indicator: "green" }),
+				});
+			});
+		}
+	},
+});
@@ -4,6 +4,9 @@
 # import frappe
 from frappe.model.document import Document
 
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import PageAccessTokenCache
+
 
 class MetaFacebookSettings(Document):
-	pass
+	def on_update(self):
+		PageAccessTokenCache.clear()
@@ -1,9 +1,25 @@
 # Copyright (c) 2024, Mansy and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.graph_session import GraphSession
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import get_page_access_token
+from mansico_meta_integration.tests.benchmark import FAKE_PAGE_ID, fake_sync_record
+from mansico_meta_integration.tests.fake_graph_server import FakeGraphServer
+
 
 class TestMetaFacebookSettings(FrappeTestCase):
-	pass
+	def test_saving_settings_retires_cached_tokens(self):
+		with FakeGraphServer() as server, fake_sync_record(server):
+			server.reset_counters()
+			get_page_access_token(FAKE_PAGE_ID)
+			frappe.get_single("Meta Facebook Settings").save(ignore_permissions=True)
+			get_page_access_token(FAKE_PAGE_ID)
+			self.assertEqual(server.calls["token"], 2)
+
+	def test_sessions_are_shared_per_connection_setting(self):
+		settings = frappe._dict(http_pool_size=3, http_timeout=5, http_max_retries=0)
+		self.assertIs(GraphSession.for_settings(settings), GraphSession.for_settings(settings))
+		self.assertIsNot(GraphSession.for_settings(settings), GraphSession.for_settings(frappe._dict(http_pool_size=4)))
@@ -0,0 +1,51 @@
+# Copyright (c) 2026, Mansy and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import now_datetime
+
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.payload_codec import (
+	compress_json,
+	decompress_json,
+)
+
+
+class MetaLeadPayload(Document):
+	pass
+
+
+def archive_lead_payloads(rows):
+	"""Store raw Graph leads compressed, one bulk insert for many leads.
+
+	``rows`` are ``(lead_doctype, lead_name, raw_lead)`` tuples. Leads that are
+	already archived are left untouched.
+	"""
+	if not rows:
+		return
+
+	now = now_datetime()
+	user = frappe.session.user
+	fields = ["name", "creation", "modified", "owner", "modified_by", "meta_lead_id", "form_id", "lead_doctype", "lead_name", "payload"]
+	values = [
+		(
+			raw_lead["id"], now, now, user, user,
+			raw_lead["id"], raw_lead.get("form_id"), lead_doctype, lead_name, compress_json(raw_lead),
+		)
+		for lead_doctype, lead_name, raw_lead in rows
+	]
+	frappe.db.bulk_insert("Meta Lead Payload", fields, values, ignore_duplicates=True)
+
+
+def get_form_id(meta_lead_id):
+	return frappe.db.get_value("Meta Lead Payload", meta_lead_id, "form_id") if meta_lead_id else None
+
+
+@frappe.whitelist()
+def get_lead_payload(lead_doctype, lead_name):
+	"""Return the raw Graph lead a Lead was imported from, for the Lead form."""
+	frappe.has_permission(lead_doctype, "read", lead_name, throw=True)
+	meta_lead_id = frappe.db.get_value(lead_doctype, lead_name, "custom_meta_lead_id")
+	if not meta_lead_id:
+		return None
+	return decompress_json(frappe.db.get_value("Meta Lead Payload", meta_lead_id, "payload"))
@@ -0,0 +1,69 @@
+# Copyright (c) 2026, Mansy and Contributors
+# See license.txt
+
+import json
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_lead_payload.meta_lead_payload import (
+	archive_lead_payloads,
+	get_lead_payload,
+)
+from mansico_meta_integration.patches import archive_custom_lead_json
+
+LEAD_PREFIX = "test-payload-"
+
+
+class TestMetaLeadPayload(FrappeTestCase):
+	def setUp(self):
+		self.leads = []
+
+	def tearDown(self):
+		frappe.set_user("Administrator")
+		for name in self.leads:
+			frappe.delete_doc("Lead", name, ignore_permissions=True, force=True)
+		frappe.db.delete("Meta Lead Payload", {"meta_lead_id": ["like", f"{LEAD_PREFIX}%"]})
+		frappe.db.commit()
+
+	def lead(self, meta_lead_id=None):
+		lead = frappe.get_doc({"doctype": "Lead", "first_name": "Payload Test", "custom_meta_lead_id": meta_lead_id})
+		lead.insert(ignore_permissions=True)
+		self.leads.append(lead.name)
+		return lead
+
+	def test_lead_payload_round_trip(self):
+		raw_lead = {"id": f"{LEAD_PREFIX}1", "form_id": "42", "field_data": [{"name": "email", "values": ["a@example.com"]}]}
+		lead = self.lead(raw_lead["id"])
+		archive_lead_payloads([("Lead", lead.name, raw_lead)])
+		# Archiving the same lead again keeps the first payload.
+		archive_lead_payloads([("Lead", lead.name, {**raw_lead, "form_id": "43"})])
+
+		self.assertEqual(get_lead_payload("Lead", lead.name), raw_lead)
+		self.assertEqual(frappe.db.get_value("Meta Lead Payload", raw_lead["id"], "form_id"), "42")
+		self.assertIsNone(get_lead_payload("Lead", self.lead().name))
+
+		frappe.set_user("Guest")
+		with self.assertRaises(frappe.PermissionError):
+			get_lead_payload("Lead", lead.name)
+
+	def test_patch_archives_lead_json_and_keeps_what_it_cannot_archive(self):
+		if not frappe.db.has_column("Lead", "custom_lead_json"):
+			self.skipTest("Lead has no custom_lead_json column")
+
+		archived = self.lead(f"{LEAD_PREFIX}2")
+		without_id, unparsable = self.lead(), self.lead()
+		values = {
+			archived.name: json.dumps({"form_id": "42", "field_data": []}),
+			without_id.name: json.dumps({"field_data": []}),
+			unparsable.name: "{not json",
+		}
+		for name, value in values.items():
+			frappe.db.set_value("Lead", name, "custom_lead_json", value, update_modified=False)
+
+		archive_custom_lead_json.execute()
+
+		self.assertEqual(get_lead_payload("Lead", archived.name), {"id": archived.custom_meta_lead_id, "form_id": "42", "field_data": []})
+		self.assertFalse(frappe.db.get_value("Lead", archived.name, "custom_lead_json"))
+		for name in (without_id.name, unparsable.name):
+			self.assertEqual(frappe.db.get_value("Lead", name, "custom_lead_json"), values[name])
@@ -0,0 +1,171 @@
+# Copyright (c) 2026, Mansy and contributors
+# For license information, please see license.txt
+
+import json
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, add_to_date, cint, now_datetime
+
+RETRY_JOB_ID = "mansico_meta_lead_quarantine"
+RETRY_LOCK_TTL = 600
+PRUNE_CHUNK_SIZE = 10000
+
+
+class MetaLeadQuarantine(Document):
+	@staticmethod
+	def clear_old_logs(days=30):
+		"""Delete discarded leads older than ``days``; Failed ones stay until someone requeues or discards them."""
+		cutoff = add_days(now_datetime(), -cint(days))
+		while names := frappe.get_all(
+			"Meta Lead Quarantine",
+			filters={"status": "Discarded", "modified": ["<", cutoff]},
+			pluck="name",
+			limit=PRUNE_CHUNK_SIZE,
+		):
+			frappe.db.delete("Meta Lead Quarantine", {"name": ["in", names]})
+			frappe.db.commit()
+
+
+def quarantine_leads(sync_new_add, failures, max_attempts=None):
+	"""Record leads that failed to import, or count another attempt for ones already quarantined.
+
+	``failures`` are ``(raw_lead, exception, traceback)`` tuples. Writes without committing,
+	so the rows land in the same transaction as the page they came from.
+	"""
+	if not failures:
+		return
+	max_attempts = max_attempts or cint(frappe.db.get_single_value("Meta Facebook Settings", "quarantine_max_attempts")) or 5
+	now = now_datetime()
+	known = {
+		row.name: row.attempts
+		for row in frappe.get_all(
+			"Meta Lead Quarantine",
+			filters={"name": ["in", [lead["id"] for lead, _, _ in failures]]},
+			fields=["name", "attempts"],
+		)
+	}
+
+	new_rows = []
+	for lead, error, traceback in failures:
+		attempts = known.get(lead["id"], 0) + 1
+		values = {
+			"status": "Failed" if attempts >= max_attempts else "Quarantined",
+			"attempts": attempts,
+			"next_retry_at": add_to_date(now, minutes=2**attempts),
+			"error_class": type(error).__name__,
+			"error": str(error),
+			"traceback": traceback,
+			"payload": json.dumps(lead),
+		}
+		if lead["id"] in known:
+			frappe.db.set_value("Meta Lead Quarantine", lead["id"], values)
+		else:
+			new_rows.append((
+				lead["id"], now, now, frappe.session.user, frappe.session.user,
+				lead["id"], sync_new_add, lead.get("form_id"), lead.get("created_time"),
+				values["status"], attempts, values["next_retry_at"], values["error_class"], values["error"], values["traceback"], values["payload"],
+			))
+
+	frappe.db.bulk_insert(
+		"Meta Lead Quarantine",
+		["name", "creation", "modified", "owner", "modified_by",
+			"meta_lead_id", "sync_new_add", "form_id", "lead_created_time",
+			"status", "attempts", "next_retry_at", "error_class", "error", "traceback", "payload"],
+		new_rows,
+		ignore_duplicates=True,
+	)
+
+
+def retry_quarantined_leads(limit=500):
+	"""Re-import due quarantined leads from their stored payload, without reading their forms again."""
+	from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import (
+		FetchLeads,
+		SyncRecordLock,
+	)
+
+	rows = frappe.get_all(
+		"Meta Lead Quarantine",
+		filters={"status": "Quarantined", "next_retry_at": ["<=", now_datetime()]},
+		fields=["name", "sync_new_add", "payload"],
+		order_by="next_retry_at asc",
+		limit=limit,
+	)
+	groups = {}
+	for row in rows:
+		groups.setdefault(row.sync_new_add, []).append(row)
+
+	for name, group in groups.items():
+		if not name or not frappe.db.exists("Sync New Add", {"name": name, "docstatus": 1}):
+			_discard([row.name for row in group])
+			continue
+
+		# Share the scheduled run's and the webhook's lock; a busy record is retried on the next tick.
+		lock = SyncRecordLock(name, ttl=RETRY_LOCK_TTL)
+		if not lock.acquire():
+			continue
+
+		leads = [json.loads(row.payload) if isinstance(row.payload, str) else row.payload for row in group]
+		leads = [lead for lead in leads if lead and lead.get("id")]
+		try:
+			fetch = FetchLeads(name)
+			fetch.retry_leads(leads)
+
+			# Leads that are in the lead doctype now were imported by this or an earlier attempt.
+			imported = frappe.get_all(
+				fetch.doc.lead_doctype_name,
+				filters={"custom_meta_lead_id": ["in", [row.name for row in group]]},
+				pluck="custom_meta_lead_id",
+			)
+			if imported:
+				frappe.db.delete("Meta Lead Quarantine", {"name": ["in", imported]})
+		except Exception as e:
+			# Count the attempt for the whole group (missing Page ID, settings, lead doctype, ...) so
+			# backoff and the max-attempts cutoff apply instead of retrying it on every tick.
+			traceback = frappe.get_traceback()
+			frappe.db.rollback()
+			quarantine_leads(name, [(lead, e, traceback) for lead in leads])
+		finally:
+			lock.release()
+		frappe.db.commit()
+
+
+def enqueue_retry():
+	if not frappe.db.exists("Meta Lead Quarantine", {"status": "Quarantined", "next_retry_at": ["<=", now_datetime()]}):
+		return
+	frappe.enqueue(
+		"mansico_meta_integration.mansico_meta_integration.doctype.meta_lead_quarantine.meta_lead_quarantine.retry_quarantined_leads",
+		queue="long",
+		job_id=RETRY_JOB_ID,
+		deduplicate=True,
+	)
+
+
+def _parse_names(names):
+	return json.loads(names) if isinstance(names, str) else list(names or [])
+
+
+@frappe.whitelist()
+def requeue(names):
+	"""Retry the selected leads on the next tick, with a fresh attempt count."""
+	frappe.only_for("System Manager")
+	names = _parse_names(names)
+	if names:
+		frappe.db.set_value(
+			"Meta Lead Quarantine",
+			{"name": ["in", names]},
+			{"status": "Quarantined", "attempts": 0, "next_retry_at": now_datetime()},
+		)
+		enqueue_retry()
+
+
+@frappe.whitelist()
+def discard(names):
+	"""Stop retrying the selected leads; discarded rows are pruned with the sync log."""
+	frappe.only_for("System Manager")
+	_discard(_parse_names(names))
+
+
+def _discard(names):
+	if names:
+		frappe.db.set_value("Meta Lead Quarantine", {"name": ["in", names]}, "status", "Discarded")
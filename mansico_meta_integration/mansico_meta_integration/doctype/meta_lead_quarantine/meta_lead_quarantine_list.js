@@ -0,0 +1,29 @@
+// Copyright (c) 2026, Mansy and contributors
+// For license information, please see license.txt
+
+const QUARANTINE_METHOD = "mansico_meta_integration.mansico_meta_integration.doctype.meta_lead_quarantine.meta_lead_quarantine";
+
+frappe.listview_settings["Meta Lead Quarantine"] = {
+	get_indicator(doc) {
+		const colors = { Quarantined: "orange", Failed: "red", Discarded: "gray" };
+		return [__(doc.status), colors[doc.status], `status,=,${doc.status}`];
+	},
+	onload(listview) {
+		const bulk_action = (label, method) => {
+			listview.page.add_actions_menu_item(__(label), () => {
+				const names = listview.get_checked_items(true);
+				if (!names.length) {
+					return;
+				}
+				frappe.call({
+					method: `${QUARANTINE_METHOD}.${method}`,
+					args: { names },
+					freeze: true,
+					callback: () => listview.refresh(),
+				});
+			});
+		};
+		bulk_action("Requeue", "requeue");
+		bulk_action("Discard", "discard");
+	},
+};
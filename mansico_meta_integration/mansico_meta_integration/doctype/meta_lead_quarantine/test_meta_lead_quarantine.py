@@ -0,0 +1,122 @@
+# Copyright (c) 2026, Mansy and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, add_to_date, get_datetime, now_datetime
+
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_lead_quarantine.meta_lead_quarantine import (
+	MetaLeadQuarantine,
+	discard,
+	quarantine_leads,
+	requeue,
+	retry_quarantined_leads,
+)
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import SyncRecordLock
+from mansico_meta_integration.tests.benchmark import FAKE_FORM_PREFIX, fake_sync_record
+from mansico_meta_integration.tests.fake_graph_server import FakeGraphServer
+
+LEAD_PREFIX = "test-quarantine-"
+
+
+def fake_lead(index):
+	return {
+		"id": f"{LEAD_PREFIX}{index}",
+		"form_id": f"{FAKE_FORM_PREFIX}0000",
+		"created_time": "2024-01-01T00:00:00+0000",
+		"field_data": [],
+	}
+
+
+class TestMetaLeadQuarantine(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.delete("Meta Lead Quarantine", {"name": ["like", f"{LEAD_PREFIX}%"]})
+		frappe.db.commit()
+
+	def fail(self, lead, sync_new_add="Missing Sync", max_attempts=3):
+		quarantine_leads(sync_new_add, [(lead, ValueError("Mandatory field missing"), "Traceback ...")], max_attempts)
+		return frappe.get_doc("Meta Lead Quarantine", lead["id"])
+
+	def test_attempts_back_off_until_failed(self):
+		lead = fake_lead(1)
+		row = self.fail(lead)
+		self.assertEqual((row.status, row.attempts, row.error_class), ("Quarantined", 1, "ValueError"))
+		self.assertEqual(row.traceback, "Traceback ...")
+		self.assertEqual(frappe.parse_json(row.payload)["id"], lead["id"])
+		self.assertGreater(get_datetime(row.next_retry_at), add_to_date(now_datetime(), minutes=1))
+
+		row = self.fail(lead)
+		self.assertEqual((row.status, row.attempts), ("Quarantined", 2))
+		self.assertGreater(get_datetime(row.next_retry_at), add_to_date(now_datetime(), minutes=3))
+
+		row = self.fail(lead)
+		self.assertEqual((row.status, row.attempts), ("Failed", 3))
+
+	def test_requeue_resets_attempts(self):
+		lead = fake_lead(2)
+		for _ in range(3):
+			self.fail(lead)
+
+		requeue(frappe.as_json([lead["id"]]))
+		row = frappe.get_doc("Meta Lead Quarantine", lead["id"])
+		self.assertEqual((row.status, row.attempts), ("Quarantined", 0))
+		self.assertLessEqual(get_datetime(row.next_retry_at), now_datetime())
+
+		row = self.fail(lead)
+		self.assertEqual((row.status, row.attempts), ("Quarantined", 1))
+
+	def test_discarded_leads_are_pruned(self):
+		discarded, failed = fake_lead(3), fake_lead(4)
+		self.fail(discarded)
+		for _ in range(3):
+			self.fail(failed)
+
+		discard([discarded["id"]])
+		self.assertEqual(frappe.db.get_value("Meta Lead Quarantine", discarded["id"], "status"), "Discarded")
+
+		old = add_days(now_datetime(), -40)
+		for lead in (discarded, failed):
+			frappe.db.set_value("Meta Lead Quarantine", lead["id"], "modified", old, update_modified=False)
+		MetaLeadQuarantine.clear_old_logs(30)
+		self.assertFalse(frappe.db.exists("Meta Lead Quarantine", discarded["id"]))
+		self.assertTrue(frappe.db.exists("Meta Lead Quarantine", failed["id"]))
+
+	def test_retry_of_missing_sync_record_discards(self):
+		lead = fake_lead(5)
+		self.fail(lead)
+		frappe.db.set_value("Meta Lead Quarantine", lead["id"], "next_retry_at", now_datetime())
+
+		retry_quarantined_leads()
+		self.assertEqual(frappe.db.get_value("Meta Lead Quarantine", lead["id"], "status"), "Discarded")
+
+	def test_retry_skips_a_busy_sync_record(self):
+		lead = fake_lead(7)
+		with FakeGraphServer(forms={lead["form_id"]: 1}) as server, fake_sync_record(server) as doc:
+			self.fail(lead, sync_new_add=doc.name)
+			frappe.db.set_value("Meta Lead Quarantine", lead["id"], "next_retry_at", now_datetime())
+			lock = SyncRecordLock(doc.name, ttl=60)
+			self.assertTrue(lock.acquire())
+			try:
+				retry_quarantined_leads()
+			finally:
+				lock.release()
+
+			row = frappe.get_doc("Meta Lead Quarantine", lead["id"])
+			self.assertEqual((row.status, row.attempts), ("Quarantined", 1))
+			self.assertLessEqual(get_datetime(row.next_retry_at), now_datetime())
+
+	def test_failed_retry_group_counts_an_attempt(self):
+		lead = fake_lead(6)
+		with FakeGraphServer(forms={lead["form_id"]: 1}) as server, fake_sync_record(server) as doc:
+			lead_doctype = doc.lead_doctype_name
+			doc.db_set("lead_doctype_name", "Missing Lead Doctype")
+			try:
+				self.fail(lead, sync_new_add=doc.name)
+				frappe.db.set_value("Meta Lead Quarantine", lead["id"], "next_retry_at", now_datetime())
+
+				retry_quarantined_leads()
+				row = frappe.get_doc("Meta Lead Quarantine", lead["id"])
+				self.assertEqual((row.status, row.attempts), ("Quarantined", 2))
+				self.assertGreater(get_datetime(row.next_retry_at), now_datetime())
+			finally:
+				doc.db_set("lead_doctype_name", lead_doctype)
@@ -0,0 +1,99 @@
+# Copyright (c) 2026, Mansy and contributors
+# For license information, please see license.txt
+
+import json
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, cint, now_datetime
+
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.payload_codec import (
+	compress_json,
+	decompress_json,
+)
+
+PRUNE_CHUNK_SIZE = 10000
+# bulk_insert has no retry on a duplicate name, so names must not collide across millions of rows.
+LOG_NAME_LENGTH = 32
+
+
+class MetaSyncLog(Document):
+	@staticmethod
+	def clear_old_logs(days=30):
+		"""Delete rows older than ``days`` in chunks, so pruning never holds a long lock."""
+		cutoff = add_days(now_datetime(), -cint(days))
+		while names := frappe.get_all(
+			"Meta Sync Log", filters={"creation": ["<", cutoff]}, pluck="name", limit=PRUNE_CHUNK_SIZE
+		):
+			frappe.db.delete("Meta Sync Log", {"name": ["in", names]})
+			frappe.db.commit()
+
+
+def _response_id(response):
+	if not isinstance(response, str):
+		return None
+	try:
+		body = json.loads(response)
+	except ValueError:
+		return None
+	if not isinstance(body, dict):
+		return None
+	error = body.get("error")
+	if isinstance(error, dict):
+		return error.get("fbtrace_id")
+	return body.get("fbtrace_id")
+
+
+def log_lead_events(results, lead_doctype=None):
+	"""Write one Meta Sync Log row per Conversions API result with a single bulk insert."""
+	if not results:
+		return
+
+	store_payloads = cint(frappe.db.get_single_value("Meta Facebook Settings", "store_sync_payloads"))
+	now = now_datetime()
+	user = frappe.session.user
+	fields = [
+		"name", "creation", "modified", "owner", "modified_by",
+		"lead_doctype", "lead_name", "event_name", "status_code", "response_id", "payload",
+	]
+	values = [
+		(
+			frappe.generate_hash(length=LOG_NAME_LENGTH), now, now, user, user,
+			result.lead.get("doctype") or lead_doctype,
+			result.lead.name,
+			(result.event or {}).get("event_name"),
+			result.get("status_code") or 0,
+			_response_id(result.response),
+			compress_json(result.event) if store_payloads and result.event else None,
+		)
+		for result in results
+	]
+	frappe.db.bulk_insert("Meta Sync Log", fields, values)
+
+
+@frappe.whitelist()
+def get_payload(name):
+	"""Return the decompressed payload of a Meta Sync Log row."""
+	frappe.has_permission("Meta Sync Log", "read", throw=True)
+	return decompress_json(frappe.db.get_value("Meta Sync Log", name, "payload"))
+
+
+@frappe.whitelist()
+def get_sync_log_counts(from_date=None, to_date=None):
+	"""Aggregate counts per event and status code, e.g. for a dashboard."""
+	frappe.has_permission("Meta Sync Log", "read", throw=True)
+	filters = {}
+	if from_date and to_date:
+		filters["creation"] = ["between", [from_date, to_date]]
+	elif from_date:
+		filters["creation"] = [">=", from_date]
+	elif to_date:
+		filters["creation"] = ["<=", to_date]
+
+	return frappe.get_all(
+		"Meta Sync Log",
+		filters=filters,
+		fields=["event_name", "status_code", "count(name) as count"],
+		group_by="event_name, status_code",
+		order_by="count desc",
+	)
@@ -0,0 +1,93 @@
+# Copyright (c) 2026, Mansy and Contributors
+# See license.txt
+
+import json
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, now_datetime
+
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_sync_log.meta_sync_log import (
+	LOG_NAME_LENGTH,
+	MetaSyncLog,
+	get_payload,
+	get_sync_log_counts,
+	log_lead_events,
+)
+
+LEAD_PREFIX = "test-sync-log-"
+
+
+def fake_result(index, event_name="TestLogOpen", status_code=200):
+	event = {"event_name": event_name, "event_time": 1704067200, "user_data": {"lead_id": f"{LEAD_PREFIX}{index}"}}
+	return frappe._dict(
+		lead=frappe._dict(name=f"{LEAD_PREFIX}{index}"),
+		event=event,
+		ok=status_code == 200,
+		response=json.dumps({"events_received": 1, "fbtrace_id": f"trace-{index}"}),
+		status_code=status_code,
+	)
+
+
+class TestMetaSyncLog(FrappeTestCase):
+	def setUp(self):
+		self.store_sync_payloads = frappe.db.get_single_value("Meta Facebook Settings", "store_sync_payloads")
+
+	def tearDown(self):
+		frappe.db.delete("Meta Sync Log", {"lead_name": ["like", f"{LEAD_PREFIX}%"]})
+		frappe.db.set_single_value("Meta Facebook Settings", "store_sync_payloads", self.store_sync_payloads)
+		frappe.db.commit()
+
+	def logs(self):
+		return frappe.get_all(
+			"Meta Sync Log",
+			{"lead_name": ["like", f"{LEAD_PREFIX}%"]},
+			["name", "lead_doctype", "lead_name", "event_name", "status_code", "response_id", "payload"],
+			order_by="lead_name asc",
+		)
+
+	def test_events_are_logged_without_payloads_by_default(self):
+		frappe.db.set_single_value("Meta Facebook Settings", "store_sync_payloads", 0)
+		log_lead_events([fake_result(1), fake_result(2)], "Lead")
+
+		logs = self.logs()
+		self.assertEqual([(log.lead_doctype, log.lead_name, log.response_id) for log in logs], [
+			("Lead", f"{LEAD_PREFIX}1", "trace-1"),
+			("Lead", f"{LEAD_PREFIX}2", "trace-2"),
+		])
+		self.assertFalse(any(log.payload for log in logs))
+		self.assertEqual({len(log.name) for log in logs}, {LOG_NAME_LENGTH})
+
+	def test_payloads_are_stored_compressed_when_enabled(self):
+		frappe.db.set_single_value("Meta Facebook Settings", "store_sync_payloads", 1)
+		result = fake_result(3)
+		log_lead_events([result], "Lead")
+
+		log = self.logs()[0]
+		self.assertNotEqual(log.payload, json.dumps(result.event))
+		self.assertEqual(get_payload(log.name), result.event)
+
+	def test_old_logs_are_pruned(self):
+		log_lead_events([fake_result(4), fake_result(5)], "Lead")
+		old = self.logs()[0]
+		frappe.db.set_value("Meta Sync Log", old.name, "creation", add_days(now_datetime(), -40), update_modified=False)
+
+		MetaSyncLog.clear_old_logs(30)
+		self.assertEqual([log.lead_name for log in self.logs()], [f"{LEAD_PREFIX}5"])
+
+	def test_counts_per_event_and_status_code(self):
+		started = add_days(now_datetime(), -1)
+		log_lead_events([
+			fake_result(6, "TestLogOpen"),
+			fake_result(7, "TestLogOpen"),
+			fake_result(8, "TestLogOpen", status_code=400),
+			fake_result(9, "TestLogConverted"),
+		], "Lead")
+
+		counts = {
+			(row.event_name, row.status_code): row.count
+			for row in get_sync_log_counts(from_date=started)
+			if (row.event_name or "").startswith("TestLog")
+		}
+		self.assertEqual(counts, {("TestLogOpen", 200): 2, ("TestLogOpen", 400): 1, ("TestLogConverted", 200): 1})
+		self.assertFalse([row for row in get_sync_log_counts(to_date=started) if (row.event_name or "").startswith("TestLog")])
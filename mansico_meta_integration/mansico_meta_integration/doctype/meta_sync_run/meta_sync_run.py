@@ -0,0 +1,30 @@
+# Copyright (c) 2026, Mansy and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, cint, now_datetime
+from werkzeug.wrappers import Response
+
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_metrics import prometheus_text
+
+PRUNE_CHUNK_SIZE = 10000
+
+
+class MetaSyncRun(Document):
+	@staticmethod
+	def clear_old_logs(days=30):
+		"""Delete runs older than ``days`` in chunks; the Prometheus counters are kept in Redis."""
+		cutoff = add_days(now_datetime(), -cint(days))
+		while names := frappe.get_all(
+			"Meta Sync Run", filters={"creation": ["<", cutoff]}, pluck="name", limit=PRUNE_CHUNK_SIZE
+		):
+			frappe.db.delete("Meta Sync Run", {"name": ["in", names]})
+			frappe.db.commit()
+
+
+@frappe.whitelist(methods=["GET"])
+def prometheus():
+	"""Sync metrics in the Prometheus text format; scrape with an API key of a System Manager."""
+	frappe.only_for("System Manager")
+	return Response(prometheus_text(), mimetype="text/plain; version=0.0.4")
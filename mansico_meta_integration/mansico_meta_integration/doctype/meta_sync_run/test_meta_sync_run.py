@@ -0,0 +1,67 @@
+# Copyright (c) 2026, Mansy and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_sync_run.meta_sync_run import prometheus
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_metrics import (
+	SyncMetrics,
+	prometheus_text,
+)
+
+SYNC_NAME = 'Sync "A"\\B\nC'
+SYNC_LABEL = 'Sync \\"A\\"\\\\B\\nC'
+
+
+class TestMetaSyncRun(FrappeTestCase):
+	def setUp(self):
+		frappe.cache().delete(frappe.cache().make_key(SyncMetrics.redis_key))
+
+	def tearDown(self):
+		frappe.set_user("Administrator")
+		frappe.cache().delete(frappe.cache().make_key(SyncMetrics.redis_key))
+
+	def export_run(self):
+		with SyncMetrics.run(SYNC_NAME, "1234") as metrics:
+			SyncMetrics.record_call("GET", "https://graph.facebook.com/v19.0/1234/leads", 0.5, frappe._dict(status_code=200))
+			SyncMetrics.incr("pages", form_id="f1")
+			SyncMetrics.incr("inserted", 2, form_id="f1")
+			SyncMetrics.record_capi_batch(2)
+		metrics.export("Completed", 1.5)
+
+	def test_prometheus_text(self):
+		self.export_run()
+		self.export_run()
+		lines = prometheus_text().splitlines()
+
+		for line in (
+			"# TYPE mansico_meta_sync_runs_total counter",
+			f'mansico_meta_sync_runs_total{{sync="{SYNC_LABEL}",status="Completed"}} 2',
+			f'mansico_meta_graph_requests_total{{sync="{SYNC_LABEL}",endpoint="leads",code="200"}} 2',
+			"# TYPE mansico_meta_graph_request_seconds histogram",
+			'mansico_meta_graph_request_seconds_bucket{endpoint="leads",le="0.5"} 2',
+			'mansico_meta_graph_request_seconds_bucket{endpoint="leads",le="+Inf"} 2',
+			'mansico_meta_graph_request_seconds_count{endpoint="leads"} 2',
+			'mansico_meta_graph_request_seconds_sum{endpoint="leads"} 1',
+			f'mansico_meta_pages_total{{sync="{SYNC_LABEL}",form="f1"}} 2',
+			f'mansico_meta_leads_total{{sync="{SYNC_LABEL}",form="f1",outcome="inserted"}} 4',
+			f'mansico_meta_capi_events_total{{sync="{SYNC_LABEL}"}} 4',
+			f'mansico_meta_sync_last_run_seconds{{sync="{SYNC_LABEL}"}} 1.5',
+		):
+			self.assertIn(line, lines)
+
+		# Empty buckets and outcomes are not exported, and the name never breaks a line.
+		self.assertNotIn('mansico_meta_graph_request_seconds_bucket{endpoint="leads",le="0.25"} 0', lines)
+		self.assertFalse([line for line in lines if 'outcome="failed"' in line])
+		self.assertTrue(all(line.startswith(("# TYPE mansico_meta_", "mansico_meta_")) for line in lines))
+
+	def test_endpoint_is_for_system_managers(self):
+		self.export_run()
+		response = prometheus()
+		self.assertEqual(response.status_code, 200)
+		self.assertIn("mansico_meta_sync_runs_total", response.get_data(as_text=True))
+
+		frappe.set_user("Guest")
+		with self.assertRaises(frappe.PermissionError):
+			prometheus()
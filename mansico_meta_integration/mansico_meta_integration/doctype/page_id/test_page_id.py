@@ -1,9 +1,59 @@
 # Copyright (c) 2024, Mansy and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import now_datetime
+
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import (
+	PageAccessTokenCache,
+	get_page_access_token,
+	prefetch_page_access_tokens,
+)
+from mansico_meta_integration.tests.benchmark import FAKE_PAGE_ID, fake_sync_record
+from mansico_meta_integration.tests.fake_graph_server import FakeGraphServer
 
 
 class TestPageID(FrappeTestCase):
-	pass
+	def test_page_token_is_cached_until_page_changes(self):
+		with FakeGraphServer() as server, fake_sync_record(server):
+			server.reset_counters()
+			self.assertEqual(get_page_access_token(FAKE_PAGE_ID), f"fake-page-token-{FAKE_PAGE_ID}")
+			get_page_access_token(FAKE_PAGE_ID)
+			self.assertEqual(server.calls["token"], 1)
+
+			page = frappe.get_doc("Page ID", FAKE_PAGE_ID)
+			page.name1 = "Renamed Benchmark Page"
+			page.save(ignore_permissions=True)
+			get_page_access_token(FAKE_PAGE_ID)
+			self.assertEqual(server.calls["token"], 2)
+			PageAccessTokenCache.clear(FAKE_PAGE_ID)
+
+	def test_page_token_survives_settings_bookkeeping(self):
+		with FakeGraphServer() as server, fake_sync_record(server):
+			server.reset_counters()
+			get_page_access_token(FAKE_PAGE_ID)
+			synced_upto = frappe.db.get_single_value("Meta Facebook Settings", "audience_synced_upto")
+			frappe.db.set_single_value("Meta Facebook Settings", "audience_synced_upto", now_datetime())
+			try:
+				get_page_access_token(FAKE_PAGE_ID)
+				self.assertEqual(server.calls["token"], 1)
+
+				# A new access token is a different set of credentials.
+				defaults = frappe.get_doc("Meta Facebook Settings")
+				defaults.access_token = f"{defaults.access_token}-rotated"
+				self.assertNotEqual(PageAccessTokenCache(defaults).key(FAKE_PAGE_ID), PageAccessTokenCache().key(FAKE_PAGE_ID))
+			finally:
+				frappe.db.set_single_value("Meta Facebook Settings", "audience_synced_upto", synced_upto)
+				PageAccessTokenCache.clear(FAKE_PAGE_ID)
+
+	def test_page_tokens_are_prefetched_in_one_call(self):
+		other_page_id = "9990000000003"
+		with FakeGraphServer(pages=[FAKE_PAGE_ID, other_page_id]) as server, fake_sync_record(server):
+			server.reset_counters()
+			prefetch_page_access_tokens([FAKE_PAGE_ID, other_page_id])
+			self.assertEqual(get_page_access_token(FAKE_PAGE_ID), f"fake-page-token-{FAKE_PAGE_ID}")
+			self.assertEqual(get_page_access_token(other_page_id), f"fake-page-token-{other_page_id}")
+			self.assertEqual(server.calls["accounts"], 1)
+			self.assertEqual(server.calls["token"], 0)
+			PageAccessTokenCache.clear()
@@ -0,0 +1,264 @@
+import json
+import time
+from zoneinfo import ZoneInfo
+
+import frappe
+from frappe.utils import cint, get_datetime, get_system_timezone, now_datetime
+
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.graph_throttle import GraphThrottled
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import (
+    FetchLeads,
+    RunDeadlineReached,
+    SyncRecordLock,
+    get_credentials,
+    get_page_access_token,
+)
+
+BACKFILL_JOB_TIMEOUT = 1500
+# Seconds a job keeps in hand before the RQ timeout to checkpoint and hand over to the next job.
+BACKFILL_JOB_MARGIN = 60
+DAY = 24 * 60 * 60
+
+
+def system_timestamp(value):
+    """Unix time of a naive date/datetime stored in the site's time zone."""
+    return int(get_datetime(value).replace(tzinfo=ZoneInfo(get_system_timezone())).timestamp())
+
+
+class BackfillCursor:
+    """What is left of a form's backfill range, imported newest window first.
+
+    The Meta Forms row keeps ``before`` (everything at or after it is done)
+    and the Graph ``after`` cursor of the last page read in the current
+    window, so a killed job resumes where it stopped.
+    """
+
+    def __init__(self, form, start, window):
+        self.form = form
+        self.start = start
+        state = form.backfill_checkpoint or {}
+        if isinstance(state, str):
+            state = json.loads(state)
+        self.before = state.get("before")
+        self.after = state.get("after")
+        self.lower = max(start, self.before - window) if self.before else start
+        self.completed = False
+
+    @property
+    def done(self):
+        return not self.before or self.before <= self.start
+
+    @property
+    def filtering(self):
+        return [
+            {"field": "time_created", "operator": "GREATER_THAN", "value": self.lower - 1},
+            {"field": "time_created", "operator": "LESS_THAN", "value": self.before},
+        ]
+
+    def is_boundary(self, lead):
+        return False
+
+    def track(self, lead):
+        pass
+
+    def checkpoint(self, after):
+        self.after = after
+        self.write()
+
+    def save(self):
+        """Move on to the next window once the current one was read to the end."""
+        if not self.completed:
+            return
+        self.before, self.after = self.lower, None
+        self.write()
+
+    def write(self):
+        frappe.db.set_value(
+            "Meta Forms", self.form.name, "backfill_checkpoint", json.dumps({"before": self.before, "after": self.after})
+        )
+        frappe.db.commit()
+
+
+class Backfill:
+    """Import the history of a Sync New Add between Backfill From and the moment the backfill started.
+
+    Each job reads one date window per form, page by page, at no more than
+    Backfill Rate leads per minute, then hands over to a new job. It runs
+    under its own lock, so scheduled syncs of the record keep importing new
+    leads while it works.
+    """
+
+    realtime_event = "mansico_meta_backfill"
+
+    def __init__(self, name):
+        self.name = name
+        self.doc = frappe.get_doc("Sync New Add", name)
+        self.start = system_timestamp(self.doc.backfill_from)
+        self.until = system_timestamp(self.doc.backfill_until)
+        self.window = max(cint(self.doc.backfill_window_days) or 7, 1) * DAY
+
+    def cursors(self):
+        return [BackfillCursor(form, self.start, self.window) for form in self.doc.table_hsya if form.form_id]
+
+    def run(self, deadline):
+        """Import one window per form.
+
+        Returns "Completed" once every form reached Backfill From, "Next" when
+        the next job should continue right away and "Wait" when the next
+        scheduler tick should (throttled, paused or failed).
+        """
+        fetch = FetchLeads(self.name, deadline=deadline)
+        fetch.doc = self.doc
+        fetch.page = frappe.get_doc("Page ID", self.doc.page_id)
+        fetch.defaults = get_credentials()
+        fetch.page_access_token = get_page_access_token(self.doc.page_id, fetch.defaults)
+
+        started, leads_read = time.monotonic(), 0
+        rate = cint(self.doc.backfill_rate)
+        try:
+            for cursor in self.cursors():
+                if cursor.done:
+                    continue
+                fetch.check_budget()
+                for lead_forms in fetch.iter_lead_pages(fetch.lead_request(cursor)):
+                    fetch.import_lead_page(cursor, lead_forms)
+                    leads_read += len(lead_forms.get("data") or [])
+                    self.report(len(lead_forms.get("data") or []))
+                    if rate:
+                        # Sleep until the job is back under the configured leads per minute.
+                        behind = leads_read * 60 / rate - (time.monotonic() - started)
+                        time.sleep(max(min(behind, deadline - time.monotonic()), 0))
+                    if not self.is_running():
+                        return "Wait"
+                    fetch.check_budget()
+                cursor.save()
+        except RunDeadlineReached:
+            return "Next"
+        except GraphThrottled:
+            return "Wait"
+        except frappe.ValidationError as e:
+            frappe.log_error("Backfill Error", f"Backfill of {self.name} stopped, the next job resumes from the last checkpoint: {str(e)}")
+            return "Wait"
+
+        return "Completed" if all(cursor.done for cursor in self.cursors()) else "Next"
+
+    def is_running(self):
+        return frappe.db.get_value("Sync New Add", self.name, "backfill_status") == "Running"
+
+    def progress(self):
+        """Share of the backfill range already imported, averaged over forms."""
+        span = max(self.until - self.start, 1)
+        cursors = self.cursors()
+        if not cursors:
+            return 100
+        return round(sum(
+            100 if cursor.done else min(max((self.until - cursor.before) * 100 / span, 0), 100)
+            for cursor in cursors
+        ) / len(cursors), 1)
+
+    def report(self, leads_read=0, status=None):
+        self.doc.reload()
+        values = {"backfill_progress": 100 if status == "Completed" else self.progress()}
+        if leads_read:
+            values["backfill_leads"] = cint(self.doc.backfill_leads) + leads_read
+        if status:
+            values["backfill_status"] = status
+        frappe.db.set_value("Sync New Add", self.name, values, update_modified=False)
+        frappe.db.commit()
+        frappe.publish_realtime(
+            self.realtime_event,
+            {
+                "name": self.name,
+                "progress": values["backfill_progress"],
+                "leads": values.get("backfill_leads", cint(self.doc.backfill_leads)),
+                "status": status or self.doc.backfill_status,
+            },
+            doctype="Sync New Add",
+            docname=self.name,
+        )
+
+
+def enqueue_backfill(name, chained=False):
+    settings = frappe.get_cached_doc("Meta Facebook Settings")
+    timeout = cint(settings.sync_job_timeout) or BACKFILL_JOB_TIMEOUT
+    frappe.enqueue(
+        "mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.backfill.run_backfill",
+        queue=settings.sync_queue or "long",
+        timeout=timeout,
+        # A running job cannot dedupe against its own job id, so hand-overs go without one.
+        job_id=None if chained else f"mansico_meta_backfill::{name}",
+        deduplicate=not chained,
+        enqueue_after_commit=True,
+        name=name,
+        timeout_in_sec=timeout,
+    )
+
+
+def run_backfill(name, timeout_in_sec=BACKFILL_JOB_TIMEOUT):
+    lock = SyncRecordLock(f"{name}:backfill", ttl=timeout_in_sec + BACKFILL_JOB_MARGIN)
+    if not lock.acquire():
+        return
+
+    try:
+        backfill = Backfill(name)
+        if backfill.doc.backfill_status != "Running":
+            return
+        deadline = time.monotonic() + max(timeout_in_sec - BACKFILL_JOB_MARGIN, BACKFILL_JOB_MARGIN)
+        outcome = backfill.run(deadline)
+        if outcome == "Completed":
+            backfill.report(status="Completed")
+        elif outcome == "Next" and backfill.is_running():
+            enqueue_backfill(name, chained=True)
+    finally:
+        lock.release()
+
+
+@frappe.whitelist()
+def start_backfill(name):
+    """Start importing history from Backfill From up to now."""
+    doc = frappe.get_doc("Sync New Add", name)
+    doc.check_permission("write")
+    if doc.docstatus != 1:
+        frappe.throw("Submit the Sync New Add before starting a backfill")
+    if not doc.backfill_from:
+        frappe.throw("Set Backfill From first")
+    if doc.backfill_status == "Running":
+        frappe.throw("A backfill is already running")
+
+    until = now_datetime()
+    until_timestamp = system_timestamp(until)
+    if system_timestamp(doc.backfill_from) >= until_timestamp:
+        frappe.throw("Backfill From must be in the past")
+
+    for form in doc.table_hsya:
+        values = {"backfill_checkpoint": json.dumps({"before": until_timestamp, "after": None})}
+        if not form.last_lead_created_time:
+            # Scheduled syncs take over from the backfill's upper bound instead of reading the history too.
+            values["last_lead_created_time"] = time.strftime("%Y-%m-%dT%H:%M:%S+0000", time.gmtime(until_timestamp))
+        frappe.db.set_value("Meta Forms", form.name, values)
+
+    doc.db_set({"backfill_status": "Running", "backfill_until": until, "backfill_progress": 0, "backfill_leads": 0})
+    enqueue_backfill(name)
+
+
+@frappe.whitelist()
+def pause_backfill(name):
+    doc = frappe.get_doc("Sync New Add", name)
+    doc.check_permission("write")
+    if doc.backfill_status == "Running":
+        doc.db_set("backfill_status", "Paused")
+
+
+@frappe.whitelist()
+def resume_backfill(name):
+    doc = frappe.get_doc("Sync New Add", name)
+    doc.check_permission("write")
+    if doc.backfill_status == "Paused":
+        doc.db_set("backfill_status", "Running")
+        enqueue_backfill(name)
+
+
+def continue_backfills():
+    """Restart running backfills whose job chain broke, e.g. after a worker restart or a throttle deferral."""
+    for name in frappe.get_all("Sync New Add", {"docstatus": 1, "backfill_status": "Running"}, pluck="name"):
+        enqueue_backfill(name)
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import frappe
+from frappe.utils import cint
+
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_metrics import SyncMetrics
+
+
+class GraphSession:
+    """Process-wide pooled HTTP session for Graph API calls.
+
+    One ``requests.Session`` is kept per connection setting, so every request
+    class reuses keep-alive connections instead of opening a new TLS
+    connection per call. Connection errors are retried by the transport; 5xx
+    responses are only retried for GETs, since a repeated POST may duplicate
+    events.
+    """
+
+    default_pool_size = 10
+    default_timeout = 30
+    default_max_retries = 2
+
+    _sessions = {}
+    _lock = threading.Lock()
+
+    def __init__(self, pool_size, timeout, max_retries):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def for_settings(cls, settings=None):
+        """Return the shared session for the connection options in Meta Facebook Settings."""
+        settings = settings or frappe.get_cached_doc("Meta Facebook Settings")
+        max_retries = settings.get("http_max_retries")
+        key = (
+            cint(settings.get("http_pool_size")) or cls.default_pool_size,
+            cint(settings.get("http_timeout")) or cls.default_timeout,
+            cls.default_max_retries if max_retries is None else cint(max_retries),
+        )
+        with cls._lock:
+            if key not in cls._sessions:
+                cls._sessions[key] = cls(*key)
+            return cls._sessions[key]
+
+    def get(self, url, params=None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.timed("GET", url, self.session.get, url, params=params, **kwargs)
+
+    def post(self, url, params=None, json=None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.timed("POST", url, self.session.post, url, params=params, json=json, **kwargs)
+
+    def delete(self, url, params=None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.timed("DELETE", url, self.session.delete, url, params=params, **kwargs)
+
+    @staticmethod
+    def timed(method, url, send, *args, **kwargs):
+        """Send a request and report its latency to the sync run in progress, if any."""
+        started = time.monotonic()
+        response = None
+        try:
+            response = send(*args, **kwargs)
+            return response
+        finally:
+            SyncMetrics.record_call(method, url, time.monotonic() - started, response)
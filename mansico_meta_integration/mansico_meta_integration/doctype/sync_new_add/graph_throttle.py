@@ -0,0 +1,136 @@
+import json
+import time
+
+import frappe
+
+RATE_LIMIT_ERROR_CODES = {4, 17, 32, 613}
+
+
+class GraphThrottled(frappe.ValidationError):
+    """Graph usage is high enough that the current work should be rescheduled."""
+
+    def __init__(self, retry_at):
+        self.retry_at = retry_at
+        super().__init__(f"Graph API usage is throttled for {max(int(retry_at - time.time()), 0)} more seconds")
+
+
+def _load_header(headers, name):
+    try:
+        return json.loads(headers.get(name) or "null")
+    except ValueError:
+        return None
+
+
+def _percent(values):
+    return max([float(value) for value in values if isinstance(value, (int, float))] or [0])
+
+
+def parse_usage_headers(headers):
+    """Read Meta's usage headers into ``{"app", "objects", "ad_account"}``.
+
+    Percentages are the highest of call count, CPU time and total time. Only
+    touches ``headers``, so it is safe to call from worker threads.
+    """
+    usage = {"app": None, "objects": {}, "ad_account": None}
+
+    app_usage = _load_header(headers, "X-App-Usage")
+    if isinstance(app_usage, dict):
+        usage["app"] = _percent(app_usage.values())
+
+    business_usage = _load_header(headers, "X-Business-Use-Case-Usage")
+    if isinstance(business_usage, dict):
+        for object_id, entries in business_usage.items():
+            entries = entries if isinstance(entries, list) else [entries]
+            percent = _percent(
+                [entry.get(key) for entry in entries for key in ("call_count", "total_cputime", "total_time")]
+            )
+            regain_after = _percent([entry.get("estimated_time_to_regain_access") for entry in entries]) * 60
+            usage["objects"][str(object_id)] = (percent, regain_after)
+
+    ad_account_usage = _load_header(headers, "X-Ad-Account-Usage")
+    if isinstance(ad_account_usage, dict):
+        usage["ad_account"] = (
+            _percent([ad_account_usage.get("acc_id_util_pct")]),
+            _percent([ad_account_usage.get("reset_time_duration")]),
+        )
+
+    return usage
+
+
+class GraphThrottle:
+    """Per-app and per-page Graph API budgets kept in Redis.
+
+    Every response feeds its usage headers in through ``record``. Callers ask
+    ``check`` before doing more work and get ``GraphThrottled`` with the time
+    to come back, so the work is rescheduled instead of sleeping in a worker.
+    Above ``slow_down_at`` percent, ``page_budget`` caps how many pages a run
+    reads before yielding to the next tick. The ad account budget only limits
+    Marketing API work such as Custom Audience uploads, so it is checked only
+    when asked for with ``ad_account=True``.
+    """
+
+    prefix = "mansico_meta:graph_usage"
+    slow_down_at = 75
+    defer_at = 95
+    default_backoff = 5 * 60
+    slow_page_budget = 5
+    window = 60 * 60
+
+    def record(self, headers, error=None):
+        """Store the usage reported by a response and defer work if Meta reported a rate limit."""
+        usage = parse_usage_headers(headers or {})
+        self.store(usage)
+
+        code = (error or {}).get("code") if isinstance(error, dict) else None
+        if code in RATE_LIMIT_ERROR_CODES:
+            # Code 32 is a page-level limit; everything else throttles the whole app.
+            scopes = [f"page:{object_id}" for object_id in usage["objects"]] if code == 32 else []
+            for scope in scopes or ["app"]:
+                self.defer(scope, self.default_backoff)
+
+    def store(self, usage):
+        if usage.get("app") is not None:
+            self._set("app", usage["app"])
+        for object_id, (percent, regain_after) in usage.get("objects", {}).items():
+            self._set(f"page:{object_id}", percent, regain_after)
+        if usage.get("ad_account"):
+            # Meta reports a reset time whenever the account has any usage, not only when it is blocked.
+            percent, reset_after = usage["ad_account"]
+            self._set("ad_account", percent, reset_after if percent >= self.defer_at else 0)
+
+    def defer(self, scope, seconds):
+        state = self._get(scope)
+        self._set(scope, max(state.percent, self.defer_at), seconds)
+
+    def state(self, page_id=None, ad_account=False):
+        """Highest usage and latest deferral across the app and, optionally, a page and the ad account."""
+        scopes = ["app"] + ([f"page:{page_id}"] if page_id else []) + (["ad_account"] if ad_account else [])
+        states = [self._get(scope) for scope in scopes]
+        return frappe._dict(
+            percent=max(state.percent for state in states),
+            deferred_until=max(state.deferred_until for state in states),
+        )
+
+    def check(self, page_id=None, ad_account=False):
+        state = self.state(page_id, ad_account)
+        if state.deferred_until > time.time():
+            raise GraphThrottled(state.deferred_until)
+
+    def page_budget(self, page_id=None):
+        """Pages a run may read before yielding, or None when usage is low."""
+        return self.slow_page_budget if self.state(page_id).percent >= self.slow_down_at else None
+
+    def _get(self, scope):
+        return frappe._dict(frappe.cache().get_value(f"{self.prefix}:{scope}") or {"percent": 0, "deferred_until": 0})
+
+    def _set(self, scope, percent, regain_after=0):
+        if not regain_after and percent >= self.defer_at:
+            regain_after = self.default_backoff
+        deferred_until = time.time() + regain_after if regain_after else 0
+        # A low reading must not cut short a deferral set by a rate-limit error.
+        deferred_until = max(deferred_until, self._get(scope).deferred_until)
+        frappe.cache().set_value(
+            f"{self.prefix}:{scope}",
+            {"percent": percent, "deferred_until": deferred_until},
+            expires_in_sec=max(self.window, int(regain_after)),
+        )
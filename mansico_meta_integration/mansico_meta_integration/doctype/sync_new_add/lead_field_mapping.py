@@ -0,0 +1,81 @@
+import re
+
+import frappe
+
+
+def first_value(values, lead_field, rest_field=None):
+    return {lead_field: values[0] if values else None}
+
+
+def normalize_phone(values, lead_field, rest_field=None):
+    value = values[0] if values else ""
+    digits = re.sub(r"\D", "", value)
+    return {lead_field: f"+{digits}" if value.strip().startswith("+") and digits else digits or None}
+
+
+def split_name(values, lead_field, rest_field=None):
+    """Put the first word in ``lead_field`` and the rest in ``rest_field``; without one the name is kept whole."""
+    name = (values[0] if values else "").strip()
+    if not rest_field:
+        return {lead_field: name or None}
+    parts = name.split(None, 1)
+    return {lead_field: parts[0] if parts else None, rest_field: parts[1] if len(parts) > 1 else None}
+
+
+def join_values(values, lead_field, rest_field=None):
+    return {lead_field: ", ".join(str(value) for value in values) if values else None}
+
+
+TRANSFORMS = {
+    "": first_value,
+    "Normalize Phone": normalize_phone,
+    "Split Name": split_name,
+    "Join Values": join_values,
+}
+
+
+class LeadFieldMapping:
+    """Map Lead Field rows compiled into a ``form_field -> [(lead_field, transform, rest_lead_field)]`` lookup.
+
+    The compiled rules are cached in Redis per Sync New Add and keyed by its
+    ``modified`` timestamp, so any save of the document invalidates them.
+    """
+
+    cache_key = "mansico_meta:lead_field_mapping:v2"
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    @classmethod
+    def compile(cls, map_lead_fields):
+        rules = {}
+        for mapping in map_lead_fields:
+            form_field, lead_field = mapping.get("form_field"), mapping.get("lead_field")
+            if form_field and lead_field:
+                rules.setdefault(form_field, []).append(
+                    (lead_field, mapping.get("transform") or "", mapping.get("rest_lead_field"))
+                )
+        return cls(rules)
+
+    @classmethod
+    def for_doc(cls, doc):
+        """Return the compiled mapping of a Sync New Add, compiling it on a cache miss."""
+        cached = frappe.cache().hget(cls.cache_key, doc.name)
+        if cached and cached[0] == str(doc.modified):
+            return cls(cached[1])
+
+        mapping = cls.compile(doc.map_lead_fields)
+        frappe.cache().hset(cls.cache_key, doc.name, (str(doc.modified), mapping.rules))
+        return mapping
+
+    @classmethod
+    def clear(cls, name):
+        frappe.cache().hdel(cls.cache_key, name)
+
+    def apply(self, field_data):
+        """Build lead values from Graph ``field_data`` in a single pass."""
+        lead_data = {}
+        for field in field_data or []:
+            for lead_field, transform, rest_field in self.rules.get(field.get("name"), ()):
+                lead_data.update(TRANSFORMS.get(transform, first_value)(field.get("values") or [], lead_field, rest_field))
+        return lead_data
@@ -18,18 +18,22 @@ class CustomData:
             "lead_event_source": self.lead_event_source
         }
 class Payload:
-    def __init__(self, event_name, event_time, action_source, user_data, custom_data):
+    def __init__(self, event_name, event_time, action_source, user_data, custom_data, event_id=None):
         self.event_name = event_name
         self.event_time = event_time
         self.action_source = action_source
         self.user_data = user_data
         self.custom_data = custom_data
+        self.event_id = event_id
 
     def to_dict(self):
-        return {
+        payload = {
             "event_name": self.event_name,
             "event_time": self.event_time,
             "action_source": self.action_source,
             "user_data": self.user_data.to_dict(),
             "custom_data": self.custom_data.to_dict()
-        }
\ No newline at end of file
+        }
+        if self.event_id:
+            payload["event_id"] = self.event_id
+        return payload
\ No newline at end of file
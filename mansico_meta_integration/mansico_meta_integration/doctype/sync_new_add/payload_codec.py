@@ -0,0 +1,16 @@
+import base64
+import json
+import zlib
+
+
+def compress_json(value):
+    """Serialize ``value`` compactly and return it zlib-compressed as base64 text."""
+    data = json.dumps(value, separators=(",", ":"), default=str).encode()
+    return base64.b64encode(zlib.compress(data, 6)).decode()
+
+
+def decompress_json(value):
+    """Inverse of ``compress_json``; returns None for empty values."""
+    if not value:
+        return None
+    return json.loads(zlib.decompress(base64.b64decode(value)))
@@ -0,0 +1,247 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import frappe
+from frappe.utils import now_datetime
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LEAD_OUTCOMES = ("seen", "inserted", "duplicate", "failed")
+
+
+def label_value(value):
+    """Escape a Prometheus label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def graph_endpoint(method, url):
+    """Short name of the Graph edge a URL calls, used as a metric label."""
+    parts = [part for part in urlparse(url).path.split("/") if part][1:]
+    if not parts:
+        return "batch" if method == "POST" else "ids"
+    if parts[-1] in ("leads", "leadgen_forms", "events", "accounts", "users", "customaudiences"):
+        return parts[-1]
+    return "node"
+
+
+class SyncMetrics:
+    """Counters and latency histograms of one Sync New Add run.
+
+    ``FetchLeads`` opens a run with ``SyncMetrics.run``; while it is open the
+    Graph session and the lead import code report into it through the
+    classmethods below, which do nothing outside a run. The open run is kept
+    per thread, so runs in other threads of the same worker never mix;
+    worker threads of the concurrent fetch mode are bound to their run with
+    ``SyncMetrics.wrap`` and report into it, so updates take a lock.
+    ``save`` writes a Meta Sync Run row and adds the totals to the Prometheus
+    counters in Redis.
+    """
+
+    redis_key = "mansico_meta:metrics"
+    _local = threading.local()
+
+    def __init__(self, sync_new_add, page_id):
+        self.sync_new_add = sync_new_add
+        self.page_id = page_id
+        self.started_at = now_datetime()
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.forms = defaultdict(Counter)
+        self.calls = Counter()
+        self.latency = {}
+        self.capi_batch_sizes = []
+
+    @classmethod
+    @contextmanager
+    def run(cls, sync_new_add, page_id):
+        metrics = cls(sync_new_add, page_id)
+        with cls.bind(metrics):
+            yield metrics
+
+    @classmethod
+    @contextmanager
+    def bind(cls, metrics):
+        """Report into ``metrics`` from this thread until the block exits."""
+        previous = cls.current()
+        cls._local.metrics = metrics
+        try:
+            yield metrics
+        finally:
+            cls._local.metrics = previous
+
+    @classmethod
+    def current(cls):
+        return getattr(cls._local, "metrics", None)
+
+    @classmethod
+    def wrap(cls, fn):
+        """Return ``fn`` bound to this thread's run, to be called on a worker thread."""
+        metrics = cls.current()
+
+        def bound(*args, **kwargs):
+            with cls.bind(metrics):
+                return fn(*args, **kwargs)
+
+        return bound
+
+    @classmethod
+    def record_call(cls, method, url, seconds, response=None):
+        metrics = cls.current()
+        if not metrics:
+            return
+        endpoint = graph_endpoint(method, url)
+        retries = getattr(getattr(getattr(response, "raw", None), "retries", None), "history", None) or ()
+        with metrics.lock:
+            metrics.calls[(endpoint, getattr(response, "status_code", 0))] += 1
+            metrics.counts["retries"] += len(retries)
+            histogram = metrics.latency.setdefault(endpoint, [0] * len(LATENCY_BUCKETS) + [0, 0.0])
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram[index] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+
+    @classmethod
+    def incr(cls, key, amount=1, form_id=None):
+        metrics = cls.current()
+        if not metrics or not amount:
+            return
+        with metrics.lock:
+            metrics.counts[key] += amount
+            if form_id:
+                metrics.forms[form_id][key] += amount
+
+    @classmethod
+    def record_capi_batch(cls, size):
+        metrics = cls.current()
+        if not metrics:
+            return
+        with metrics.lock:
+            metrics.capi_batch_sizes.append(size)
+
+    def summary(self):
+        return {
+            "calls": [
+                {"endpoint": endpoint, "status": status, "count": count}
+                for (endpoint, status), count in sorted(self.calls.items())
+            ],
+            "latency": {
+                endpoint: {
+                    "buckets": dict(zip([str(bound) for bound in LATENCY_BUCKETS], histogram[:-2])),
+                    "count": histogram[-2],
+                    "sum": round(histogram[-1], 3),
+                }
+                for endpoint, histogram in self.latency.items()
+            },
+            "forms": {form_id: dict(counts) for form_id, counts in self.forms.items()},
+            "capi_batch_sizes": self.capi_batch_sizes,
+        }
+
+    def save(self, status):
+        duration = time.monotonic() - self.started
+        frappe.get_doc({
+            "doctype": "Meta Sync Run",
+            "sync_new_add": self.sync_new_add,
+            "page_id": self.page_id,
+            "status": status,
+            "started_at": self.started_at,
+            "duration": duration,
+            "api_calls": sum(self.calls.values()),
+            "retries": self.counts["retries"],
+            "pages": self.counts["pages"],
+            "leads_seen": self.counts["seen"],
+            "leads_inserted": self.counts["inserted"],
+            "duplicates": self.counts["duplicate"],
+            "failed": self.counts["failed"],
+            "capi_events": sum(self.capi_batch_sizes),
+            "capi_batches": len(self.capi_batch_sizes),
+            "metrics": frappe.as_json(self.summary(), indent=None),
+        }).insert(ignore_permissions=True)
+        frappe.db.commit()
+
+        try:
+            self.export(status, duration)
+        except Exception:
+            frappe.log_error("Sync Metrics Export Failed", frappe.get_traceback())
+
+    def export(self, status, duration):
+        """Add this run to the cumulative Prometheus series kept in one Redis hash."""
+        sync = label_value(self.sync_new_add)
+        cache = frappe.cache()
+        key = cache.make_key(self.redis_key)
+        pipe = cache.pipeline()
+
+        def incr(series, amount=1):
+            if amount:
+                pipe.hincrbyfloat(key, series, amount)
+
+        incr(f'mansico_meta_sync_runs_total{{sync="{sync}",status="{status}"}}')
+        for (endpoint, code), count in self.calls.items():
+            incr(f'mansico_meta_graph_requests_total{{sync="{sync}",endpoint="{endpoint}",code="{code}"}}', count)
+        for endpoint, histogram in self.latency.items():
+            labels = f'endpoint="{endpoint}"'
+            for bound, count in zip(LATENCY_BUCKETS, histogram):
+                incr(f'mansico_meta_graph_request_seconds_bucket{{{labels},le="{bound}"}}', count)
+            incr(f'mansico_meta_graph_request_seconds_bucket{{{labels},le="+Inf"}}', histogram[-2])
+            incr(f"mansico_meta_graph_request_seconds_count{{{labels}}}", histogram[-2])
+            incr(f"mansico_meta_graph_request_seconds_sum{{{labels}}}", histogram[-1])
+        incr(f'mansico_meta_graph_retries_total{{sync="{sync}"}}', self.counts["retries"])
+        for form_id, counts in self.forms.items():
+            form_id = label_value(form_id)
+            incr(f'mansico_meta_pages_total{{sync="{sync}",form="{form_id}"}}', counts["pages"])
+            for outcome in LEAD_OUTCOMES:
+                incr(f'mansico_meta_leads_total{{sync="{sync}",form="{form_id}",outcome="{outcome}"}}', counts[outcome])
+        incr(f'mansico_meta_capi_events_total{{sync="{sync}"}}', sum(self.capi_batch_sizes))
+        incr(f'mansico_meta_capi_batches_total{{sync="{sync}"}}', len(self.capi_batch_sizes))
+        pipe.hset(key, f'mansico_meta_sync_last_run_seconds{{sync="{sync}"}}', round(duration, 3))
+        pipe.hset(key, f'mansico_meta_sync_last_run_timestamp{{sync="{sync}"}}', int(time.time()))
+        pipe.execute()
+
+
+METRIC_TYPES = {
+    "mansico_meta_sync_runs_total": "counter",
+    "mansico_meta_graph_requests_total": "counter",
+    "mansico_meta_graph_request_seconds": "histogram",
+    "mansico_meta_graph_retries_total": "counter",
+    "mansico_meta_pages_total": "counter",
+    "mansico_meta_leads_total": "counter",
+    "mansico_meta_capi_events_total": "counter",
+    "mansico_meta_capi_batches_total": "counter",
+    "mansico_meta_sync_last_run_seconds": "gauge",
+    "mansico_meta_sync_last_run_timestamp": "gauge",
+}
+
+
+def _metric_name(field):
+    name = field.split("{", 1)[0]
+    for suffix in ("_bucket", "_count", "_sum"):
+        if name.endswith(suffix) and name[: -len(suffix)] in METRIC_TYPES:
+            return name[: -len(suffix)]
+    return name
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def prometheus_text():
+    """Render the stored series in the Prometheus text exposition format."""
+    cache = frappe.cache()
+    # Read through a raw pipeline: the cache wrapper's hgetall prefixes the key again and unpickles values.
+    pipe = cache.pipeline()
+    pipe.hgetall(cache.make_key(SyncMetrics.redis_key))
+    series = defaultdict(list)
+    for field, value in (pipe.execute()[0] or {}).items():
+        field = field.decode() if isinstance(field, bytes) else field
+        series[_metric_name(field)].append((field, float(value)))
+
+    lines = []
+    for name, metric_type in METRIC_TYPES.items():
+        if not series.get(name):
+            continue
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(f"{field} {_format_value(value)}" for field, value in sorted(series[name]))
+    return "\n".join(lines) + "\n"
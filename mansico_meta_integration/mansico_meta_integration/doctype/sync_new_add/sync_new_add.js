@@ -1,8 +1,84 @@
 // Copyright (c) 2023, mansy and contributors
 // For license information, please see license.txt
 
-// frappe.ui.form.on("Sync New Add", {
-// 	refresh(frm) {
+const BACKFILL_METHOD = "mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.backfill";
 
-// 	},
-// });
+const call_backfill = (frm, method) => {
+	frappe.call({
+		method: `${BACKFILL_METHOD}.${method}`,
+		args: { name: frm.doc.name },
+		freeze: true,
+		callback: () => frm.reload_doc(),
+	});
+};
+
+const show_backfill_progress = (frm, progress, leads) => {
+	frm.dashboard.show_progress(
+		__("Backfill"),
+		progress,
+		__("{0}% of the history read, {1} leads", [progress, leads])
+	);
+};
+
+frappe.ui.form.on("Sync New Add", {
+	setup(frm) {
+		frappe.realtime.on("mansico_meta_backfill", (data) => {
+			if (data.name !== frm.doc.name) {
+				return;
+			}
+			show_backfill_progress(frm, data.progress, data.leads);
+			if (data.status !== frm.doc.backfill_status) {
+				frm.reload_doc();
+			}
+		});
+	},
+	refresh(frm) {
+		if (frm.doc.docstatus === 0 && !frm.is_new()) {
+			frm.add_custom_button(__("Refresh Forms"), () => {
+				if (frm.is_dirty()) {
+					frappe.msgprint(__("Save the document before refreshing its forms."));
+					return;
+				}
+				frappe.call({
+					method: "mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add.refresh_forms",
+					args: { name: frm.doc.name },
+					freeze: true,
+					callback: () => frm.reload_doc(),
+				});
+			}, __("Actions"));
+		}
+		if (frm.doc.docstatus !== 1) {
+			return;
+		}
+		if (frm.doc.backfill_status === "Running") {
+			show_backfill_progress(frm, frm.doc.backfill_progress || 0, frm.doc.backfill_leads || 0);
+			frm.add_custom_button(__("Pause"), () => call_backfill(frm, "pause_backfill"), __("Backfill"));
+		} else if (frm.doc.backfill_status === "Paused") {
+			frm.add_custom_button(__("Resume"), () => call_backfill(frm, "resume_backfill"), __("Backfill"));
+		} else if (frm.doc.backfill_from) {
+			frm.add_custom_button(__("Start"), () => {
+				if (frm.is_dirty()) {
+					frappe.msgprint(__("Save the document before starting a backfill."));
+					return;
+				}
+				call_backfill(frm, "start_backfill");
+			}, __("Backfill"));
+		}
+		frm.add_custom_button(__("Reset Lead Cursors"), () => {
+			frappe.confirm(
+				__("The next sync will re-read the full lead history of every form. Continue?"),
+				() => {
+					frappe.call({
+						method: "mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add.reset_lead_cursors",
+						args: { name: frm.doc.name },
+						freeze: true,
+						callback: () => {
+							frappe.show_alert({ message: __("Lead cursors reset"), indicator: "green" });
+							frm.reload_doc();
+						},
+					});
+				}
+			);
+		}, __("Actions"));
+	},
+});
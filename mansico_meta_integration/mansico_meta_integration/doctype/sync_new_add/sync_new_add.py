@@ -2,40 +2,143 @@
 # For license information, please see license.txt
 
 import datetime
+import hashlib
 import json
+import queue
 import time
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
 
 import requests
 import frappe
 from frappe.model.document import Document
+from frappe.utils import cint
 
 from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.meta_integraion_objects import UserData, CustomData, Payload
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.lead_field_mapping import LeadFieldMapping
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.graph_session import GraphSession
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_metrics import SyncMetrics
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_lead_payload.meta_lead_payload import archive_lead_payloads
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_lead_quarantine.meta_lead_quarantine import quarantine_leads
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_sync_log.meta_sync_log import log_lead_events
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.graph_throttle import (
+    RATE_LIMIT_ERROR_CODES,
+    GraphThrottle,
+    GraphThrottled,
+    parse_usage_headers,
+)
+
+
+GRAPH_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+# Read by every import: the cursor (id, created_time), the payload archive (form_id) and the field mapping.
+LEAD_FIELDS = ("id", "created_time", "form_id", "field_data")
+LEAD_METADATA_FIELDS = ("ad_id", "ad_name", "adset_id", "adset_name", "campaign_id", "campaign_name", "is_organic", "platform")
+GRAPH_LEAD_FIELDS = frozenset(LEAD_FIELDS + LEAD_METADATA_FIELDS + (
+    "custom_disclaimer_responses", "home_listing", "partner_name", "post", "retailer_item_id", "vehicle"))
+DEFAULT_LEAD_PAGE_SIZE = 100
+MAX_LEAD_PAGE_SIZE = 1000
+
+
+def parse_lead_fields(value):
+    """Split a comma separated list of Graph lead fields, dropping blanks and repeats."""
+    return list(dict.fromkeys(field.strip() for field in (value or "").split(",") if field.strip()))
+
+
+def lead_fields_projection(doc):
+    """Graph ``fields`` a Sync New Add downloads leads with: what the import needs plus its metadata fields."""
+    metadata = LEAD_METADATA_FIELDS if doc.lead_metadata_fields is None else parse_lead_fields(doc.lead_metadata_fields)
+    return ",".join(dict.fromkeys(LEAD_FIELDS + tuple(field for field in metadata if field in GRAPH_LEAD_FIELDS)))
+
+
+def lead_page_size(doc, form):
+    """Leads per ``/{form_id}/leads`` page: the form's Page Size, else the record's Lead Page Size."""
+    return min(cint(form.get("page_size")) or cint(doc.lead_page_size) or DEFAULT_LEAD_PAGE_SIZE, MAX_LEAD_PAGE_SIZE)
 
 
 @frappe.whitelist()
 def get_credentials():
     return frappe.get_doc("Meta Facebook Settings")
 
+
+@frappe.whitelist()
+def reset_lead_cursors(name, form_id=None):
+    """Clear the incremental cursor so the next run re-reads the full form history."""
+    frappe.has_permission("Sync New Add", "write", name, throw=True)
+    filters = {"parenttype": "Sync New Add", "parent": name}
+    if form_id:
+        filters["form_id"] = form_id
+    for row in frappe.get_all("Meta Forms", filters, pluck="name"):
+        frappe.db.set_value("Meta Forms", row, {field: None for field in LeadCursor.fields})
+    # A reset usually means leads were deleted; the seen-set would skip them on the re-read.
+    lead_doctype, page_id = frappe.db.get_value("Sync New Add", name, ["lead_doctype_name", "page_id"])
+    ImportedLeadIds.clear(lead_doctype, page_id)
+
+
+@frappe.whitelist()
+def refresh_forms(name):
+    """Drop the cached forms of the record's page and save it, so its forms are read from Facebook again."""
+    doc = frappe.get_doc("Sync New Add", name)
+    doc.check_permission("write")
+    LeadFormsCache.clear(doc.page_id)
+    # Merge the forms even when Force Fetch is off, without turning it on for later saves.
+    doc.flags.refresh_forms = True
+    doc.save()
+
+
+def ensure_custom_field_index(doctype, fieldname):
+    """Turn on search_index for an existing, non-unique Custom Field so its column gets indexed."""
+    custom_field = frappe.db.get_value(
+        "Custom Field", {"dt": doctype, "fieldname": fieldname}, ["name", "unique", "search_index"], as_dict=True
+    )
+    if not custom_field or custom_field.unique or custom_field.search_index:
+        return
+    custom_field = frappe.get_doc("Custom Field", custom_field.name)
+    custom_field.search_index = 1
+    custom_field.save(ignore_permissions=True)
+
+
+def parse_graph_time(value):
+    """Parse a Graph API ``created_time`` string into an aware datetime."""
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value, GRAPH_TIME_FORMAT)
+    except ValueError:
+        return None
+
 class Request:
     """Handle Facebook Graph API request construction."""
     
-    def __init__(self, url, version, page_id, f_payload=None, params=None):
+    def __init__(self, url, version, page_id, f_payload=None, params=None, session=None):
         self.url = url
         self.version = f'v{version}'
         self.page_id = page_id
         self.f_payload = f_payload
         self.params = params
+        self._session = session
     
     @property
     def get_url(self):
         return f"{self.url}/{self.version}/{self.page_id}"
 
+    @property
+    def session(self):
+        """Pooled session used to send this request."""
+        if not self._session:
+            self._session = GraphSession.for_settings()
+        return self._session
+
 def _handle_api_error(response, request, title="Error"):
     """Centralized error handling for API responses."""
     try:
-        error_data = frappe._dict(response.json()).get("error")
+        body = response.json()
+        error_data = body.get("error") if isinstance(body, dict) else None
+        GraphThrottle().record(response.headers, error_data)
         if error_data:
+            if error_data.get("code") in RATE_LIMIT_ERROR_CODES:
+                raise GraphThrottled(time.time() + GraphThrottle.default_backoff)
             error_message = f"url : {request.get_url}<br>params : {request.params}<br><br>"
             error_message += "<br>".join([f"{key} : {value}" for key, value in error_data.items()])
             frappe.throw(error_message, title=title)
@@ -53,12 +156,7 @@ class RequestPageAccessToken:
     def get_page_access_token(self):
         """Get page access token from Facebook API."""
         try:
-            response = requests.get(
-                self.request.get_url, 
-                params=self.request.params, 
-                json=self.request.params,
-                timeout=30
-            )
+            response = self.request.session.get(self.request.get_url, params=self.request.params)
             _handle_api_error(response, self.request)
             self.page_access_token = frappe._dict(response.json()).get("access_token")
             return self.page_access_token
@@ -67,6 +165,134 @@ class RequestPageAccessToken:
         except requests.exceptions.RequestException as e:
             frappe.throw(f"Network error while getting page access token: {str(e)}", title="Network Error")
 
+class PageAccessTokenCache:
+    """Share page access tokens across jobs through ``frappe.cache``.
+
+    Keys carry a hash of the credentials so changing them retires every
+    cached token, while bookkeeping writes to Meta Facebook Settings such as
+    the audience sync watermark leave the cache alone. Page ID changes evict
+    their own entry.
+    """
+
+    prefix = "mansico_meta:page_access_token"
+    ttl = 50 * 60
+    credential_fields = ("api_url", "graph_api_version", "app_id", "app_secret", "access_token")
+
+    def __init__(self, defaults=None):
+        self.defaults = defaults or get_credentials()
+
+    @property
+    def settings_version(self):
+        credentials = ":".join(str(self.defaults.get(field) or "") for field in self.credential_fields)
+        return hashlib.sha1(credentials.encode()).hexdigest()[:12]
+
+    def key(self, page_id):
+        return f"{self.prefix}:{page_id}:{self.settings_version}"
+
+    def get(self, page_id):
+        """Return a cached page token, requesting it from Facebook on a miss."""
+        key = self.key(page_id)
+        token = frappe.cache().get_value(key)
+        if token:
+            return token
+
+        request = Request(self.defaults.api_url, self.defaults.graph_api_version,
+            page_id, None, params={"fields": "access_token", "transport": "cors",
+                "access_token": self.defaults.access_token})
+        token = RequestPageAccessToken(request).get_page_access_token()
+        self.set(page_id, token)
+        return token
+
+    def set(self, page_id, token):
+        if token:
+            frappe.cache().set_value(self.key(page_id), token, expires_in_sec=self.ttl)
+
+    def prefetch(self, page_ids):
+        """Cache the tokens of many pages with one paginated ``/me/accounts`` call.
+
+        Only worth it when two or more of ``page_ids`` are missing from the
+        cache. Pages the settings token does not manage through
+        ``/me/accounts`` keep falling back to the per-page request in ``get``.
+        """
+        missing = {str(page_id) for page_id in page_ids if not frappe.cache().get_value(self.key(page_id))}
+        if len(missing) < 2:
+            return
+
+        request = Request(self.defaults.api_url, self.defaults.graph_api_version, "me/accounts", None,
+            params={"fields": "id,access_token", "limit": 100, "access_token": self.defaults.access_token})
+        try:
+            GraphThrottle().check()
+            for response in iter_graph_pages(request):
+                for account in response.get("data") or []:
+                    self.set(account.get("id"), account.get("access_token"))
+        except GraphThrottled:
+            # Nothing failed; the jobs find the app throttled too and defer.
+            return
+        except frappe.ValidationError as e:
+            frappe.log_error("Page Token Prefetch Failed", f"Falling back to one token request per page: {str(e)}")
+
+    @classmethod
+    def clear(cls, page_id=None):
+        """Evict cached tokens for one page, or for every page when page_id is omitted."""
+        frappe.cache().delete_keys(f"{cls.prefix}:{page_id}:" if page_id else f"{cls.prefix}:")
+
+
+def get_page_access_token(page_id, defaults=None):
+    return PageAccessTokenCache(defaults).get(page_id)
+
+
+def prefetch_page_access_tokens(page_ids, defaults=None):
+    PageAccessTokenCache(defaults).prefetch(page_ids)
+
+
+class GraphBatch:
+    """Send several Graph GET requests in one ``/batch`` call.
+
+    ``get`` returns one ``(ok, body)`` tuple per request, in order; a failed
+    sub-request does not affect its siblings.
+    """
+
+    max_requests = 50
+
+    def __init__(self, defaults, access_token, session=None):
+        self.defaults = defaults
+        self.access_token = access_token
+        self.session = session
+
+    def relative_url(self, request):
+        params = {key: value for key, value in (request.params or {}).items() if key != "access_token"}
+        return f"{request.page_id}?{urlencode(params)}" if params else request.page_id
+
+    def get(self, requests_):
+        """Send up to ``max_requests`` requests and return their parsed bodies."""
+        batch = [{"method": "GET", "relative_url": self.relative_url(request)} for request in requests_]
+        request = Request(self.defaults.api_url, self.defaults.graph_api_version, "", None,
+            params={"access_token": self.access_token, "include_headers": "false"}, session=self.session)
+        try:
+            response = request.session.post(request.get_url, params=request.params, data={"batch": json.dumps(batch)})
+            _handle_api_error(response, request)
+        except requests.exceptions.Timeout:
+            frappe.throw(f"Request timed out while sending a batch of {len(batch)} requests", title="Timeout Error")
+        except requests.exceptions.RequestException as e:
+            frappe.throw(f"Network error while sending a batch request: {str(e)}", title="Network Error")
+
+        results = []
+        for item in response.json():
+            if not item:
+                results.append((False, "Sub-request did not complete"))
+                continue
+            try:
+                body = json.loads(item.get("body") or "{}")
+            except ValueError:
+                results.append((False, item.get("body")))
+                continue
+            if item.get("code") != 200 or body.get("error"):
+                results.append((False, body.get("error") or item.get("body")))
+            else:
+                results.append((True, frappe._dict(body)))
+        return results
+
+
 class RequestLeadGenForms:
     """Handle lead generation form requests."""
     
@@ -77,12 +303,7 @@ class RequestLeadGenForms:
     def get_lead_forms(self):
         """Get lead forms from Facebook API."""
         try:
-            response = requests.get(
-                self.request.get_url, 
-                params=self.request.params, 
-                json=self.request.params,
-                timeout=30
-            )
+            response = self.request.session.get(self.request.get_url, params=self.request.params)
             _handle_api_error(response, self.request)
             self.lead_forms = frappe._dict(response.json())
             return self.lead_forms
@@ -91,6 +312,53 @@ class RequestLeadGenForms:
         except requests.exceptions.RequestException as e:
             frappe.throw(f"Network error while getting lead forms: {str(e)}", title="Network Error")
 
+class LeadFormsCache:
+    """Cache a page's lead form metadata (no leads) in ``frappe.cache``.
+
+    Saving a Sync New Add reads forms from here; Facebook is only asked again
+    when the entry expires or a "Refresh Forms" action clears it.
+    """
+
+    prefix = "mansico_meta:leadgen_forms"
+    ttl = 6 * 60 * 60
+    fields = "id,name,created_time,leads_count,page,questions"
+
+    def __init__(self, defaults=None):
+        self.defaults = defaults or get_credentials()
+
+    def get(self, page_id):
+        key = f"{self.prefix}:{page_id}"
+        lead_forms = frappe.cache().get_value(key)
+        if lead_forms is not None:
+            return lead_forms
+
+        request = Request(self.defaults.api_url, self.defaults.graph_api_version,
+            page_id + "/leadgen_forms", None, params={"fields": self.fields,
+                "access_token": get_page_access_token(page_id, self.defaults)})
+        lead_forms = [lead_form for response in iter_graph_pages(request) for lead_form in response.get("data") or []]
+        frappe.cache().set_value(key, lead_forms, expires_in_sec=self.ttl)
+        return lead_forms
+
+    @classmethod
+    def clear(cls, page_id=None):
+        if page_id:
+            frappe.cache().delete_value(f"{cls.prefix}:{page_id}")
+        else:
+            frappe.cache().delete_keys(f"{cls.prefix}:")
+
+
+def iter_graph_pages(request):
+    """Yield every page of a paginated Graph edge, following ``paging.cursors.after``."""
+    while True:
+        response = RequestLeadGenForms(request).get_lead_forms()
+        yield response
+        paging = response.get("paging") or {}
+        after = (paging.get("cursors") or {}).get("after")
+        if not paging.get("next") or not after:
+            return
+        request.params["after"] = after
+
+
 class AppendForms:
     """Handle appending forms to document."""
     
@@ -99,27 +367,40 @@ class AppendForms:
         self.doc = doc
 
     def append_forms(self):
-        if self.doc.force_fetch:
-            self.doc.set("table_hsya", [])
+        """Merge the page's forms into the child tables, keeping existing rows (and their cursors)."""
+        if self.doc.force_fetch or self.doc.flags.refresh_forms:
+            lead_forms = {lead_form.get("id"): lead_form for lead_form in self.lead_forms}
+            # Forms deleted on Facebook drop out; every other row is updated in place.
+            self.doc.set("table_hsya", [row for row in self.doc.table_hsya if row.form_id in lead_forms])
+            rows = {row.form_id: row for row in self.doc.table_hsya}
 
-            for lead_form in self.lead_forms.get("data", []):
-                self.doc.append("table_hsya", {
-                    "form_id": lead_form.get("id"),
+            for form_id, lead_form in lead_forms.items():
+                values = {
+                    "form_id": form_id,
                     "form_name": lead_form.get("name"),
                     "created_time": lead_form.get("created_time"),
                     "leads_count": lead_form.get("leads_count"),
                     "page": lead_form.get("page"),
                     "questions": frappe._dict({"questions": lead_form.get("questions")}),
-                })
+                }
+                if form_id in rows:
+                    rows[form_id].update(values)
+                else:
+                    self.doc.append("table_hsya", values)
 
         if self.doc.fetch_map_lead_fields:
-            self.doc.set("map_lead_fields", [])
-            form_fields = []
+            questions = {}
             for lead in self.doc.table_hsya:
-                questions = lead.questions
-                if isinstance(questions, str):
-                    questions = json.loads(questions)
-                self.set_map_lead_fields(questions.get("questions", []), form_fields)
+                form_questions = lead.questions
+                if isinstance(form_questions, str):
+                    form_questions = json.loads(form_questions)
+                for question in (form_questions or {}).get("questions", []):
+                    if question.get("key"):
+                        questions.setdefault(question["key"], question)
+
+            # Keep the user's lead_field/transform choices for keys that still exist.
+            self.doc.set("map_lead_fields", [row for row in self.doc.map_lead_fields if row.form_field in questions])
+            self.set_map_lead_fields(questions.values(), {row.form_field for row in self.doc.map_lead_fields})
 
     def set_map_lead_fields(self, questions, form_fields):
         """Map form fields to lead fields."""
@@ -141,9 +422,168 @@ class AppendForms:
                     "form_field_label": question.get("label"),
                     "form_field_type": question_type,
                 })
-                form_fields.append(key)
+                form_fields.add(key)
+
+
+class LeadCursor:
+    """High-water mark of the newest lead imported from a Meta Forms row.
+
+    While a form is being paginated the ``after`` cursor of every completed
+    page is checkpointed on the row, so an interrupted run resumes from there
+    and the high-water mark only moves once the whole form was read. Leads
+    that fail to import are retried from Meta Lead Quarantine, so the cursor
+    moves past them.
+    """
+
+    fields = ("last_lead_created_time", "last_lead_id", "sync_checkpoint")
+
+    def __init__(self, form):
+        self.form = form
+        self.created_time = parse_graph_time(form.last_lead_created_time)
+        self.lead_id = form.last_lead_id
+        self.newest = None
+        self.completed = False
+
+        checkpoint = form.sync_checkpoint or {}
+        if isinstance(checkpoint, str):
+            checkpoint = json.loads(checkpoint)
+        self.after = checkpoint.get("after")
+        # Graph cursors expire, so one carried over from an earlier run may be rejected.
+        self.resumed = bool(self.after)
+        if checkpoint.get("newest"):
+            self.track(dict(zip(("created_time", "id"), checkpoint["newest"])))
+
+    @property
+    def filtering(self):
+        """Graph ``filtering`` clause restricting the leads edge to leads newer than the cursor."""
+        if not self.created_time:
+            return None
+        # time_created only has second precision, so include the cursor second
+        # and rely on lead id / duplicate checks to drop the boundary lead.
+        return [{
+            "field": "time_created",
+            "operator": "GREATER_THAN",
+            "value": int(self.created_time.timestamp()) - 1,
+        }]
+
+    def is_boundary(self, lead):
+        return bool(self.lead_id) and lead.get("id") == self.lead_id
+
+    def track(self, lead):
+        created_time = parse_graph_time(lead.get("created_time"))
+        if created_time and (not self.newest or created_time > self.newest[0]):
+            self.newest = (created_time, lead.get("created_time"), lead.get("id"))
+
+    def checkpoint(self, after):
+        """Remember the last completed page so a failed run resumes after it."""
+        self.after = after
+        self.resumed = False
+        frappe.db.set_value("Meta Forms", self.form.name, "sync_checkpoint", json.dumps({
+            "after": after,
+            "newest": self.newest[1:] if self.newest else None,
+        }))
+        frappe.db.commit()
+
+    def resume_failed(self):
+        """Drop a carried-over ``after`` cursor that failed, so the next run restarts from the high-water mark.
+
+        Returns True if a cursor was dropped.
+        """
+        if not self.resumed:
+            return False
+        self.after, self.resumed = None, False
+        frappe.db.set_value("Meta Forms", self.form.name, "sync_checkpoint", None)
+        frappe.db.commit()
+        return True
+
+    def save(self):
+        """Persist the cursor once the whole form was read."""
+        if not self.completed:
+            return
+        values = {"sync_checkpoint": None}
+        if self.newest:
+            created_time, raw_time, lead_id = self.newest
+            if not self.created_time or created_time > self.created_time:
+                values.update({"last_lead_created_time": raw_time, "last_lead_id": lead_id})
+        frappe.db.set_value("Meta Forms", self.form.name, values)
+        frappe.db.commit()
+
+
+class UntrackedCursor:
+    """Cursor for leads imported outside form pagination, e.g. from the leadgen webhook."""
+
+    def is_boundary(self, lead):
+        return False
+
+    def track(self, lead):
+        pass
+
+
+class ImportedLeadIds:
+    """Resolve which Meta lead ids of a Graph page already exist as leads.
+
+    One ``IN (...)`` query covers a whole page. When enabled, imported ids are
+    also kept in a Redis set per Facebook page so repeat runs skip the database.
+    """
+
+    prefix = "mansico_meta:imported_lead_ids"
+    ttl = 7 * 24 * 60 * 60
+
+    def __init__(self, lead_doctype, page_id, use_cache=False):
+        self.lead_doctype = lead_doctype
+        self.use_cache = use_cache
+        self.key = self.cache_key(lead_doctype, page_id)
+
+    @classmethod
+    def cache_key(cls, lead_doctype, page_id):
+        return frappe.cache().make_key(f"{cls.prefix}:{lead_doctype}:{page_id}")
+
+    @classmethod
+    def clear(cls, lead_doctype, page_id):
+        frappe.cache().delete(cls.cache_key(lead_doctype, page_id))
+
+    def existing(self, lead_ids):
+        """Return the subset of lead_ids that were already imported."""
+        lead_ids = list(dict.fromkeys(lead_ids))
+        if not lead_ids:
+            return set()
+
+        known = self._cached(lead_ids)
+        missing = [lead_id for lead_id in lead_ids if lead_id not in known]
+        if missing:
+            found = set(frappe.get_all(
+                self.lead_doctype,
+                filters={"custom_meta_lead_id": ["in", missing]},
+                pluck="custom_meta_lead_id",
+            ))
+            self.remember(found)
+            known |= found
+        return known
+
+    def remember(self, lead_ids):
+        if not self.use_cache or not lead_ids:
+            return
+        try:
+            pipe = frappe.cache().pipeline()
+            pipe.sadd(self.key, *lead_ids)
+            pipe.expire(self.key, self.ttl)
+            pipe.execute()
+        except Exception:
+            # The seen-set is an optimisation only; MariaDB stays the source of truth.
+            pass
+
+    def _cached(self, lead_ids):
+        if not self.use_cache:
+            return set()
+        try:
+            pipe = frappe.cache().pipeline()
+            for lead_id in lead_ids:
+                pipe.sismember(self.key, lead_id)
+            return {lead_id for lead_id, seen in zip(lead_ids, pipe.execute()) if seen}
+        except Exception:
+            return set()
+
 
-      
 class ServerScript:
     """Handle server script creation for scheduled tasks."""
     
@@ -205,41 +645,139 @@ class RequestSendLead:
     
     def __init__(self, request):
         self.request = request
-    def send_lead(self, max_retries=3):
-        
-        for attempt in range(max_retries):
-            try:
-                response = requests.post(
-                    self.request.get_url, 
-                    params=self.request.params, 
-                    json=self.request.f_payload,
-                    timeout=30  # 30 second timeout
-                )
-                _handle_api_error(response, self.request)
-                return json.dumps(response.json())
-            except requests.exceptions.Timeout:
-                if attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 5  # Exponential backoff: 5, 10, 15 seconds
-                    frappe.log_error("Facebook API Timeout - Retrying", f"Attempt {attempt + 1} timed out, retrying in {wait_time} seconds")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    frappe.log_error("Facebook API Timeout - Final", f"All {max_retries} attempts timed out for URL: {self.request.get_url}")
-                    return json.dumps({"error": "timeout", "message": f"Request timed out after {max_retries} attempts"})
-            except requests.exceptions.RequestException as e:
-                if attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 5
-                    frappe.log_error("Facebook API Network Error - Retrying", f"Attempt {attempt + 1} failed: {str(e)}, retrying in {wait_time} seconds")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    frappe.log_error("Facebook API Network Error - Final", f"All {max_retries} attempts failed: {str(e)}")
-                    return json.dumps({"error": "network_error", "message": str(e)})
+        self.status_code = None
+    def send_lead(self):
+        """Post the payload once; connection errors are already retried by the pooled session."""
+        try:
+            response = self.request.session.post(
+                self.request.get_url,
+                params=self.request.params,
+                json=self.request.f_payload
+            )
+            self.status_code = response.status_code
+            _handle_api_error(response, self.request)
+            return json.dumps(response.json())
+        except requests.exceptions.Timeout:
+            frappe.log_error("Facebook API Timeout", f"Request timed out for URL: {self.request.get_url}")
+            return json.dumps({"error": "timeout", "message": "Request timed out"})
+        except requests.exceptions.RequestException as e:
+            frappe.log_error("Facebook API Network Error", f"Request failed: {str(e)}")
+            return json.dumps({"error": "network_error", "message": str(e)})
+
+
+class LeadEventBatch:
+    """Group Conversions API events per pixel and send them in Graph-sized batches.
+
+    Meta accepts up to ``max_events`` events per ``/{pixel_id}/events`` call and
+    accepts or rejects a call as a whole, so every event of a call shares its
+    outcome. ``flush`` returns one result per lead name.
+    """
+
+    max_events = 1000
+
+    def __init__(self, defaults=None):
+        self.defaults = defaults or get_credentials()
+        self.pixels = {}
+
+    def add(self, lead, page, event_name=None, event_time=None, event_id=None):
+        """Queue the lead's status (or event_name) for the page's pixel. Returns False if it cannot be sent."""
+        if not lead.custom_meta_lead_id:
+            frappe.log_error("Facebook Lead Sync Validation Failed", f"Lead {lead.name} has no custom_meta_lead_id - cannot sync to Facebook")
+            return False
+
+        if not getattr(page, "pixel_id", None) or not getattr(page, "pixel_access_token", None):
+            frappe.log_error("Facebook Page Configuration Error", f"Page {page.name if hasattr(page, 'name') else 'Unknown'} missing pixel_id or pixel_access_token - cannot sync lead to Facebook")
+            return False
+
+        payload = Payload(
+            event_name=event_name or lead.status,
+            event_time=event_time or int(datetime.datetime.now().timestamp()),
+            action_source="system_generated",
+            user_data=UserData(lead.custom_meta_lead_id),
+            custom_data=CustomData("crm", "ERP Next"),
+            event_id=event_id
+        )
+        pixel = self.pixels.setdefault(page.pixel_id, frappe._dict(access_token=page.pixel_access_token, events=[]))
+        pixel.events.append((lead, payload.to_dict()))
+        return True
+
+    def __len__(self):
+        return sum(len(pixel.events) for pixel in self.pixels.values())
+
+    def flush(self):
+        """Send every queued event and return ``{lead.name: result}``."""
+        results = {}
+        for pixel_id, pixel in self.pixels.items():
+            for start in range(0, len(pixel.events), self.max_events):
+                chunk = pixel.events[start:start + self.max_events]
+                ok, response, status_code = self._send(pixel_id, pixel.access_token, [event for _, event in chunk])
+                for lead, event in chunk:
+                    results[lead.name] = frappe._dict(
+                        lead=lead, event=event, ok=ok, response=response, status_code=status_code
+                    )
+        self.pixels = {}
+        return results
+
+    def _send(self, pixel_id, access_token, events):
+        request = Request(
+            self.defaults.api_url,
+            self.defaults.graph_api_version,
+            pixel_id + "/events",
+            {"data": events},
+            params={"access_token": access_token}
+        )
+        sender = RequestSendLead(request)
+        SyncMetrics.record_capi_batch(len(events))
+        try:
+            response = sender.send_lead()
+        except GraphThrottled as e:
+            return False, e, sender.status_code
+        except Exception as e:
+            frappe.log_error(
+                "Facebook Event Batch Failed",
+                f"{len(events)} events for pixel {pixel_id} were rejected: {str(e)}"
+            )
+            return False, str(e), sender.status_code
+
+        ok = "error" not in (json.loads(response) if response else {"error": "empty response"})
+        return ok, response, sender.status_code
+
+
+class RunDeadlineReached(Exception):
+    """The run used up its time budget; it resumes from the saved checkpoints."""
+
+
+class SyncRecordLock:
+    """Redis lock that keeps runs of the same Sync New Add from overlapping."""
+
+    prefix = "mansico_meta:sync_lock"
+    release_script = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, name, ttl):
+        self.key = frappe.cache().make_key(f"{self.prefix}:{name}")
+        self.token = frappe.generate_hash(length=16)
+        self.ttl = max(int(ttl), 1)
+
+    def acquire(self, wait=0):
+        """Take the lock, retrying for up to ``wait`` seconds. Returns False if another run holds it."""
+        give_up_at = time.monotonic() + wait
+        while True:
+            if frappe.cache().set(self.key, self.token, nx=True, ex=self.ttl):
+                return True
+            if time.monotonic() >= give_up_at:
+                return False
+            time.sleep(1)
+
+    def release(self):
+        # Only delete the key if it still holds our token, i.e. it did not expire and get re-taken.
+        frappe.cache().eval(self.release_script, 1, self.key, self.token)
 
 
 class FetchLeads:
-    def __init__(self, name):
+    def __init__(self, name, deadline=None):
         self.name = name
+        # time.monotonic() value after which the run checkpoints and stops.
+        self.deadline = deadline
 
     @property
     def get_form_ids(self):
@@ -253,222 +791,410 @@ class FetchLeads:
         self.doc = frappe.get_doc("Sync New Add", self.name)
         self.page = frappe.get_doc("Page ID", self.doc.page_id)
         self.form_ids = self.get_form_ids
-        for form_id in self.form_ids:
-            defaults = get_credentials()
-            #  init Request
-            request = Request(defaults.api_url, defaults.graph_api_version,
-            self.doc.page_id, None, params={"fields": "access_token", "transport": "cors",
-                    "access_token": defaults.access_token})
-            # init RequestPageAccessToken
-            request_page_access_token = RequestPageAccessToken(request)
-            # get page access token
-            request_page_access_token.get_page_access_token()
-            # init Request
-            request = Request(defaults.api_url, defaults.graph_api_version,
-            form_id + "/leads", None, params={"access_token": request_page_access_token.page_access_token,
-            "fields": "ad_id,ad_name,adset_id,adset_name,\
-                campaign_id,campaign_name,created_time,custom_disclaimer_responses,\
-                    field_data,form_id,id,home_listing,is_organic,partner_name,\
-                        platform,post,retailer_item_id,vehicle"
-                                              })
-            # init RequestLeadGenForms
-            request_lead_gen_forms = RequestLeadGenForms(request)
-            # get lead forms
-            request_lead_gen_forms.get_lead_forms()
-
-            if request_lead_gen_forms.lead_forms.get("data"):
-                # use self.lead_forms
-                # fetch all leads then create them using create_lead
-                # filter leads by created_time and id to avoid duplication
-                self.paginate_lead_forms(request_lead_gen_forms.lead_forms)
+        cursors = [LeadCursor(form) for form in self.doc.table_hsya if form.form_id]
+        if not cursors:
+            return
 
-                
-            
-    def paginate_lead_forms(self, lead_forms):
-        if lead_forms.paging.get("next"):
-            self.create_lead(lead_forms.get("data"))
-            next_page = lead_forms.paging.get("next")
+        self.defaults = get_credentials()
+        with SyncMetrics.run(self.name, self.doc.page_id) as metrics:
+            status = "Failed"
             try:
-                response = requests.get(next_page, timeout=30)
-                lead_forms = frappe._dict(response.json())
-                return self.paginate_lead_forms(lead_forms)
-            except requests.exceptions.Timeout:
-                frappe.log_error("Pagination Timeout", f"Request timed out while paginating lead forms for URL: {next_page}")
-                return lead_forms
-            except requests.exceptions.RequestException as e:
-                frappe.log_error("Pagination Network Error", f"Network error while paginating lead forms: {str(e)}")
-                return lead_forms
+                # Deferred work is picked up again by a later tick from the saved checkpoints.
+                self.check_budget()
+                self.page_access_token = get_page_access_token(self.doc.page_id, self.defaults)
+                if self.doc.fetch_mode == "Batch":
+                    self.fetch_leads_in_batches(cursors)
+                elif self.doc.fetch_mode == "Concurrent":
+                    self.fetch_leads_concurrently(cursors)
+                else:
+                    for cursor in cursors:
+                        self.check_budget()
+                        self.cursor = cursor
+                        self.paginate_lead_forms(self.lead_request(cursor))
+                        cursor.save()
+                # A form that stopped paginating resumes next run, but this run did not read everything.
+                status = "Partial" if metrics.counts["page_errors"] else "Completed"
+            except GraphThrottled:
+                status = "Throttled"
+            except RunDeadlineReached:
+                status = "Deadline"
+            finally:
+                if status == "Failed":
+                    # Keep the half-written page out of the run log's commit.
+                    frappe.db.rollback()
+                metrics.save(status)
+
+    def check_budget(self):
+        """Stop the run when Graph usage is throttled or its time budget is spent."""
+        if self.deadline and time.monotonic() >= self.deadline:
+            raise RunDeadlineReached
+        self.throttle.check(self.doc.page_id)
+
+    @property
+    def throttle(self):
+        if not getattr(self, "_throttle", None):
+            self._throttle = GraphThrottle()
+        return self._throttle
+
+    def import_lead_ids(self, lead_ids):
+        """Fetch specific leads by id and create them, without reading their forms."""
+        self.doc = frappe.get_doc("Sync New Add", self.name)
+        self.page = frappe.get_doc("Page ID", self.doc.page_id)
+        self.defaults = get_credentials()
+        self.cursor = UntrackedCursor()
+        self.page_access_token = get_page_access_token(self.doc.page_id, self.defaults)
+
+        lead_ids = list(dict.fromkeys(lead_ids))
+        for start in range(0, len(lead_ids), GraphBatch.max_requests):
+            chunk = lead_ids[start:start + GraphBatch.max_requests]
+            request = Request(self.defaults.api_url, self.defaults.graph_api_version, "", None,
+                params={"ids": ",".join(chunk), "fields": self.lead_fields, "access_token": self.page_access_token})
+            leads = RequestLeadGenForms(request).get_lead_forms()
+            self.create_lead(list(leads.values()))
+
+    def retry_leads(self, leads):
+        """Import raw Graph leads kept in Meta Lead Quarantine; failures count another attempt there."""
+        self.doc = frappe.get_doc("Sync New Add", self.name)
+        self.page = frappe.get_doc("Page ID", self.doc.page_id)
+        self.defaults = get_credentials()
+        self.cursor = UntrackedCursor()
+        self.create_lead(leads)
+
+    def lead_request(self, cursor, session=None):
+        """Build the ``/{form_id}/leads`` request for the next page the cursor needs."""
+        params = {
+            "access_token": self.page_access_token,
+            "fields": self.lead_fields,
+            "limit": lead_page_size(self.doc, cursor.form),
+        }
+        if cursor.filtering:
+            params["filtering"] = json.dumps(cursor.filtering)
+        if cursor.after:
+            params["after"] = cursor.after
+        return Request(self.defaults.api_url, self.defaults.graph_api_version,
+        cursor.form.form_id + "/leads", None, params=params, session=session)
+
+    @property
+    def lead_fields(self):
+        if not getattr(self, "_lead_fields", None):
+            self._lead_fields = lead_fields_projection(self.doc)
+        return self._lead_fields
+
+    def iter_lead_pages(self, request):
+        """Yield one Graph page of leads at a time."""
+        return iter_graph_pages(request)
+
+    def paginate_lead_forms(self, request):
+        """Import every page of a form, checkpointing after each one so a failure can resume."""
+        page_budget = self.throttle.page_budget(self.doc.page_id)
+        try:
+            for pages_read, lead_forms in enumerate(self.iter_lead_pages(request), 1):
+                self.import_lead_page(self.cursor, lead_forms)
+                if page_budget and pages_read >= page_budget:
+                    # Usage is high: yield and let the next tick resume from the checkpoint.
+                    return
+                self.check_budget()
+        except GraphThrottled:
+            raise
+        except frappe.ValidationError as e:
+            self.pagination_failed(self.cursor, str(e))
+
+    def pagination_failed(self, cursor, error):
+        SyncMetrics.incr("page_errors", form_id=cursor.form.form_id)
+        after = cursor.after
+        if cursor.resume_failed():
+            outcome = "the saved cursor was dropped and the next run restarts from the last imported lead"
         else:
-            if lead_forms:
-                self.create_lead(lead_forms.get("data"))
-            return lead_forms
+            outcome = "the next run resumes from there"
+        frappe.log_error(
+            "Pagination Error",
+            f"Stopped paginating leads for form {cursor.form.form_id} at cursor {after}, {outcome}: {error}"
+        )
+
+    def import_lead_page(self, cursor, lead_forms):
+        """Create one page of leads and checkpoint it. Returns the next ``after`` cursor, or None after the last page."""
+        self.cursor = cursor
+        SyncMetrics.incr("pages", form_id=cursor.form.form_id)
+        self.create_lead(lead_forms.get("data"))
+        paging = lead_forms.get("paging") or {}
+        after = (paging.get("cursors") or {}).get("after")
+        if paging.get("next") and after:
+            cursor.checkpoint(after)
+            return after
+        cursor.completed = True
+        return None
+
+    def fetch_leads_in_batches(self, cursors):
+        """Fetch first and follow-up pages of every form through Graph ``/batch`` calls of up to 50 requests."""
+        batch = GraphBatch(self.defaults, self.page_access_token)
+        pending = {cursor.form.name: cursor for cursor in cursors}
+        page_budget = self.throttle.page_budget(self.doc.page_id)
+        rounds = 0
+        while pending:
+            if page_budget and rounds >= page_budget:
+                return
+            rounds += 1
+            self.check_budget()
+            chunk = list(pending.values())[:GraphBatch.max_requests]
+            try:
+                responses = batch.get([self.lead_request(cursor) for cursor in chunk])
+            except GraphThrottled:
+                raise
+            except frappe.ValidationError as e:
+                SyncMetrics.incr("page_errors", len(chunk))
+                frappe.log_error("Pagination Error", f"Batch request for {len(chunk)} forms failed, the next run resumes from the last checkpoint: {str(e)}")
+                return
+
+            for cursor, (ok, lead_forms) in zip(chunk, responses):
+                if not ok:
+                    self.pagination_failed(cursor, lead_forms)
+                elif self.import_lead_page(cursor, lead_forms):
+                    continue
+                cursor.save()
+                pending.pop(cursor.form.name)
+
+    def fetch_leads_concurrently(self, cursors):
+        """Download forms on a bounded thread pool while leads are inserted on this thread.
+
+        Worker threads only talk HTTP; every page is handed back through a
+        bounded queue so the Frappe DB connection is used by one thread and at
+        most a few pages are held in memory. Under high usage every worker stops
+        after the same page budget per form as the other fetch modes.
+        """
+        session = GraphSession.for_settings(self.defaults)
+        max_workers = max(cint(self.doc.max_workers) or 4, 1)
+        page_budget = self.throttle.page_budget(self.doc.page_id)
+        pages = queue.Queue(maxsize=max_workers * 2)
+        stop = threading.Event()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for cursor in cursors:
+                executor.submit(
+                    SyncMetrics.wrap(self.download_lead_pages),
+                    cursor, self.lead_request(cursor, session), pages, stop, page_budget,
+                )
+
+            try:
+                remaining = len(cursors)
+                while remaining:
+                    cursor, lead_forms, error, usage = pages.get()
+                    self.throttle.store(usage)
+                    if lead_forms is not None:
+                        self.import_lead_page(cursor, frappe._dict(lead_forms))
+                        self.check_budget()
+                        continue
+
+                    remaining -= 1
+                    if isinstance(error, dict):
+                        self.throttle.record({}, error)
+                    if error:
+                        self.pagination_failed(cursor, str(error))
+                    cursor.save()
+            finally:
+                # Release workers blocked on a full queue if importing stopped early.
+                stop.set()
+
+    @staticmethod
+    def download_lead_pages(cursor, request, pages, stop, max_pages=None):
+        """Put every page of a form (up to ``max_pages``) on ``pages``, then ``(cursor, None, error, usage)``.
+
+        Must not touch frappe state.
+        """
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        error, usage = None, {}
+        pages_read = 0
+        try:
+            while True:
+                response = request.session.get(request.get_url, params=request.params)
+                usage = parse_usage_headers(response.headers)
+                body = response.json()
+                if isinstance(body, dict) and body.get("error"):
+                    error = body["error"]
+                    break
+                if not isinstance(body, dict):
+                    raise ValueError(f"url : {request.get_url} error : {body}")
+                if not put((cursor, body, None, usage)):
+                    return
+                pages_read += 1
+
+                paging = body.get("paging") or {}
+                after = (paging.get("cursors") or {}).get("after")
+                if not paging.get("next") or not after:
+                    break
+                if max_pages and pages_read >= max_pages:
+                    # Usage is high: the next tick resumes from the checkpoint.
+                    break
+                request.params["after"] = after
+        except Exception as e:
+            error = e
+        put((cursor, None, error, usage))
+
+    @property
+    def imported_lead_ids(self):
+        if not getattr(self, "_imported_lead_ids", None):
+            self._imported_lead_ids = ImportedLeadIds(
+                self.doc.lead_doctype_name, self.doc.page_id, self.doc.cache_imported_lead_ids
+            )
+        return self._imported_lead_ids
+
+    @property
+    def field_mapping(self):
+        if not getattr(self, "_field_mapping", None):
+            self._field_mapping = LeadFieldMapping.for_doc(self.doc)
+        return self._field_mapping
+
     def create_lead(self, leads):
-        """Create leads in ERPNext from Facebook API data."""
-        for lead in leads:
+        """Create leads in ERPNext from Facebook API data.
+
+        The whole page is written in one transaction. Each lead gets its own
+        savepoint, so a bad row is rolled back and sent to Meta Lead
+        Quarantine, from where it is retried on its own, while its siblings
+        are kept.
+        """
+        leads = [lead for lead in leads or [] if lead.get("id") and not self.cursor.is_boundary(lead)]
+        existing_leads = self.imported_lead_ids.existing([lead.get("id") for lead in leads])
+        form_id = getattr(getattr(self.cursor, "form", None), "form_id", None)
+        SyncMetrics.incr("seen", len(leads), form_id=form_id)
+        SyncMetrics.incr("duplicate", len(existing_leads), form_id=form_id)
+        new_leads = []
+        raw_leads = []
+        failures = []
+
+        for index, lead in enumerate(leads):
             lead_id = lead.get("id")
-            if not lead_id:
+            if lead_id in existing_leads:
+                self.cursor.track(lead)
                 continue
-            
-            lead_data = {}
-                
+
+            save_point = f"meta_lead_{index}"
+            frappe.db.savepoint(save_point)
             try:
-                # Check for existing lead within transaction
-                existing_lead = frappe.db.get_value(
-                    self.doc.lead_doctype_name, 
-                    {"custom_meta_lead_id": lead_id}, 
-                    "name"
-                )
-                
-                if existing_lead:
-                    continue
-                
                 # Map field data to lead fields
-                for field in lead.get("field_data", []):
-                    field_name = field.get("name")
-                    field_values = field.get("values", [])
-                    field_value = field_values[0] if field_values else None
-                    
-                    # Find mapping for this field
-                    for mapping in self.doc.map_lead_fields:
-                        if mapping.get("form_field") == field_name:
-                            lead_data[mapping.get("lead_field")] = field_value
-                            break
-
-                # Create new lead document
-                new_lead_data = {
-                    "doctype": self.doc.lead_doctype_name,
-                    "custom_meta_lead_id": lead_id,
-                    "custom_lead_json": frappe._dict(lead),  
-                }
-                new_lead_data.update(lead_data)
+                lead_data = self.field_mapping.apply(lead.get("field_data"))
+                new_lead = self.insert_lead(lead, lead_data)
+                frappe.db.release_savepoint(save_point)
+                self.cursor.track(lead)
+                new_leads.append(new_lead)
+                raw_leads.append(lead)
 
-                new_lead = frappe.get_doc(new_lead_data)
-                
-                try:
-                    new_lead.insert(ignore_permissions=True)
-                    frappe.db.commit()
-                    
-                    # Create lead in Facebook
-                    try:
-                        FetchLeads.create_lead_in_facebook(new_lead, self.page)
-                    except Exception as fb_error:
-                        frappe.log_error(
-                            "Facebook Lead Creation Failed", 
-                            f"Lead {new_lead.name} created successfully but Facebook sync failed: {str(fb_error)}"
-                        )
-                        
-                except frappe.DuplicateEntryError:
-                    # Handle duplicate entry error gracefully
-                    frappe.db.rollback()
-                    frappe.log_error(
-                        "Duplicate Lead Prevented", 
-                        f"Attempted to create duplicate lead with ID: {lead_id}"
-                    )
-                    continue
+            except frappe.DuplicateEntryError:
+                frappe.db.rollback(save_point=save_point)
+                SyncMetrics.incr("duplicate", form_id=form_id)
+                frappe.log_error(
+                    "Duplicate Lead Prevented", 
+                    f"Attempted to create duplicate lead with ID: {lead_id}"
+                )
+                self.cursor.track(lead)
 
             except Exception as e:
-                # Log errors and traceback for better debugging
-                frappe.db.rollback()
-                frappe.log_error("Lead Document Creation Failed", f"Failed to create Lead document from Facebook data: {str(e)}")
-                frappe.log_error("Lead Creation Error Traceback", str(traceback.format_exc()))
-                frappe.log_error("Failed Lead Data Context", f"Lead data that caused creation failure: {str(lead_data)}")
+                frappe.db.rollback(save_point=save_point)
+                SyncMetrics.incr("failed", form_id=form_id)
+                self.cursor.track(lead)
+                failures.append((lead, e, traceback.format_exc()))
+
+        # Raw leads go to the compressed archive instead of a column every Lead read would carry.
+        archive_lead_payloads(
+            [(self.doc.lead_doctype_name, new_lead.name, raw_lead) for new_lead, raw_lead in zip(new_leads, raw_leads)]
+        )
+        quarantine_leads(self.name, failures)
+        frappe.db.commit()
+        SyncMetrics.incr("inserted", len(new_leads), form_id=form_id)
+        self.imported_lead_ids.remember([new_lead.custom_meta_lead_id for new_lead in new_leads])
+
+        # Create the page's new leads in Facebook with one request per pixel
+        if new_leads:
+            try:
+                self.throttle.check()
+                results = FetchLeads.create_leads_in_facebook(new_leads, self.page)
+            except GraphThrottled:
+                results = None
+            self.queue_unsent_events(new_leads, results)
+
+    def queue_unsent_events(self, new_leads, results):
+        """Hand events that were rate-limited or rejected to the outbox, which retries them with backoff.
+
+        ``results`` is None when nothing was sent. Leads the batch could not
+        build an event for (no pixel on the page) are left out.
+        """
+        unsent = [
+            new_lead for new_lead in new_leads
+            if results is None or (new_lead.name in results and not results[new_lead.name].ok)
+        ]
+        if not unsent:
+            return
+
+        from mansico_meta_integration.mansico_meta_integration.doctype.meta_event_outbox.meta_event_outbox import queue_lead_event
+
+        for new_lead in unsent:
+            queue_lead_event(new_lead, self.doc.lead_doctype_name)
+        frappe.db.commit()
+
+    def insert_lead(self, lead, lead_data):
+        """Insert one lead without committing; Fast Insert skips the Lead controller and its hooks."""
+        new_lead = frappe.new_doc(self.doc.lead_doctype_name)
+        new_lead.custom_meta_lead_id = lead.get("id")
+        new_lead.update(lead_data)
+
+        if not self.doc.fast_insert:
+            new_lead.insert(ignore_permissions=True)
+            return new_lead
+
+        new_lead.set_new_name()
+        new_lead.set_user_and_timestamp()
+        new_lead.docstatus = 0
+        new_lead.db_insert()
+        return new_lead
 
     
     @staticmethod
     def create_lead_in_facebook(lead, page):
+        FetchLeads.create_leads_in_facebook([lead], page)
 
+    @staticmethod
+    def create_leads_in_facebook(leads, page):
+        """Send the current status of many leads with one Conversions API call per pixel per batch."""
         try:
-            now = datetime.datetime.now()
-            unixtime = int(now.timestamp())
-            
-            if not lead.custom_meta_lead_id:
-                frappe.log_error("Facebook Lead Sync Validation Failed", f"Lead {lead.name} has no custom_meta_lead_id - cannot sync to Facebook")
-                return
-                
-            if not hasattr(page, 'pixel_id') or not hasattr(page, 'pixel_access_token'):
-                frappe.log_error("Facebook Page Configuration Error", f"Page {page.name if hasattr(page, 'name') else 'Unknown'} missing pixel_id or pixel_access_token - cannot sync lead to Facebook")
-                return
+            batch = LeadEventBatch()
+            for lead in leads:
+                batch.add(lead, page)
+            results = batch.flush()
 
-            # Create UserData and CustomData objects
-            user_data = UserData(lead.custom_meta_lead_id)
-            custom_data = CustomData("crm", "ERP Next")
-
-            # Create Payload object
-            payload = Payload(
-                event_name=lead.status,
-                event_time=unixtime,
-                action_source="system_generated",
-                user_data=user_data,
-                custom_data=custom_data
-            )
-
-            # Convert Payload to dictionary
-            f_payload = {"data": [payload.to_dict()]}
-
-            # Send request to Facebook
-            defaults = get_credentials()
-            request = Request(
-                defaults.api_url,
-                defaults.graph_api_version,
-                page.pixel_id + "/events",
-                f_payload,
-                params={"access_token": page.pixel_access_token}
-            )
+            # Rate-limited events are logged by the outbox once it sends them.
+            log_lead_events([result for result in results.values() if not isinstance(result.response, GraphThrottled)])
+            return results
 
-            # Send the lead
-            request_send_lead = RequestSendLead(request)
-            response = request_send_lead.send_lead()
-
-            # Insert a note with the response and payload
-            note = frappe.get_doc({
-                "doctype": "Note",
-                "title": "Lead Created in Facebook Successfully",
-                "public": 1,
-                "content": (
-                    f"Lead Created in Facebook Successfully for Lead: {lead.name}<br>"
-                    f"Response: {str(response)}<br>"
-                    f"Payload: {json.dumps(f_payload, indent=2)}"
-                ),
-            })
-            note.insert(ignore_permissions=True)
-            
         except Exception as e:
             frappe.log_error(
                 "Error in Facebook Lead Creation",
-                f"Failed to create Facebook lead for {lead.name}: {str(e)}\n\nTraceback: {frappe.get_traceback()}"
+                f"Failed to create Facebook lead for {', '.join(str(lead.name) for lead in leads)}: {str(e)}\n\nTraceback: {frappe.get_traceback()}"
             )
 
 class SyncNewAdd(Document):
     """Main document class for syncing Facebook leads."""
     
     def validate(self):
-        """Validate and fetch forms from Facebook API."""
-        defaults = get_credentials()
-        #  init Request
-        request = Request(defaults.api_url, defaults.graph_api_version,
-         self.page_id, None, params={"fields": "access_token", "transport": "cors",
-          "access_token": defaults.access_token})
-        # init RequestPageAccessToken
-        request_page_access_token = RequestPageAccessToken(request)
-        # get page access token
-        request_page_access_token.get_page_access_token()
-        # init Request
-        request = Request(defaults.api_url, defaults.graph_api_version,
-         self.page_id + "/leadgen_forms", None, params={"access_token": request_page_access_token.page_access_token,
-         "fields": "name,id,created_time,leads_count,page,page_id,\
-         questions,leads {\
-            ad_id,campaign_id,adset_id,campaign_name,ad_name,form_id,id,\
-                adset_name,created_time\
-                    }"})
-        # init RequestLeadGenForms
-        request_lead_gen_forms = RequestLeadGenForms(request)
-        # get lead forms
-        request_lead_gen_forms.get_lead_forms()
-        # init AppendForms
-        append_forms = AppendForms(request_lead_gen_forms.lead_forms, self)
-        # append forms
-        append_forms.append_forms()
+        """Merge the page's forms and form fields when Force Fetch / Fetch Map Lead Fields is set."""
+        self.validate_lead_metadata_fields()
+        if not (self.force_fetch or self.fetch_map_lead_fields or self.flags.refresh_forms) or not self.page_id:
+            return
+        AppendForms(LeadFormsCache().get(self.page_id), self).append_forms()
 
+    def validate_lead_metadata_fields(self):
+        if self.lead_metadata_fields is None:
+            return
+        fields = parse_lead_fields(self.lead_metadata_fields)
+        unknown = [field for field in fields if field not in GRAPH_LEAD_FIELDS]
+        if unknown:
+            frappe.throw(f"Unknown Graph lead fields in Lead Metadata Fields: {', '.join(unknown)}")
+        self.lead_metadata_fields = ",".join(fields)
 
     def check_email_id(self):
         first_name =  False
@@ -479,8 +1205,11 @@ class SyncNewAdd(Document):
             frappe.throw("Please map First Name Field")
 
 
-    def _create_custom_field(self, fieldname, label, fieldtype, insert_after, unique=0):
+    def _create_custom_field(self, fieldname, label, fieldtype, insert_after, unique=0, search_index=0):
         """Create a custom field if it doesn't exist."""
+        if search_index:
+            ensure_custom_field_index(self.lead_doctype_name, fieldname)
+
         if not frappe.get_meta(self.lead_doctype_name).has_field(fieldname):
             field_data = {
                 "doctype": "Custom Field",
@@ -494,15 +1223,21 @@ class SyncNewAdd(Document):
             
             if unique:
                 field_data["unique"] = 1
+            if search_index:
+                field_data["search_index"] = 1
                 
             frappe.get_doc(field_data).insert(ignore_permissions=True)
     
     def check_meta_fields_found(self):
-        self._create_custom_field("custom_meta_lead_id", "Custom Meta Lead ID", "Data", "name", unique=1)
-        self._create_custom_field("custom_lead_json", "Custom Lead JSON", "Text", "custom_meta_lead_id")
-        
+        self._create_custom_field("custom_meta_lead_id", "Custom Meta Lead ID", "Data", "name", unique=1, search_index=1)
+
+
+    def on_update(self):
+        LeadFieldMapping.clear(self.name)
+
+    def on_update_after_submit(self):
+        LeadFieldMapping.clear(self.name)
 
-        
     def on_submit(self):
         self.check_meta_fields_found()
         self.check_email_id()
@@ -515,7 +1250,7 @@ class SyncNewAdd(Document):
         # frappe.msgprint("Server Script Created Successfully")
 
     def on_cancel(self):
-        pass
+        LeadFieldMapping.clear(self.name)
         # delete Server Script
         # frappe.delete_doc("Server Script", str(self.name).lower().replace("-","_"), ignore_permissions=True)
         # frappe.msgprint("Server Script Deleted Successfully")
\ No newline at end of file
@@ -1,9 +1,493 @@
 # Copyright (c) 2024, Mansy and Contributors
 # See license.txt
 
-# import frappe
+import threading
+import time
+
+import requests
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.graph_throttle import (
+	GraphThrottle,
+	GraphThrottled,
+)
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.lead_field_mapping import (
+	LeadFieldMapping,
+	join_values,
+	normalize_phone,
+	split_name,
+)
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_metrics import SyncMetrics
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import (
+	FetchLeads,
+	ImportedLeadIds,
+	SyncRecordLock,
+	refresh_forms,
+	reset_lead_cursors,
+)
+from mansico_meta_integration.tests.benchmark import FAKE_FORM_PREFIX, benchmark_sync, fake_sync_record
+from mansico_meta_integration.tests.fake_graph_server import FakeGraphServer
+
+FORM_ID = f"{FAKE_FORM_PREFIX}0000"
+
 
 class TestSyncNewAdd(FrappeTestCase):
-	pass
+	def imported(self, doc):
+		return frappe.get_all(
+			doc.lead_doctype_name, {"custom_meta_lead_id": ["like", f"{FAKE_FORM_PREFIX}%"]}, pluck="custom_meta_lead_id"
+		)
+
+	def test_form_discovery_fills_forms_and_mapping(self):
+		with FakeGraphServer(forms={FORM_ID: 3}) as server, fake_sync_record(server) as doc:
+			self.assertEqual([row.form_id for row in doc.table_hsya], [FORM_ID])
+			self.assertEqual(
+				{row.form_field: row.lead_field for row in doc.map_lead_fields},
+				{"full_name": "first_name", "email": "email_id", "phone_number": "mobile_no"},
+			)
+
+	def test_refresh_forms_merges_new_forms_with_force_fetch_off(self):
+		new_form_id = f"{FAKE_FORM_PREFIX}0001"
+		with FakeGraphServer(forms={FORM_ID: 3}) as server, fake_sync_record(server) as doc:
+			draft = frappe.get_doc({
+				"doctype": "Sync New Add",
+				"based_on": "Page ID",
+				"page_id": doc.page_id,
+				"event_frequency": "Daily",
+				"lead_doctype_name": doc.lead_doctype_name,
+			}).insert(ignore_permissions=True)
+			try:
+				server.forms[new_form_id] = 1
+				refresh_forms(draft.name)
+				draft.reload()
+				self.assertEqual(sorted(row.form_id for row in draft.table_hsya), [FORM_ID, new_form_id])
+				self.assertFalse(draft.force_fetch)
+			finally:
+				frappe.delete_doc("Sync New Add", draft.name, ignore_permissions=True, force=True)
+
+	def test_fetch_imports_every_page_once(self):
+		with FakeGraphServer(forms={FORM_ID: 120}, page_size=50) as server, fake_sync_record(server) as doc:
+			FetchLeads(doc.name).fetch_leads()
+			self.assertEqual(len(set(self.imported(doc))), 120)
+			self.assertEqual(server.events_received, 120)
+
+			# The cursor only asks for leads newer than the last import.
+			server.reset_counters()
+			FetchLeads(doc.name).fetch_leads()
+			self.assertEqual(len(self.imported(doc)), 120)
+			self.assertEqual(server.calls["leads"], 1)
+
+	def test_rejected_resume_cursor_restarts_from_last_lead(self):
+		for fetch_mode in ("Sequential", "Batch", "Concurrent"):
+			with FakeGraphServer(forms={FORM_ID: 30}, page_size=10) as server, fake_sync_record(
+				server, fetch_mode=fetch_mode
+			) as doc:
+				doc.table_hsya[0].db_set("sync_checkpoint", frappe.as_json({"after": "expired"}))
+				FetchLeads(doc.name).fetch_leads()
+				self.assertFalse(self.imported(doc))
+				self.assertFalse(frappe.db.get_value("Meta Forms", doc.table_hsya[0].name, "sync_checkpoint"))
+				self.assertEqual(frappe.get_last_doc("Meta Sync Run", {"sync_new_add": doc.name}).status, "Partial", fetch_mode)
+
+				FetchLeads(doc.name).fetch_leads()
+				self.assertEqual(len(set(self.imported(doc))), 30)
+				self.assertEqual(frappe.get_last_doc("Meta Sync Run", {"sync_new_add": doc.name}).status, "Completed")
+
+	def test_batch_mode_matches_sequential(self):
+		forms = {FORM_ID: 40, f"{FAKE_FORM_PREFIX}0001": 25}
+		with FakeGraphServer(forms=forms, page_size=10) as server, fake_sync_record(server, fetch_mode="Batch") as doc:
+			FetchLeads(doc.name).fetch_leads()
+			self.assertEqual(len(set(self.imported(doc))), 65)
+			self.assertTrue(server.calls["batch"])
+
+	def test_transient_errors_are_retried(self):
+		with FakeGraphServer(forms={FORM_ID: 60}, page_size=20, error_rate=0.2) as server, fake_sync_record(server) as doc:
+			FetchLeads(doc.name).fetch_leads()
+			FetchLeads(doc.name).fetch_leads()
+			self.assertEqual(len(set(self.imported(doc))), 60)
+
+	def test_run_is_logged(self):
+		with FakeGraphServer(forms={FORM_ID: 30}, page_size=10) as server, fake_sync_record(server) as doc:
+			FetchLeads(doc.name).fetch_leads()
+			run = frappe.get_last_doc("Meta Sync Run", {"sync_new_add": doc.name})
+			self.assertEqual(run.status, "Completed")
+			self.assertEqual((run.pages, run.leads_seen, run.leads_inserted), (3, 30, 30))
+			self.assertEqual(run.capi_events, 30)
+
+	def test_concurrent_run_counts_worker_calls(self):
+		forms = {FORM_ID: 30, f"{FAKE_FORM_PREFIX}0001": 20}
+		with FakeGraphServer(forms=forms, page_size=10) as server, fake_sync_record(server, fetch_mode="Concurrent") as doc:
+			FetchLeads(doc.name).fetch_leads()
+			run = frappe.get_last_doc("Meta Sync Run", {"sync_new_add": doc.name})
+			calls = frappe.parse_json(run.metrics)["calls"]
+			self.assertEqual(sum(call["count"] for call in calls if call["endpoint"] == "leads"), server.calls["leads"])
+			self.assertEqual(run.leads_inserted, 50)
+
+	def test_every_fetch_mode_keeps_to_the_page_budget_under_high_usage(self):
+		budget = GraphThrottle.slow_page_budget
+		forms = {FORM_ID: 100, f"{FAKE_FORM_PREFIX}0001": 100}
+		for fetch_mode in ("Sequential", "Batch", "Concurrent"):
+			frappe.cache().delete_keys(GraphThrottle.prefix)
+			try:
+				with FakeGraphServer(forms=forms, page_size=10, app_usage={"call_count": 80}) as server, fake_sync_record(
+					server, fetch_mode=fetch_mode
+				) as doc:
+					GraphThrottle().store({"app": 80, "objects": {}, "ad_account": None})
+					FetchLeads(doc.name).fetch_leads()
+					self.assertEqual(len(set(self.imported(doc))), 2 * budget * 10, fetch_mode)
+			finally:
+				frappe.cache().delete_keys(GraphThrottle.prefix)
+
+	def test_backfill_imports_history_alongside_incremental_sync(self):
+		from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.backfill import (
+			run_backfill,
+			start_backfill,
+		)
+
+		with FakeGraphServer(forms={FORM_ID: 50}, page_size=20) as server, fake_sync_record(
+			server, backfill_from="2023-12-01", backfill_window_days=3650
+		) as doc:
+			start_backfill(doc.name)
+			# The incremental cursor starts where the backfill ends, so it finds nothing to read.
+			FetchLeads(doc.name).fetch_leads()
+			self.assertFalse(self.imported(doc))
+
+			run_backfill(doc.name)
+			doc.reload()
+			self.assertEqual(doc.backfill_status, "Completed")
+			self.assertEqual(len(set(self.imported(doc))), 50)
+
+	def test_leads_are_downloaded_with_the_configured_projection_and_page_size(self):
+		with FakeGraphServer(forms={FORM_ID: 30}, page_size=25) as server, fake_sync_record(
+			server, lead_metadata_fields=" campaign_name, ad_name ,campaign_name"
+		) as doc:
+			self.assertEqual(doc.lead_metadata_fields, "campaign_name,ad_name")
+			doc.table_hsya[0].db_set("page_size", 10)
+			server.reset_counters()
+			FetchLeads(doc.name).fetch_leads()
+			self.assertEqual(len(set(self.imported(doc))), 30)
+			self.assertEqual(server.calls["leads"], 3)
+
+			params = next(params for method, path, params in server.requests if path.endswith("/leads"))
+			self.assertEqual(params["fields"], "id,created_time,form_id,field_data,campaign_name,ad_name")
+			self.assertEqual(params["limit"], "10")
+
+	def test_failed_leads_are_quarantined_and_retried(self):
+		from mansico_meta_integration.mansico_meta_integration.doctype.meta_lead_quarantine.meta_lead_quarantine import (
+			requeue,
+			retry_quarantined_leads,
+		)
+
+		bad_lead = f"{FORM_ID}00000004"
+		with FakeGraphServer(forms={FORM_ID: 10}, bad_leads={4}) as server, fake_sync_record(server) as doc:
+			FetchLeads(doc.name).fetch_leads()
+			self.assertEqual(len(self.imported(doc)), 9)
+			quarantined = frappe.get_doc("Meta Lead Quarantine", bad_lead)
+			self.assertEqual((quarantined.status, quarantined.attempts, quarantined.form_id), ("Quarantined", 1, FORM_ID))
+			self.assertTrue(quarantined.error_class)
+
+			# The cursor moved past the failed lead, so the next run reads nothing old.
+			server.reset_counters()
+			FetchLeads(doc.name).fetch_leads()
+			self.assertEqual(server.calls["leads"], 1)
+			self.assertEqual(len(self.imported(doc)), 9)
+
+			payload = frappe.parse_json(quarantined.payload)
+			for field in payload["field_data"]:
+				if field["name"] == "email":
+					field["values"] = [f"lead{bad_lead}@example.com"]
+			quarantined.db_set("payload", frappe.as_json(payload))
+			requeue([bad_lead])
+			server.reset_counters()
+			retry_quarantined_leads()
+			self.assertIn(bad_lead, self.imported(doc))
+			self.assertFalse(frappe.db.exists("Meta Lead Quarantine", bad_lead))
+			self.assertEqual(server.calls["leads"], 0)
+
+	def test_rate_limited_events_go_to_the_outbox(self):
+		frappe.cache().delete_keys(GraphThrottle.prefix)
+		try:
+			with FakeGraphServer(forms={FORM_ID: 30}, page_size=10, events_limit=1) as server, fake_sync_record(server) as doc:
+				FetchLeads(doc.name).fetch_leads()
+				imported = self.imported(doc)
+				# The first page's events went out; Meta rate-limited the rest mid-run.
+				self.assertEqual(server.events_received, 10)
+				self.assertGreaterEqual(len(imported), 20)
+				queued = frappe.get_all(
+					"Meta Event Outbox", {"meta_lead_id": ["in", imported], "status": "Pending"}, pluck="meta_lead_id"
+				)
+				self.assertEqual(len(queued), len(imported) - 10)
+		finally:
+			frappe.cache().delete_keys(GraphThrottle.prefix)
+
+	def test_fast_insert_names_and_defaults_rows_and_isolates_failures(self):
+		with FakeGraphServer(forms={FORM_ID: 5}, oversized_leads={2}) as server, fake_sync_record(server, fast_insert=1) as doc:
+			FetchLeads(doc.name).fetch_leads()
+
+			leads = frappe.get_all(
+				"Lead",
+				{"custom_meta_lead_id": ["like", f"{FORM_ID}%"]},
+				["name", "custom_meta_lead_id", "first_name", "email_id", "status", "owner", "creation", "docstatus"],
+			)
+			failed = f"{FORM_ID}00000002"
+			# The oversized lead rolled back to its own savepoint; its siblings were kept.
+			self.assertEqual(len(leads), 4)
+			self.assertNotIn(failed, [lead.custom_meta_lead_id for lead in leads])
+			self.assertEqual(frappe.db.get_value("Meta Lead Quarantine", failed, "attempts"), 1)
+
+			reference = frappe.get_doc({"doctype": "Lead", "first_name": "Reference Lead"}).insert(ignore_permissions=True)
+			try:
+				prefix = reference.name.rstrip("0123456789")
+				self.assertEqual(len({lead.name for lead in leads}), 4)
+				for lead in leads:
+					self.assertTrue(lead.name.startswith(prefix))
+					self.assertEqual(lead.first_name, f"Lead {lead.custom_meta_lead_id}")
+					self.assertEqual(lead.email_id, f"lead{lead.custom_meta_lead_id}@example.com")
+					self.assertEqual((lead.status, lead.owner, lead.docstatus), (reference.status, reference.owner, 0))
+					self.assertTrue(lead.creation)
+			finally:
+				frappe.delete_doc("Lead", reference.name, ignore_permissions=True, force=True)
+
+	def test_run_stops_at_its_deadline_and_resumes_from_the_checkpoint(self):
+		class StopAfterFirstPage(FetchLeads):
+			def import_lead_page(self, cursor, lead_forms):
+				super().import_lead_page(cursor, lead_forms)
+				self.deadline = time.monotonic()
+
+		with FakeGraphServer(forms={FORM_ID: 30}, page_size=10) as server, fake_sync_record(server) as doc:
+			StopAfterFirstPage(doc.name, deadline=time.monotonic() + 600).fetch_leads()
+			self.assertEqual(len(self.imported(doc)), 10)
+			self.assertEqual(frappe.get_last_doc("Meta Sync Run", {"sync_new_add": doc.name}).status, "Deadline")
+			checkpoint = frappe.parse_json(frappe.db.get_value("Meta Forms", doc.table_hsya[0].name, "sync_checkpoint"))
+			self.assertTrue(checkpoint["after"])
+
+			server.reset_counters()
+			FetchLeads(doc.name).fetch_leads()
+			self.assertEqual(len(set(self.imported(doc))), 30)
+			self.assertEqual(server.calls["leads"], 2)
+
+	def test_page_job_skips_a_locked_record(self):
+		from mansico_meta_integration.tasks import run_sync_page
+
+		with FakeGraphServer(forms={FORM_ID: 10}) as server, fake_sync_record(server) as doc:
+			lock = SyncRecordLock(doc.name, ttl=60)
+			self.assertTrue(lock.acquire())
+			try:
+				run_sync_page(doc.page_id, [doc.name])
+				self.assertFalse(self.imported(doc))
+			finally:
+				lock.release()
+
+			run_sync_page(doc.page_id, [doc.name])
+			self.assertEqual(len(self.imported(doc)), 10)
+
+	def test_seen_set_skips_the_database_until_the_cursor_is_reset(self):
+		with FakeGraphServer(forms={FORM_ID: 10}) as server, fake_sync_record(server, cache_imported_lead_ids=1) as doc:
+			ImportedLeadIds.clear(doc.lead_doctype_name, doc.page_id)
+			FetchLeads(doc.name).fetch_leads()
+			imported = self.imported(doc)
+			self.assertEqual(len(imported), 10)
+
+			# The next run only sees the boundary lead, which the cursor skips outright.
+			FetchLeads(doc.name).fetch_leads()
+			run = frappe.get_last_doc("Meta Sync Run", {"sync_new_add": doc.name})
+			self.assertEqual((run.leads_seen, run.duplicates, run.leads_inserted), (0, 0, 0))
+
+			# Leads deleted behind the seen-set's back are still reported from Redis, without a query.
+			frappe.db.delete(doc.lead_doctype_name, {"custom_meta_lead_id": ["in", imported]})
+			seen = ImportedLeadIds(doc.lead_doctype_name, doc.page_id, use_cache=True)
+			self.assertEqual(seen.existing(imported), set(imported))
+			self.assertFalse(ImportedLeadIds(doc.lead_doctype_name, doc.page_id).existing(imported))
+
+			reset_lead_cursors(doc.name)
+			self.assertFalse(seen.existing(imported))
+			FetchLeads(doc.name).fetch_leads()
+			self.assertEqual(sorted(self.imported(doc)), sorted(imported))
+
+	def test_import_lead_ids(self):
+		with FakeGraphServer(forms={FORM_ID: 10}) as server, fake_sync_record(server) as doc:
+			FetchLeads(doc.name).import_lead_ids([f"{FORM_ID}00000003", f"{FORM_ID}00000007"])
+			self.assertEqual(sorted(self.imported(doc)), [f"{FORM_ID}00000003", f"{FORM_ID}00000007"])
+
+
+class TestSyncBenchmark(FrappeTestCase):
+	def test_small_benchmark(self):
+		result = benchmark_sync(100, page_size=50)
+		self.assertEqual(result.imported, 100)
+		# Two lead pages, a Conversions API call per page and one token call.
+		self.assertLessEqual(result.api_calls_per_lead, 0.05)
+
+
+class TestSyncRecordLock(FrappeTestCase):
+	def test_lock_is_exclusive_until_released(self):
+		first, second = SyncRecordLock("test-lock", ttl=60), SyncRecordLock("test-lock", ttl=60)
+		self.assertTrue(first.acquire())
+		try:
+			self.assertFalse(second.acquire())
+			started = time.monotonic()
+			self.assertFalse(second.acquire(wait=1))
+			self.assertGreaterEqual(time.monotonic() - started, 1)
+		finally:
+			first.release()
+		self.assertTrue(second.acquire())
+		second.release()
+
+	def test_release_of_an_expired_lock_keeps_the_new_holder(self):
+		first, second = SyncRecordLock("test-lock", ttl=60), SyncRecordLock("test-lock", ttl=60)
+		self.assertTrue(first.acquire())
+		# As if the first holder's lock expired and another run took it.
+		frappe.cache().delete(first.key)
+		self.assertTrue(second.acquire())
+		try:
+			first.release()
+			self.assertFalse(SyncRecordLock("test-lock", ttl=60).acquire())
+		finally:
+			second.release()
+
+
+class TestLeadFieldMapping(FrappeTestCase):
+	def test_normalize_phone(self):
+		self.assertEqual(normalize_phone(["+1 (555) 000-0001"], "mobile_no"), {"mobile_no": "+15550000001"})
+		self.assertEqual(normalize_phone(["0100 123-4567"], "mobile_no"), {"mobile_no": "01001234567"})
+		self.assertEqual(normalize_phone(["n/a"], "mobile_no"), {"mobile_no": None})
+		self.assertEqual(normalize_phone([], "mobile_no"), {"mobile_no": None})
+
+	def test_split_name(self):
+		self.assertEqual(
+			split_name([" Ada  King Lovelace "], "first_name", "custom_family_name"),
+			{"first_name": "Ada", "custom_family_name": "King Lovelace"},
+		)
+		self.assertEqual(split_name(["Ada"], "first_name", "last_name"), {"first_name": "Ada", "last_name": None})
+		self.assertEqual(split_name([], "first_name", "last_name"), {"first_name": None, "last_name": None})
+		# Without a rest field the name is kept whole rather than written to a guessed field.
+		self.assertEqual(split_name(["Ada Lovelace"], "first_name"), {"first_name": "Ada Lovelace"})
+
+	def test_join_values(self):
+		self.assertEqual(join_values(["Cars", "Boats", 3], "custom_interests"), {"custom_interests": "Cars, Boats, 3"})
+		self.assertEqual(join_values([], "custom_interests"), {"custom_interests": None})
+
+	def test_apply_runs_every_rule_of_a_form_field(self):
+		mapping = LeadFieldMapping.compile([
+			{"form_field": "full_name", "lead_field": "first_name", "transform": "Split Name", "rest_lead_field": "last_name"},
+			{"form_field": "full_name", "lead_field": "lead_name"},
+			{"form_field": "phone_number", "lead_field": "mobile_no", "transform": "Normalize Phone"},
+			{"form_field": "unmapped", "lead_field": None},
+		])
+		lead_data = mapping.apply([
+			{"name": "full_name", "values": ["Ada Lovelace"]},
+			{"name": "phone_number", "values": ["+44 20 7946 0000"]},
+			{"name": "unmapped", "values": ["x"]},
+		])
+		self.assertEqual(lead_data, {
+			"first_name": "Ada", "last_name": "Lovelace", "lead_name": "Ada Lovelace", "mobile_no": "+442079460000",
+		})
+
+	def test_cache_follows_modified_and_is_cleared_on_save(self):
+		with FakeGraphServer(forms={FORM_ID: 1}) as server, fake_sync_record(server) as doc:
+			LeadFieldMapping.clear(doc.name)
+			rules = LeadFieldMapping.for_doc(doc).rules
+			self.assertEqual(frappe.cache().hget(LeadFieldMapping.cache_key, doc.name), (str(doc.modified), rules))
+
+			# Served from the cache while modified is unchanged.
+			doc.map_lead_fields[0].transform = "Join Values"
+			self.assertEqual(LeadFieldMapping.for_doc(doc).rules, rules)
+
+			doc.modified = frappe.utils.add_to_date(doc.modified, seconds=1)
+			self.assertNotEqual(LeadFieldMapping.for_doc(doc).rules, rules)
+
+			doc.reload()
+			LeadFieldMapping.for_doc(doc)
+			doc.save(ignore_permissions=True)
+			self.assertIsNone(frappe.cache().hget(LeadFieldMapping.cache_key, doc.name))
+
+
+class TestSyncMetrics(FrappeTestCase):
+	def test_runs_in_other_threads_do_not_mix(self):
+		other_started, other_done = threading.Event(), threading.Event()
+
+		def other_run():
+			with SyncMetrics.run("other", "2") as metrics:
+				other_started.set()
+				other_done.wait(5)
+				SyncMetrics.incr("pages")
+			self.other = metrics
+
+		thread = threading.Thread(target=other_run)
+		thread.start()
+		other_started.wait(5)
+		SyncMetrics.incr("pages", 5)
+		with SyncMetrics.run("this", "1") as metrics:
+			SyncMetrics.incr("pages", 2)
+			worker = threading.Thread(target=SyncMetrics.wrap(SyncMetrics.incr), args=("pages", 3))
+			worker.start()
+			worker.join(5)
+			other_done.set()
+			thread.join(5)
+
+		self.assertEqual(metrics.counts["pages"], 5)
+		self.assertEqual(self.other.counts["pages"], 1)
+		self.assertIsNone(SyncMetrics.current())
+
+
+class TestGraphThrottle(FrappeTestCase):
+	def setUp(self):
+		frappe.cache().delete_keys(GraphThrottle.prefix)
+		self.throttle = GraphThrottle()
+
+	def tearDown(self):
+		frappe.cache().delete_keys(GraphThrottle.prefix)
+
+	def fetch(self, server):
+		response = requests.get(f"{server.url}/v19.0/1234/leads", timeout=5)
+		body = response.json()
+		self.throttle.record(response.headers, body.get("error"))
+
+	def test_low_usage_does_not_throttle(self):
+		with FakeGraphServer(app_usage={"call_count": 10, "total_cputime": 5, "total_time": 8}) as server:
+			self.fetch(server)
+
+		self.assertEqual(self.throttle.state().percent, 10)
+		self.assertIsNone(self.throttle.page_budget())
+		self.throttle.check()
+
+	def test_high_usage_slows_down(self):
+		with FakeGraphServer(app_usage={"call_count": 20, "total_cputime": 80, "total_time": 30}) as server:
+			self.fetch(server)
+
+		self.assertEqual(self.throttle.page_budget(), GraphThrottle.slow_page_budget)
+		self.throttle.check()
+
+	def test_page_usage_defers_only_that_page(self):
+		business_usage = {
+			"1234": [{"type": "pages", "call_count": 100, "total_cputime": 40, "total_time": 40, "estimated_time_to_regain_access": 10}]
+		}
+		with FakeGraphServer(app_usage={"call_count": 5}, business_usage=business_usage) as server:
+			self.fetch(server)
+
+		self.throttle.check()
+		self.throttle.check("5678")
+		with self.assertRaises(GraphThrottled):
+			self.throttle.check("1234")
+
+	def test_rate_limit_error_defers_app(self):
+		with FakeGraphServer(error_code=4) as server:
+			self.fetch(server)
+
+		with self.assertRaises(GraphThrottled):
+			self.throttle.check()
+
+	def test_ad_account_usage_counts(self):
+		with FakeGraphServer(ad_account_usage={"acc_id_util_pct": 97, "reset_time_duration": 120}) as server:
+			self.fetch(server)
+
+		with self.assertRaises(GraphThrottled):
+			self.throttle.check(ad_account=True)
+		# Lead fetches and Conversions API sends do not spend the ad account budget.
+		self.throttle.check("1234")
+
+	def test_low_ad_account_usage_with_reset_time_does_not_defer(self):
+		with FakeGraphServer(ad_account_usage={"acc_id_util_pct": 3, "reset_time_duration": 120}) as server:
+			self.fetch(server)
+
+		self.throttle.check(ad_account=True)
+		self.assertIsNone(self.throttle.page_budget())
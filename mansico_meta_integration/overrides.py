@@ -1,7 +1,8 @@
 import frappe
-from frappe.utils.scheduler import is_scheduler_disabled
 from frappe import _
-from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import FetchLeads
+
+SCHEDULER_FLAG_KEY = "mansico_meta:scheduler_disabled"
+SCHEDULER_FLAG_TTL = 60
 
 def validate_lead(doc, method=None):
     _validate_lead_status_change(doc, "Lead")
@@ -9,22 +10,39 @@ def validate_lead(doc, method=None):
 def validate_crmlead(doc, method=None):
     _validate_lead_status_change(doc, "CRM Lead")
 
+def scheduler_disabled():
+    """Whether the scheduler is off, re-read at most once a minute instead of on every save."""
+    disabled = frappe.cache().get_value(SCHEDULER_FLAG_KEY)
+    if disabled is None:
+        from frappe.utils.scheduler import is_scheduler_disabled
+
+        disabled = bool(is_scheduler_disabled())
+        frappe.cache().set_value(SCHEDULER_FLAG_KEY, disabled, expires_in_sec=SCHEDULER_FLAG_TTL)
+    return disabled
+
 def _validate_lead_status_change(doc, doctype):
     """
-    Helper function to validate status change and trigger Facebook lead creation.
+    Helper function to validate status change and queue the new status for Facebook.
+    The Meta Event Outbox is drained by a background job, so saving never waits on the Graph API.
+    Runs on every Lead save, so leads that did not come from Meta or kept their status
+    return before touching the cache, the database or the Meta modules.
     """
-    if is_scheduler_disabled():
+    if not doc.get("custom_meta_lead_id") or doc.is_new():
+        return
+
+    old_doc = doc.get_doc_before_save()
+    if not old_doc or old_doc.status == doc.status:
+        return
+
+    if scheduler_disabled():
         frappe.throw(_("Please enable the Scheduler first."))
 
-    if hasattr(doc, 'custom_meta_lead_id') and not doc.is_new() and doc.custom_meta_lead_id:
-        old_doc = doc.get_doc_before_save()
-        if old_doc and old_doc.status != doc.status:
-            try:
-                lead = frappe.get_doc(doctype, doc.name)
-                page = frappe.get_doc("Page ID", lead.get("page_id", ""))
-                FetchLeads.create_lead_in_facebook(lead, page)
-            except Exception as e:
-                frappe.log_error(
-                    title=f"Error in {doctype} Facebook Lead Creation",
-                    message=f"An error occurred while creating a Facebook lead for {doctype} {doc.name}: {str(e)}"
-                )
\ No newline at end of file
+    from mansico_meta_integration.mansico_meta_integration.doctype.meta_event_outbox.meta_event_outbox import queue_lead_event
+
+    try:
+        queue_lead_event(doc, doctype)
+    except Exception as e:
+        frappe.log_error(
+            title=f"Error in {doctype} Facebook Lead Creation",
+            message=f"An error occurred while queueing a Facebook lead event for {doctype} {doc.name}: {str(e)}"
+        )
\ No newline at end of file
@@ -0,0 +1,54 @@
+import json
+
+import frappe
+
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_lead_payload.meta_lead_payload import archive_lead_payloads
+
+CHUNK_SIZE = 1000
+
+
+def execute():
+    """Move raw leads from custom_lead_json into Meta Lead Payload and clear the column.
+
+    Rows whose JSON cannot be archived (not an object, or no lead id) keep their
+    value and are listed in the Error Log.
+    """
+    for doctype in ("Lead", "CRM Lead"):
+        if not frappe.db.exists("DocType", doctype) or not frappe.db.has_column(doctype, "custom_lead_json"):
+            continue
+
+        last_name = None
+        skipped = []
+        filters = {"custom_lead_json": ["is", "set"]}
+        while leads := frappe.get_all(
+            doctype,
+            filters={**filters, "name": [">", last_name]} if last_name else filters,
+            fields=["name", "custom_meta_lead_id", "custom_lead_json"],
+            order_by="name asc",
+            limit=CHUNK_SIZE,
+        ):
+            rows = []
+            for lead in leads:
+                try:
+                    raw_lead = json.loads(lead.custom_lead_json)
+                except ValueError:
+                    raw_lead = None
+                if isinstance(raw_lead, dict) and (raw_lead.get("id") or lead.custom_meta_lead_id):
+                    raw_lead.setdefault("id", lead.custom_meta_lead_id)
+                    rows.append((doctype, lead.name, raw_lead))
+                else:
+                    skipped.append(lead.name)
+
+            archive_lead_payloads(rows)
+            if rows:
+                frappe.db.set_value(
+                    doctype, {"name": ["in", [name for _, name, _ in rows]]}, "custom_lead_json", None, update_modified=False
+                )
+            frappe.db.commit()
+            last_name = leads[-1].name
+
+        if skipped:
+            frappe.log_error(
+                "Lead JSON Not Archived",
+                f"custom_lead_json of these {doctype} records is not a Meta lead and was left in place: {', '.join(skipped)}"
+            )
@@ -0,0 +1,10 @@
+import frappe
+
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import ensure_custom_field_index
+
+
+def execute():
+    """Index custom_meta_lead_id on every lead doctype that has it."""
+    for doctype in ("Lead", "CRM Lead"):
+        if frappe.db.exists("DocType", doctype):
+            ensure_custom_field_index(doctype, "custom_meta_lead_id")
@@ -0,0 +1,32 @@
+// Copyright (c) 2026, mansy and contributors
+// For license information, please see license.txt
+
+// The raw Graph lead lives compressed in Meta Lead Payload and is only fetched when asked for.
+const show_meta_payload = (frm) => {
+	frappe.call({
+		method: "mansico_meta_integration.mansico_meta_integration.doctype.meta_lead_payload.meta_lead_payload.get_lead_payload",
+		args: { lead_doctype: frm.doctype, lead_name: frm.doc.name },
+		callback: (r) => {
+			if (!r.message) {
+				frappe.msgprint(__("No Meta payload is archived for this lead."));
+				return;
+			}
+			frappe.msgprint({
+				title: __("Meta Lead Payload"),
+				message: `<pre>${frappe.utils.escape_html(JSON.stringify(r.message, null, 2))}</pre>`,
+				wide: true,
+			});
+		},
+	});
+};
+
+["Lead", "CRM Lead"].forEach((doctype) => {
+	frappe.ui.form.on(doctype, {
+		refresh(frm) {
+			if (frm.is_new() || !frm.doc.custom_meta_lead_id) {
+				return;
+			}
+			frm.add_custom_button(__("Meta Payload"), () => show_meta_payload(frm), __("View"));
+		},
+	});
+});
@@ -1,15 +1,83 @@
 
 
+import time
+
 import frappe
-from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import FetchLeads
+from frappe.utils import cint
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import (
+    FetchLeads,
+    SyncRecordLock,
+    prefetch_page_access_tokens,
+)
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add import backfill
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_event_outbox.meta_event_outbox import drain_outbox
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_audience_member.meta_audience_member import enqueue_audience_sync
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_lead_quarantine.meta_lead_quarantine import (
+    MetaLeadQuarantine,
+    enqueue_retry,
+)
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_sync_log.meta_sync_log import MetaSyncLog
+from mansico_meta_integration.mansico_meta_integration.doctype.meta_sync_run.meta_sync_run import MetaSyncRun
+
+SYNC_JOB_TIMEOUT = 1500
+# Seconds a run keeps in hand before the RQ timeout to save its checkpoint and stop.
+SYNC_JOB_MARGIN = 60
 
 
 def _process_sync_records_by_frequency(frequency):
-    """Process sync records for a given frequency."""
-    sync_new_add = frappe.db.get_all("Sync New Add", {"event_frequency": frequency, "docstatus": 1}, pluck="name")
-    for name in sync_new_add:
-        fetch = FetchLeads(name)
-        fetch.fetch_leads()
+    """Enqueue one sync job per page of the due records, after caching all their page tokens at once."""
+    settings = frappe.get_cached_doc("Meta Facebook Settings")
+    timeout = cint(settings.sync_job_timeout) or SYNC_JOB_TIMEOUT
+    sync_new_add = frappe.db.get_all(
+        "Sync New Add", {"event_frequency": frequency, "docstatus": 1}, ["name", "page_id"], order_by="creation asc"
+    )
+    pages = {}
+    for record in sync_new_add:
+        pages.setdefault(record.page_id, []).append(record.name)
+    if not pages:
+        return
+
+    prefetch_page_access_tokens(pages)
+    for page_id, names in pages.items():
+        frappe.enqueue(
+            "mansico_meta_integration.tasks.run_sync_page",
+            queue=settings.sync_queue or "long",
+            timeout=timeout,
+            # Records of one page can run on different frequencies; a shared id would drop the slower tick.
+            job_id=f"mansico_meta_sync_page::{frequency}::{page_id}",
+            deduplicate=True,
+            page_id=page_id,
+            names=names,
+            timeout_in_sec=timeout,
+        )
+
+
+def run_sync_page(page_id, names, timeout_in_sec=SYNC_JOB_TIMEOUT):
+    """Fetch the leads of every due Sync New Add of one page in a single pass, sharing one time budget."""
+    deadline = time.monotonic() + max(timeout_in_sec - SYNC_JOB_MARGIN, SYNC_JOB_MARGIN)
+    for name in names:
+        if time.monotonic() >= deadline:
+            return
+        lock = SyncRecordLock(name, ttl=timeout_in_sec + SYNC_JOB_MARGIN)
+        if not lock.acquire():
+            continue
+        try:
+            FetchLeads(name, deadline=deadline).fetch_leads()
+        except Exception:
+            # One broken record (cancelled after enqueue, DB error, ...) must not skip the rest of the page.
+            frappe.db.rollback()
+            frappe.log_error("Sync New Add Failed", f"Sync of {name} failed, the other records of page {page_id} continue:\n{frappe.get_traceback()}")
+        finally:
+            lock.release()
+
+
+def run_sync_record(name, timeout_in_sec=SYNC_JOB_TIMEOUT):
+    """Fetch the leads of one Sync New Add.
+
+    The scheduler enqueues ``run_sync_page``; this only remains so per-record
+    jobs queued before an upgrade still run.
+    """
+    run_sync_page(frappe.db.get_value("Sync New Add", name, "page_id"), [name], timeout_in_sec)
 
 @frappe.whitelist()
 def all():
@@ -45,4 +113,37 @@ def every_10_minutes():
 
 @frappe.whitelist()
 def every_5_minutes():
-    _process_sync_records_by_frequency("Every 5 Minutes")
\ No newline at end of file
+    _process_sync_records_by_frequency("Every 5 Minutes")
+
+def drain_event_outbox():
+    """Send pending Lead status events queued by the Lead validate hooks."""
+    drain_outbox()
+
+def prune_sync_log():
+    """Delete Meta Sync Log, Meta Sync Run and discarded Meta Lead Quarantine rows past the retention set in Meta Facebook Settings."""
+    days = cint(frappe.db.get_single_value("Meta Facebook Settings", "sync_log_retention_days")) or 30
+    MetaSyncLog.clear_old_logs(days)
+    MetaSyncRun.clear_old_logs(days)
+    MetaLeadQuarantine.clear_old_logs(days)
+
+
+def retry_quarantined_leads():
+    """Re-import quarantined leads whose retry delay has passed."""
+    enqueue_retry()
+
+
+def sync_custom_audience():
+    """Push leads added or removed since the last run to the Custom Audience."""
+    enqueue_audience_sync()
+
+
+def retry_deferred_leadgen_events():
+    """Import webhook leads that arrived while their Sync New Add was busy."""
+    from mansico_meta_integration.webhook import retry_deferred_leadgen_events
+
+    retry_deferred_leadgen_events()
+
+
+def continue_backfills():
+    """Pick up running backfills that are waiting for the next tick."""
+    backfill.continue_backfills()
\ No newline at end of file
@@ -0,0 +1,205 @@
+"""Throughput benchmark of the lead sync hot path against ``FakeGraphServer``.
+
+Run it on a development site, never in production; it points Meta Facebook
+Settings at the fake server for the duration of each run and deletes the
+leads it created afterwards::
+
+    bench --site dev.localhost execute mansico_meta_integration.tests.benchmark.run
+    bench --site dev.localhost execute mansico_meta_integration.tests.benchmark.run \
+        --kwargs "{'sizes': [100000, 1000000], 'page_size': 500, 'fetch_mode': 'Batch'}"
+
+Every run reports leads/sec, Graph API calls per lead, response bytes per
+lead, database queries per lead and the peak Python memory of ``FetchLeads.fetch_leads`` (which covers
+``create_lead`` and the Conversions API push of ``create_leads_in_facebook``).
+
+``run_lead_validate`` measures what the Lead ``validate`` hook adds to every
+save, which is what bulk Lead imports and Data Import jobs pay per row::
+
+    bench --site dev.localhost execute mansico_meta_integration.tests.benchmark.run_lead_validate
+"""
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import frappe
+
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.graph_throttle import GraphThrottle
+from mansico_meta_integration.overrides import validate_lead
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import (
+    FetchLeads,
+    LeadFormsCache,
+    PageAccessTokenCache,
+)
+from mansico_meta_integration.tests.fake_graph_server import FakeGraphServer
+
+DEFAULT_SIZES = (100, 1_000, 10_000, 100_000, 1_000_000)
+FAKE_PAGE_ID = "9990000000001"
+FAKE_FORM_PREFIX = "999"
+FAKE_PIXEL_ID = "9990000000002"
+
+
+def query_count():
+    """Queries sent by this connection so far, or None where the database cannot tell."""
+    if frappe.db.db_type != "mariadb":
+        return None
+    return int(frappe.db.sql("SHOW SESSION STATUS LIKE 'Questions'")[0][1])
+
+
+def clear_caches(page_id=FAKE_PAGE_ID):
+    frappe.cache().delete_keys(GraphThrottle.prefix)
+    PageAccessTokenCache.clear(page_id)
+    LeadFormsCache.clear(page_id)
+
+
+@contextmanager
+def fake_sync_record(server, lead_doctype="Lead", **values):
+    """Point the settings at ``server`` and yield a submitted Sync New Add for its forms.
+
+    Everything the record imports is deleted and the settings are restored on exit.
+    """
+    settings = frappe.get_single("Meta Facebook Settings")
+    original = {field: settings.get(field) for field in ("api_url", "graph_api_version", "access_token")}
+    settings.update({"api_url": server.url, "graph_api_version": "19.0", "access_token": "fake-user-token"})
+    settings.save(ignore_permissions=True)
+
+    if not frappe.db.exists("Page ID", FAKE_PAGE_ID):
+        frappe.get_doc({
+            "doctype": "Page ID",
+            "page_id": FAKE_PAGE_ID,
+            "name1": "Benchmark Page",
+            "pixel_id": FAKE_PIXEL_ID,
+            "pixel_access_token": "fake-pixel-token",
+        }).insert(ignore_permissions=True)
+    clear_caches()
+
+    doc = frappe.get_doc({
+        "doctype": "Sync New Add",
+        "based_on": "Page ID",
+        "page_id": FAKE_PAGE_ID,
+        "event_frequency": "Daily",
+        "lead_doctype_name": lead_doctype,
+        "force_fetch": 1,
+        "fetch_map_lead_fields": 1,
+        "lead_page_size": server.page_size,
+        **values,
+    }).insert(ignore_permissions=True)
+    for row in doc.map_lead_fields:
+        if row.form_field == "email":
+            row.lead_field = "email_id"
+    doc.force_fetch = 0
+    doc.fetch_map_lead_fields = 0
+    doc.submit()
+    frappe.db.commit()
+
+    try:
+        yield doc
+    finally:
+        frappe.db.rollback()
+        lead_filter = {"custom_meta_lead_id": ["like", f"{FAKE_FORM_PREFIX}%"]}
+        frappe.db.delete(lead_doctype, lead_filter)
+        frappe.db.delete("Meta Lead Payload", {"meta_lead_id": ["like", f"{FAKE_FORM_PREFIX}%"]})
+        frappe.db.delete("Meta Lead Quarantine", {"meta_lead_id": ["like", f"{FAKE_FORM_PREFIX}%"]})
+        frappe.db.delete("Meta Event Outbox", {"meta_lead_id": ["like", f"{FAKE_FORM_PREFIX}%"]})
+        frappe.db.delete("Meta Sync Log", {"lead_doctype": lead_doctype, "response_id": "FakeTrace"})
+        frappe.db.delete("Meta Sync Run", {"sync_new_add": doc.name})
+        doc.reload()
+        doc.cancel()
+        frappe.delete_doc("Sync New Add", doc.name, ignore_permissions=True, force=True)
+        frappe.delete_doc("Page ID", FAKE_PAGE_ID, ignore_permissions=True, force=True)
+        settings.reload()
+        settings.update(original)
+        settings.save(ignore_permissions=True)
+        clear_caches()
+        frappe.db.commit()
+
+
+def benchmark_sync(leads, forms=1, page_size=100, latency=0, error_rate=0, **values):
+    """Import ``leads`` synthetic leads spread over ``forms`` forms and return the measurements."""
+    form_ids = {f"{FAKE_FORM_PREFIX}{index:04d}": leads // forms + (index < leads % forms) for index in range(forms)}
+    with FakeGraphServer(forms=form_ids, page_size=page_size, latency=latency, error_rate=error_rate) as server:
+        with fake_sync_record(server, **values) as doc:
+            server.reset_counters()
+            queries_before = query_count()
+            tracemalloc.start()
+            started = time.perf_counter()
+
+            FetchLeads(doc.name).fetch_leads()
+
+            elapsed = time.perf_counter() - started
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            queries = query_count() - queries_before if queries_before is not None else None
+
+            imported = frappe.db.count(doc.lead_doctype_name, {"custom_meta_lead_id": ["like", f"{FAKE_FORM_PREFIX}%"]})
+            return frappe._dict(
+                leads=leads,
+                forms=forms,
+                imported=imported,
+                seconds=round(elapsed, 3),
+                leads_per_second=round(imported / elapsed, 1) if elapsed else None,
+                api_calls=sum(server.calls.values()),
+                api_calls_per_lead=round(sum(server.calls.values()) / imported, 4) if imported else None,
+                calls=dict(server.calls),
+                events_sent=server.events_received,
+                bytes_per_lead=round(server.bytes_sent / imported) if imported else None,
+                db_queries_per_lead=round(queries / imported, 2) if imported and queries is not None else None,
+                peak_memory_mb=round(peak_memory / 1024 / 1024, 1),
+            )
+
+
+def run(sizes=DEFAULT_SIZES, forms=1, page_size=100, latency=0, error_rate=0, **values):
+    """Benchmark every size in ``sizes`` and print one line per run."""
+    results = []
+    for leads in sizes:
+        result = benchmark_sync(leads, forms=forms, page_size=page_size, latency=latency, error_rate=error_rate, **values)
+        results.append(result)
+        print(
+            f"{result.leads:>9} leads  {str(result.leads_per_second):>9} leads/s  "
+            f"{result.api_calls_per_lead} API calls/lead  {result.bytes_per_lead} bytes/lead  "
+            f"{result.db_queries_per_lead} queries/lead  "
+            f"{result.peak_memory_mb} MB peak"
+        )
+    return results
+
+
+def benchmark_lead_validate(saves=100_000, lead_doctype="Lead"):
+    """Microseconds and database queries the validate hook adds per save of an existing lead.
+
+    Nothing is written: the hook runs on in-memory documents, the way
+    ``Document.save`` calls it after loading the previous version.
+    """
+
+    def existing_lead(**values):
+        doc = frappe.get_doc({"doctype": lead_doctype, "name": "benchmark-lead", "status": "Lead", **values})
+        doc._doc_before_save = frappe.get_doc(doc.as_dict())
+        return doc
+
+    def measure(hook, doc):
+        queries_before = query_count()
+        started = time.perf_counter()
+        for _ in range(saves):
+            hook(doc)
+        elapsed = time.perf_counter() - started
+        queries = query_count() - queries_before if queries_before is not None else None
+        return frappe._dict(
+            microseconds_per_save=round(elapsed * 1_000_000 / saves, 3),
+            queries_per_save=round(queries / saves, 4) if queries is not None else None,
+        )
+
+    return frappe._dict(
+        baseline=measure(lambda doc: None, existing_lead()),
+        other_lead=measure(validate_lead, existing_lead()),
+        meta_lead_same_status=measure(validate_lead, existing_lead(custom_meta_lead_id=f"{FAKE_FORM_PREFIX}00000000")),
+    )
+
+
+def run_lead_validate(saves=100_000, lead_doctype="Lead"):
+    """Benchmark the Lead validate hook and print one line per case."""
+    result = benchmark_lead_validate(saves=saves, lead_doctype=lead_doctype)
+    for case, measurement in result.items():
+        print(
+            f"{case:<22} {measurement.microseconds_per_save:>8} us/save  "
+            f"{measurement.queries_per_save} queries/save"
+        )
+    return result
@@ -0,0 +1,352 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Synthetic leads are created one minute apart, oldest first, from this instant.
+LEADS_START = 1704067200
+LEAD_INTERVAL = 60
+LEAD_INDEX_DIGITS = 8
+FAKE_AUDIENCE_ID = "9990000000009"
+
+QUESTIONS = [
+    {"key": "full_name", "label": "Full name", "type": "FULL_NAME"},
+    {"key": "email", "label": "Email", "type": "EMAIL"},
+    {"key": "phone_number", "label": "Phone number", "type": "PHONE"},
+]
+
+
+class FakeGraphServer:
+    """Local stand-in for graph.facebook.com.
+
+    Every response carries Meta's ``X-App-Usage``, ``X-Business-Use-Case-Usage``
+    and ``X-Ad-Account-Usage`` headers built from the attributes below, so the
+    throttle controller can be exercised offline. Set ``error_code`` to answer
+    every request with a Graph error. Point Meta Facebook Settings' API URL at
+    ``server.url`` to run a sync against it.
+
+    ``forms`` maps form ids to a lead count. Leads are generated on the fly
+    from their index, so a form can hold a million leads without holding them
+    in memory. ``events_limit`` answers every ``/events`` call after that
+    many with rate limit error #4. ``pages`` lists the page ids ``/me/accounts`` returns with
+    their tokens. Leads whose index is in ``bad_leads`` carry an invalid
+    email address, so importing them fails, and leads in ``oversized_leads``
+    a full name longer than a Data column holds. The server answers page token lookups, ``leadgen_forms``,
+    paginated ``leads`` (honouring ``filtering``, ``after`` and ``limit``),
+    ``?ids=`` lookups, ``/events`` and ``/batch``; leads only carry the
+    attributes named in ``fields``. ``bytes_sent`` adds up the response
+    bodies. Custom Audience creation and ``/{audience_id}/users`` uploads
+    are kept in ``audience`` (the hashed rows currently in it) and
+    ``audience_sessions``. ``latency`` delays every
+    response and ``error_rate`` answers that share of requests with a
+    transient 503.
+    """
+
+    def __init__(
+        self,
+        app_usage=None,
+        business_usage=None,
+        ad_account_usage=None,
+        error_code=None,
+        forms=None,
+        page_size=25,
+        latency=0,
+        error_rate=0,
+        seed=0,
+        pages=None,
+        bad_leads=(),
+        events_limit=None,
+        oversized_leads=(),
+    ):
+        self.app_usage = app_usage
+        self.business_usage = business_usage
+        self.ad_account_usage = ad_account_usage
+        self.error_code = error_code
+        self.forms = {str(form_id): count for form_id, count in (forms or {}).items()}
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.pages = [str(page_id) for page_id in pages or ()]
+        self.bad_leads = set(bad_leads)
+        self.events_limit = events_limit
+        self.oversized_leads = set(oversized_leads)
+        self.requests = []
+        self.calls = Counter()
+        self.events_received = 0
+        self.bytes_sent = 0
+        self.audience = set()
+        self.audience_sessions = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = []
+            self.calls = Counter()
+            self.events_received = 0
+            self.bytes_sent = 0
+
+    def usage_headers(self):
+        headers = {}
+        if self.app_usage is not None:
+            headers["X-App-Usage"] = json.dumps(self.app_usage)
+        if self.business_usage is not None:
+            headers["X-Business-Use-Case-Usage"] = json.dumps(self.business_usage)
+        if self.ad_account_usage is not None:
+            headers["X-Ad-Account-Usage"] = json.dumps(self.ad_account_usage)
+        return headers
+
+    def respond(self, method, path, params, body):
+        """Return ``(status, payload)`` for a request."""
+        if self.error_code is not None:
+            return 400, {"error": {"code": self.error_code, "message": "(#%s) Fake rate limit" % self.error_code}}
+
+        with self._lock:
+            failed = self.error_rate and self._random.random() < self.error_rate
+        if failed:
+            return 503, {"error": {"code": 2, "message": "Service temporarily unavailable", "is_transient": True}}
+
+        # Drop the version segment: "/v19.0/123/leads" -> ["123", "leads"]
+        parts = [part for part in path.split("/") if part][1:]
+        if method == "POST" and not parts:
+            return self.batch(body)
+        if method == "POST" and len(parts) == 2 and parts[1] == "events":
+            return self.events(body)
+        if method == "POST" and len(parts) == 2 and parts[1] == "customaudiences":
+            self.count("customaudiences")
+            return 200, {"id": FAKE_AUDIENCE_ID}
+        if method in ("POST", "DELETE") and len(parts) == 2 and parts[1] == "users":
+            return self.audience_users(method, parts[0], body)
+        if not parts and params.get("ids"):
+            return self.lookup(params)
+        if parts == ["me", "accounts"]:
+            return self.accounts(params)
+        if len(parts) == 2 and parts[1] == "leadgen_forms":
+            return self.leadgen_forms(parts[0], params)
+        if len(parts) == 2 and parts[1] == "leads":
+            return self.leads(parts[0], params)
+        if len(parts) == 1 and "access_token" in (params.get("fields") or ""):
+            return self.page_token(parts[0])
+        return 200, {"data": [], "paging": {}}
+
+    def count(self, kind, amount=1):
+        with self._lock:
+            self.calls[kind] += amount
+
+    def page_token(self, page_id):
+        self.count("token")
+        return 200, {"id": page_id, "access_token": f"fake-page-token-{page_id}"}
+
+    def accounts(self, params):
+        self.count("accounts")
+        accounts = [{"id": page_id, "access_token": f"fake-page-token-{page_id}"} for page_id in self.pages]
+        return 200, self.paginate(accounts, len(accounts), params)
+
+    def leadgen_forms(self, page_id, params):
+        self.count("leadgen_forms")
+        forms = [
+            {
+                "id": form_id,
+                "name": f"Fake Form {form_id}",
+                "created_time": self.graph_time(LEADS_START),
+                "leads_count": count,
+                "page": {"id": page_id, "name": "Fake Page"},
+                "questions": QUESTIONS,
+            }
+            for form_id, count in self.forms.items()
+        ]
+        return 200, self.paginate(forms, len(forms), params)
+
+    def leads(self, form_id, params):
+        self.count("leads")
+        total = self.forms.get(form_id, 0)
+        oldest, newest = 0, total
+        for condition in json.loads(params.get("filtering") or "[]"):
+            if condition.get("field") != "time_created":
+                continue
+            # Index of the first lead created after the filter value.
+            index = int((int(condition["value"]) - LEADS_START) // LEAD_INTERVAL) + 1
+            if condition.get("operator") == "GREATER_THAN":
+                oldest = max(oldest, index)
+            elif condition.get("operator") == "LESS_THAN":
+                newest = min(newest, index if (int(condition["value"]) - LEADS_START) % LEAD_INTERVAL else index - 1)
+
+        # Graph returns the newest lead first.
+        visible = max(newest - oldest, 0)
+        if not str(params.get("after") or "0").isdigit():
+            # Graph rejects cursors it no longer knows, e.g. expired ones.
+            return 400, {"error": {"code": 100, "message": "(#100) Invalid cursor", "type": "OAuthException"}}
+        return 200, self.paginate(
+            lambda start, stop: [
+                self.project(self.lead(form_id, newest - 1 - position), params) for position in range(start, stop)
+            ],
+            visible,
+            params,
+        )
+
+    def lookup(self, params):
+        self.count("ids")
+        leads = {}
+        for lead_id in params["ids"].split(","):
+            form_id, index = lead_id[:-LEAD_INDEX_DIGITS], lead_id[-LEAD_INDEX_DIGITS:]
+            if form_id in self.forms and index.isdigit() and int(index) < self.forms[form_id]:
+                leads[lead_id] = self.project(self.lead(form_id, int(index)), params)
+        return 200, leads
+
+    def events(self, body):
+        events = json.loads(body or "{}").get("data") or []
+        self.count("events")
+        with self._lock:
+            if self.events_limit is not None and self.calls["events"] > self.events_limit:
+                return 400, {"error": {"code": 4, "message": "(#4) Application request limit reached", "is_transient": True}}
+            self.events_received += len(events)
+        return 200, {"events_received": len(events), "messages": [], "fbtrace_id": "FakeTrace"}
+
+    def audience_users(self, method, audience_id, body):
+        self.count("users")
+        form = {key: values[-1] for key, values in parse_qs(body).items()}
+        rows = {tuple(row) for row in json.loads(form.get("payload") or "{}").get("data") or []}
+        session = json.loads(form.get("session") or "{}")
+        with self._lock:
+            if method == "POST":
+                self.audience |= rows
+            else:
+                # Meta matches a removed row on any of its keys, so it drops every member sharing one.
+                self.audience = {
+                    member for member in self.audience
+                    if not any(key and key == removed for row in rows for key, removed in zip(member, row))
+                }
+            self.audience_sessions.append((method, session))
+        return 200, {
+            "audience_id": audience_id,
+            "session_id": session.get("session_id"),
+            "num_received": len(rows),
+            "num_invalid_entries": 0,
+        }
+
+    def batch(self, body):
+        self.count("batch")
+        items = json.loads(parse_qs(body).get("batch", ["[]"])[-1])
+        responses = []
+        for item in items:
+            parsed = urlparse("/" + item.get("relative_url", ""))
+            params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+            # Sub-requests are relative to the version root.
+            status, payload = self.respond(item.get("method", "GET"), "/v0" + parsed.path, params, "")
+            responses.append({"code": status, "headers": [], "body": json.dumps(payload)})
+        return 200, responses
+
+    def paginate(self, rows, total, params):
+        """One Graph page of ``rows`` (a list, or a ``(start, stop)`` callable) with offset cursors."""
+        start = int(params.get("after") or 0)
+        size = int(params.get("limit") or self.page_size)
+        stop = min(start + size, total)
+        data = rows(start, stop) if callable(rows) else rows[start:stop]
+        paging = {"cursors": {"before": str(start), "after": str(stop)}} if data else {}
+        if stop < total:
+            paging["next"] = f"{self.url}/next?after={stop}"
+        return {"data": data, "paging": paging}
+
+    @staticmethod
+    def project(lead, params):
+        """Keep the attributes a ``fields`` parameter asks for; Graph returns ``id`` regardless."""
+        if not params.get("fields"):
+            return lead
+        fields = set(params["fields"].split(",")) | {"id"}
+        return {key: value for key, value in lead.items() if key in fields}
+
+    @staticmethod
+    def graph_time(timestamp):
+        return time.strftime("%Y-%m-%dT%H:%M:%S+0000", time.gmtime(timestamp))
+
+    def lead(self, form_id, index):
+        lead_id = f"{form_id}{index:0{LEAD_INDEX_DIGITS}d}"
+        return {
+            "id": lead_id,
+            "form_id": form_id,
+            "created_time": self.graph_time(LEADS_START + index * LEAD_INTERVAL),
+            "ad_id": "1000",
+            "adset_id": "1500",
+            "adset_name": "Fake Ad Set",
+            "ad_name": "Fake Ad",
+            "campaign_id": "2000",
+            "campaign_name": "Fake Campaign",
+            "is_organic": False,
+            "platform": "fb",
+            "custom_disclaimer_responses": [],
+            "partner_name": None,
+            "retailer_item_id": None,
+            "field_data": [
+                {"name": "full_name", "values": [f"Lead {lead_id}" + ("x" * 200 if index in self.oversized_leads else "")]},
+                {"name": "email", "values": [f"lead{lead_id}" if index in self.bad_leads else f"lead{lead_id}@example.com"]},
+                {"name": "phone_number", "values": [f"+1555{index % 10**7:07d}"]},
+            ],
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _serve(self, method):
+                parsed = urlparse(self.path)
+                params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode() if length else ""
+                with server._lock:
+                    server.requests.append((method, parsed.path, params))
+
+                if server.latency:
+                    time.sleep(server.latency)
+                status, payload = server.respond(method, parsed.path, params, body)
+                data = json.dumps(payload).encode()
+                with server._lock:
+                    server.bytes_sent += len(data)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in server.usage_headers().items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def do_DELETE(self):
+                self._serve("DELETE")
+
+        return Handler
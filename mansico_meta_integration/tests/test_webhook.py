@@ -0,0 +1,104 @@
+# Copyright (c) 2026, Mansy and Contributors
+# See license.txt
+
+import hashlib
+import hmac
+import json
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from mansico_meta_integration import webhook
+from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import SyncRecordLock
+from mansico_meta_integration.tests.benchmark import FAKE_FORM_PREFIX, fake_sync_record
+from mansico_meta_integration.tests.fake_graph_server import FakeGraphServer
+
+APP_SECRET = "fake-app-secret"
+VERIFY_TOKEN = "fake-verify-token"
+WEBHOOK_SETTINGS = ("app_secret", "webhook_verify_token")
+
+
+def leadgen_body(page_id="0", form_id="0", lead_id="0"):
+	return json.dumps({
+		"object": "page",
+		"entry": [{"changes": [{
+			"field": "leadgen",
+			"value": {"page_id": page_id, "form_id": form_id, "leadgen_id": lead_id},
+		}]}],
+	}).encode()
+
+
+def sign(payload, secret=APP_SECRET):
+	return "sha256=" + hmac.new(secret.encode(), payload, hashlib.sha256).hexdigest()
+
+
+class TestLeadgenWebhook(FrappeTestCase):
+	def setUp(self):
+		self.original = {field: frappe.db.get_single_value("Meta Facebook Settings", field) for field in WEBHOOK_SETTINGS}
+		frappe.db.set_single_value("Meta Facebook Settings", {"app_secret": APP_SECRET, "webhook_verify_token": VERIFY_TOKEN})
+		self.request, self.form_dict = getattr(frappe.local, "request", None), frappe.local.form_dict
+
+	def tearDown(self):
+		frappe.local.request, frappe.local.form_dict = self.request, self.form_dict
+		frappe.db.set_single_value("Meta Facebook Settings", self.original)
+		frappe.db.commit()
+
+	def call(self, method="POST", payload=b"", signature=None, **query):
+		headers = {"X-Hub-Signature-256": signature} if signature else {}
+		frappe.local.request = Request(EnvironBuilder(method=method, data=payload, headers=headers).get_environ())
+		frappe.local.form_dict = frappe._dict(query)
+		return webhook.leadgen()
+
+	def test_valid_signature_is_accepted(self):
+		payload = leadgen_body()
+		response = self.call(payload=payload, signature=sign(payload))
+		self.assertEqual((response.status_code, response.get_data(as_text=True)), (200, "EVENT_RECEIVED"))
+
+	def test_bad_signature_is_rejected(self):
+		payload = leadgen_body()
+		self.assertEqual(self.call(payload=payload, signature=sign(payload, "other-secret")).status_code, 403)
+		self.assertEqual(self.call(payload=payload, signature=sign(payload).replace("sha256=", "sha1=")).status_code, 403)
+		self.assertEqual(self.call(payload=payload).status_code, 403)
+		# A signature over another body does not cover this one.
+		self.assertEqual(self.call(payload=payload, signature=sign(leadgen_body(lead_id="1"))).status_code, 403)
+
+	def test_missing_app_secret_rejects_every_delivery(self):
+		frappe.db.set_single_value("Meta Facebook Settings", "app_secret", None)
+		payload = leadgen_body()
+		self.assertEqual(self.call(payload=payload, signature=sign(payload)).status_code, 403)
+		self.assertEqual(self.call(payload=payload, signature=sign(payload, "")).status_code, 403)
+
+	def test_challenge_is_echoed_for_the_verify_token(self):
+		query = {"hub.mode": "subscribe", "hub.verify_token": VERIFY_TOKEN, "hub.challenge": "1158201444"}
+		response = self.call("GET", **query)
+		self.assertEqual((response.status_code, response.get_data(as_text=True)), (200, "1158201444"))
+
+	def test_challenge_mismatch_is_rejected(self):
+		query = {"hub.mode": "subscribe", "hub.challenge": "1158201444"}
+		self.assertEqual(self.call("GET", **query, **{"hub.verify_token": "wrong-token"}).status_code, 403)
+		self.assertEqual(self.call("GET", **query).status_code, 403)
+		self.assertEqual(self.call("GET", **{**query, "hub.mode": "unsubscribe", "hub.verify_token": VERIFY_TOKEN}).status_code, 403)
+
+		frappe.db.set_single_value("Meta Facebook Settings", "webhook_verify_token", None)
+		self.assertEqual(self.call("GET", **query, **{"hub.verify_token": ""}).status_code, 403)
+
+	def test_leads_of_a_busy_sync_record_are_deferred(self):
+		form_id = f"{FAKE_FORM_PREFIX}0000"
+		cache, key = frappe.cache(), webhook.DEFERRED_EVENTS_KEY
+		cache.delete_value(key)
+		with FakeGraphServer(forms={form_id: 3}) as server, fake_sync_record(server) as doc:
+			lock = SyncRecordLock(doc.name, ttl=60)
+			self.assertTrue(lock.acquire())
+			wait, webhook.WEBHOOK_LOCK_WAIT = webhook.WEBHOOK_LOCK_WAIT, 0
+			try:
+				webhook.process_leadgen_events([{"page_id": doc.page_id, "form_id": form_id, "leadgen_id": f"{form_id}00000001"}])
+			finally:
+				webhook.WEBHOOK_LOCK_WAIT = wait
+				lock.release()
+
+			deferred = [json.loads(event) for event in cache.lrange(key, 0, -1)]
+			self.assertEqual(deferred, [{"page_id": doc.page_id, "form_id": form_id, "leadgen_id": f"{form_id}00000001"}])
+			webhook.retry_deferred_leadgen_events()
+			self.assertFalse(cache.lrange(key, 0, -1))
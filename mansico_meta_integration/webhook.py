@@ -0,0 +1,138 @@
+import hashlib
+import hmac
+import json
+
+import frappe
+from werkzeug.wrappers import Response
+
+WEBHOOK_LOCK_WAIT = 10
+WEBHOOK_LOCK_TTL = 120
+# Leadgen events whose Sync New Add was busy, picked up again by the next scheduler tick.
+DEFERRED_EVENTS_KEY = "mansico_meta:webhook_deferred"
+
+
+@frappe.whitelist(allow_guest=True, methods=["GET", "POST"])
+def leadgen():
+    """Endpoint for the Page ``leadgen`` webhook subscription.
+
+    GET answers Meta's ``hub.challenge`` handshake. POST verifies
+    ``X-Hub-Signature-256``, queues the referenced leads and acknowledges at once.
+    """
+    settings = frappe.get_single("Meta Facebook Settings")
+
+    if frappe.request.method == "GET":
+        if (
+            frappe.form_dict.get("hub.mode") == "subscribe"
+            and settings.webhook_verify_token
+            and hmac.compare_digest(frappe.form_dict.get("hub.verify_token") or "", settings.webhook_verify_token)
+        ):
+            return Response(frappe.form_dict.get("hub.challenge") or "", mimetype="text/plain")
+        return Response("Verification failed", status=403, mimetype="text/plain")
+
+    payload = frappe.request.get_data() or b""
+    if not _is_valid_signature(payload, frappe.get_request_header("X-Hub-Signature-256"), settings.app_secret):
+        return Response("Invalid signature", status=403, mimetype="text/plain")
+
+    try:
+        events = get_leadgen_events(json.loads(payload))
+    except ValueError:
+        return Response("Invalid payload", status=400, mimetype="text/plain")
+
+    if events:
+        frappe.enqueue(
+            "mansico_meta_integration.webhook.process_leadgen_events",
+            queue="short",
+            events=events,
+        )
+    return Response("EVENT_RECEIVED", mimetype="text/plain")
+
+
+def _is_valid_signature(payload, signature, app_secret):
+    if not signature or not app_secret or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(app_secret.encode(), payload, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature.split("=", 1)[1], expected)
+
+
+def get_leadgen_events(body):
+    """Return the ``leadgen`` change values of a Page webhook delivery."""
+    if body.get("object") != "page":
+        return []
+    return [
+        change.get("value")
+        for entry in body.get("entry", [])
+        for change in entry.get("changes", [])
+        if change.get("field") == "leadgen" and (change.get("value") or {}).get("leadgen_id")
+    ]
+
+
+def process_leadgen_events(events):
+    """Import the leads referenced by webhook events through the Sync New Add of their page and form."""
+    from mansico_meta_integration.mansico_meta_integration.doctype.sync_new_add.sync_new_add import (
+        FetchLeads,
+        SyncRecordLock,
+    )
+
+    lead_ids = {}
+    for event in events:
+        key = (str(event.get("page_id") or ""), str(event.get("form_id") or ""))
+        lead_ids.setdefault(key, []).append(str(event["leadgen_id"]))
+
+    for (page_id, form_id), ids in lead_ids.items():
+        sync_records = frappe.get_all(
+            "Sync New Add", {"page_id": page_id, "docstatus": 1}, pluck="name", order_by="creation asc"
+        )
+        forms = frappe.get_all(
+            "Meta Forms",
+            {"parenttype": "Sync New Add", "parent": ["in", sync_records or [""]], "form_id": form_id},
+            pluck="parent",
+        )
+        if not forms:
+            frappe.log_error("Leadgen Webhook Skipped", f"No submitted Sync New Add syncs form {form_id} of page {page_id}")
+            continue
+
+        # Share the scheduled run's lock. A busy run may already be past this form,
+        # so the leads are retried from the deferred queue rather than left to the next poll.
+        lock = SyncRecordLock(forms[0], ttl=WEBHOOK_LOCK_TTL)
+        if not lock.acquire(wait=WEBHOOK_LOCK_WAIT):
+            defer_leadgen_events([
+                {"page_id": page_id, "form_id": form_id, "leadgen_id": lead_id} for lead_id in ids
+            ])
+            frappe.log_error(
+                "Leadgen Webhook Deferred",
+                f"Sync New Add {forms[0]} is busy, leads {', '.join(ids)} of form {form_id} are retried on the next scheduler tick"
+            )
+            continue
+
+        try:
+            FetchLeads(forms[0]).import_lead_ids(ids)
+        except Exception as e:
+            frappe.log_error(
+                "Leadgen Webhook Import Failed",
+                f"Failed to import leads {', '.join(ids)} of form {form_id}, the next scheduled sync picks them up: {str(e)}"
+            )
+        finally:
+            lock.release()
+
+
+def defer_leadgen_events(events):
+    cache = frappe.cache()
+    pipe = cache.pipeline()
+    pipe.rpush(cache.make_key(DEFERRED_EVENTS_KEY), *[json.dumps(event) for event in events])
+    pipe.execute()
+
+
+def retry_deferred_leadgen_events():
+    """Queue the leadgen events deferred because their Sync New Add was busy."""
+    cache = frappe.cache()
+    key = cache.make_key(DEFERRED_EVENTS_KEY)
+    pipe = cache.pipeline()
+    pipe.lrange(key, 0, -1)
+    pipe.delete(key)
+    events = [json.loads(event) for event in pipe.execute()[0] or []]
+    if events:
+        frappe.enqueue(
+            "mansico_meta_integration.webhook.process_leadgen_events",
+            queue="short",
+            events=events,
+        )